@@ -30,6 +30,15 @@ class Config:
         # WebSocket配置
         self.ws_path = os.getenv("WS_PATH", "/ws/realtime-asr")
         
+        # 会话配置
+        self.session_config = self._load_session_config()
+        
+        # 投机查询配置
+        self.speculative_config = self._load_speculative_config()
+        
+        # 答案流式分块配置
+        self.answer_config = self._load_answer_config()
+        
         # RAG服务配置
         self.rag_config = self._load_rag_config()
         
@@ -38,19 +47,54 @@ class Config:
         
         # 批量处理配置
         self.batch_config = self._load_batch_config()
+        
+        # 提供商HTTP连接池配置
+        self.http_config = self._load_http_config()
+        
+        # 查询结果缓存配置
+        self.cache_config = self._load_cache_config()
+        
+        # 限流配置
+        self.rate_limit_config = self._load_rate_limit_config()
+        
+        # 熔断与重试配置
+        self.resilience_config = self._load_resilience_config()
+        
+        # 提供商链对冲请求配置
+        self.hedge_config = self._load_hedge_config()
+        
+        # 搜索 + RAG 融合配置
+        self.fusion_config = self._load_fusion_config()
     
     def _load_rag_config(self) -> Dict[str, Any]:
         """加载RAG服务配置
         
+        ``RAG_PROVIDER`` 可以是逗号分隔的提供商链（如 ``dify,openai,custom``），
+        第一个为主提供商，其余按顺序作为备用，配置在 ``fallbacks`` 中。
+        
         Returns:
-            Dict[str, Any]: RAG服务配置
+            Dict[str, Any]: 主RAG提供商配置
         """
-        provider = os.getenv("RAG_PROVIDER", "").lower()
+        providers = [p.strip() for p in os.getenv("RAG_PROVIDER", "").lower().split(",") if p.strip()]
         
-        if not provider:
+        if not providers:
             logger.warning("RAG_PROVIDER not configured")
             return {}
         
+        config = self._load_rag_provider_config(providers[0])
+        config["fallbacks"] = [self._load_rag_provider_config(p) for p in providers[1:]]
+        
+        return config
+    
+    def _load_rag_provider_config(self, provider: str) -> Dict[str, Any]:
+        """加载单个RAG提供商的配置
+        
+        Args:
+            provider: 提供商类型
+            
+        Returns:
+            Dict[str, Any]: 提供商配置
+        """
         config = {
             "provider": provider
         }
@@ -82,6 +126,27 @@ class Config:
                 "api_key": os.getenv("CUSTOM_RAG_API_KEY"),
                 "timeout": float(os.getenv("CUSTOM_RAG_TIMEOUT", "30.0"))
             })
+        elif provider == "mock":
+            seed = os.getenv("MOCK_SEED")
+            record_provider = os.getenv("MOCK_RECORD_PROVIDER", "").lower()
+            config.update({
+                "mode": os.getenv("MOCK_MODE", "synthetic").lower(),
+                "ttft": float(os.getenv("MOCK_TTFT", "0.3")),
+                "token_interval": float(os.getenv("MOCK_TOKEN_INTERVAL", "0.02")),
+                "distribution": os.getenv("MOCK_LATENCY_DISTRIBUTION", "uniform").lower(),
+                "jitter": float(os.getenv("MOCK_LATENCY_JITTER", "0.2")),
+                "error_rate": float(os.getenv("MOCK_ERROR_RATE", "0.0")),
+                "tokens": int(os.getenv("MOCK_TOKENS", "40")),
+                "answer": os.getenv("MOCK_ANSWER"),
+                "seed": int(seed) if seed else None,
+                "record_path": os.getenv("MOCK_RECORD_PATH", "./data/mock_recordings.jsonl"),
+                # record模式下被录制的真实提供商
+                "record": self._load_rag_provider_config(record_provider)
+                if record_provider and record_provider != "mock" else None
+            })
+        
+        env_prefix = {"custom": "CUSTOM_RAG"}.get(provider, provider.upper())
+        config["rate_limit"] = self._load_rate_limit(env_prefix)
         
         return config
     
@@ -107,8 +172,82 @@ class Config:
                 "timeout": float(os.getenv("SERPER_TIMEOUT", "10.0"))
             })
         
+        config["rate_limit"] = self._load_rate_limit(provider.upper())
+        
         return config
     
+    def _load_rate_limit(self, env_prefix: str) -> Dict[str, int]:
+        """加载单个提供商的限额配置
+        
+        Args:
+            env_prefix: 环境变量前缀，如DIFY、OPENAI
+            
+        Returns:
+            Dict[str, int]: 每分钟请求数和token数上限，0表示不限制
+        """
+        return {
+            "rpm": int(os.getenv(f"{env_prefix}_RPM", "0")),
+            "tpm": int(os.getenv(f"{env_prefix}_TPM", "0"))
+        }
+    
+    def _load_rate_limit_config(self) -> Dict[str, Any]:
+        """加载限流配置
+        
+        Returns:
+            Dict[str, Any]: 限流配置
+        """
+        return {
+            "batch_reserve": float(os.getenv("RATE_LIMIT_BATCH_RESERVE", "0.2")),
+            "max_wait": float(os.getenv("RATE_LIMIT_MAX_WAIT", "30.0")),
+            "completion_tokens": int(os.getenv("RATE_LIMIT_COMPLETION_TOKENS", "256"))
+        }
+    
+    def _load_resilience_config(self) -> Dict[str, Any]:
+        """加载提供商熔断与重试配置
+        
+        Returns:
+            Dict[str, Any]: 熔断与重试配置
+        """
+        return {
+            "enabled": os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true",
+            "failure_rate": float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+            "window_size": int(os.getenv("CIRCUIT_WINDOW_SIZE", "20")),
+            "min_calls": int(os.getenv("CIRCUIT_MIN_CALLS", "5")),
+            "open_seconds": float(os.getenv("CIRCUIT_OPEN_SECONDS", "30.0")),
+            "retry_attempts": int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+            "retry_base_delay": float(os.getenv("RETRY_BASE_DELAY", "0.2")),
+            "retry_max_delay": float(os.getenv("RETRY_MAX_DELAY", "2.0")),
+            "retry_budget_ratio": float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+            "retry_deadline": float(os.getenv("RETRY_DEADLINE", "30.0"))
+        }
+    
+    def _load_hedge_config(self) -> Dict[str, Any]:
+        """加载提供商链的对冲请求配置
+        
+        Returns:
+            Dict[str, Any]: 对冲请求配置
+        """
+        return {
+            "enabled": os.getenv("RAG_HEDGE_ENABLED", "true").lower() == "true",
+            "quantile": float(os.getenv("RAG_HEDGE_QUANTILE", "0.95")),
+            "min_delay": float(os.getenv("RAG_HEDGE_MIN_DELAY", "0.3")),
+            "default_delay": float(os.getenv("RAG_HEDGE_DEFAULT_DELAY", "2.0")),
+            "min_samples": int(os.getenv("RAG_HEDGE_MIN_SAMPLES", "20"))
+        }
+    
+    def _load_fusion_config(self) -> Dict[str, Any]:
+        """加载搜索 + RAG 融合配置
+        
+        Returns:
+            Dict[str, Any]: 融合配置，mode为off（关闭）、keywords（检测到搜索关键词时融合）
+                或always（所有问题都融合）
+        """
+        return {
+            "mode": os.getenv("FUSION_MODE", "off").lower(),
+            "search_timeout": float(os.getenv("FUSION_SEARCH_TIMEOUT", "1.5")),
+            "rag_timeout": float(os.getenv("FUSION_RAG_TIMEOUT", "20.0"))
+        }
+    
     def _load_batch_config(self) -> Dict[str, Any]:
         """加载批量处理配置
         
@@ -118,8 +257,91 @@ class Config:
         return {
             "enabled": os.getenv("BATCH_ENABLED", "true").lower() == "true",
             "max_concurrent": int(os.getenv("BATCH_MAX_CONCURRENT", "5")),
+            "max_inflight": int(os.getenv("BATCH_MAX_INFLIGHT", "20")),
             "max_queue_size": int(os.getenv("BATCH_MAX_QUEUE_SIZE", "1000")),
-            "storage_path": os.getenv("BATCH_STORAGE_PATH", "./batch_results")
+            "retention_hours": float(os.getenv("BATCH_RETENTION_HOURS", "24")),
+            "storage_path": os.getenv("BATCH_STORAGE_PATH", "./batch_results"),
+            "persistence_enabled": os.getenv("BATCH_PERSISTENCE_ENABLED", "true").lower() == "true"
+        }
+    
+    def _load_session_config(self) -> Dict[str, Any]:
+        """加载会话配置
+        
+        Returns:
+            Dict[str, Any]: 会话配置
+        """
+        return {
+            "max_text_chars": int(os.getenv("SESSION_MAX_TEXT_CHARS", "4000")),
+            "registry_shards": int(os.getenv("SESSION_REGISTRY_SHARDS", "64")),
+            "idle_timeout": float(os.getenv("SESSION_IDLE_TIMEOUT", "900")),
+            "sweep_interval": float(os.getenv("SESSION_SWEEP_INTERVAL", "30")),
+            "send_queue_max": int(os.getenv("WS_SEND_QUEUE_MAX", "256")),
+            "send_queue_lag": int(os.getenv("WS_SEND_QUEUE_LAG", "32")),
+            "msgpack_enabled": os.getenv("WS_MSGPACK_ENABLED", "true").lower() == "true"
+        }
+    
+    def _load_speculative_config(self) -> Dict[str, Any]:
+        """加载投机查询配置
+        
+        Returns:
+            Dict[str, Any]: 投机查询配置
+        """
+        return {
+            "enabled": os.getenv("SPECULATIVE_ENABLED", "false").lower() == "true",
+            "min_chars": int(os.getenv("SPECULATIVE_MIN_CHARS", "6")),
+            "similarity": float(os.getenv("SPECULATIVE_SIMILARITY", "0.8"))
+        }
+    
+    def _load_answer_config(self) -> Dict[str, Any]:
+        """加载答案流式分块配置
+        
+        Returns:
+            Dict[str, Any]: 答案分块配置
+        """
+        return {
+            "chunk_max_chars": int(os.getenv("ANSWER_CHUNK_MAX_CHARS", "120")),
+            "chunk_min_chars": int(os.getenv("ANSWER_CHUNK_MIN_CHARS", "8")),
+            "chunk_max_latency": float(os.getenv("ANSWER_CHUNK_MAX_LATENCY", "0.3"))
+        }
+    
+    def _load_http_config(self) -> Dict[str, Any]:
+        """加载提供商HTTP连接池配置
+        
+        Returns:
+            Dict[str, Any]: HTTP连接池配置
+        """
+        return {
+            "max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            "max_keepalive_connections": int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            "keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30.0")),
+            "connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", "5.0")),
+            "http2": os.getenv("HTTP_HTTP2", "false").lower() == "true"
+        }
+    
+    def _load_cache_config(self) -> Dict[str, Any]:
+        """加载查询结果缓存配置
+        
+        Returns:
+            Dict[str, Any]: 缓存配置
+        """
+        disabled = os.getenv("CACHE_DISABLED_PROVIDERS", "")
+        return {
+            "enabled": os.getenv("CACHE_ENABLED", "true").lower() == "true",
+            "backend": os.getenv("CACHE_BACKEND", "memory").lower(),
+            "ttl": float(os.getenv("CACHE_TTL", "300")),
+            "max_entries": int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+            "max_bytes": int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            "disabled_providers": [p.strip().lower() for p in disabled.split(",") if p.strip()],
+            "single_flight": os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true",
+            "semantic": {
+                "enabled": os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true",
+                "threshold": float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8")),
+                "num_perm": int(os.getenv("SEMANTIC_CACHE_NUM_PERM", "64")),
+                "bands": int(os.getenv("SEMANTIC_CACHE_BANDS", "16")),
+                "ngram": int(os.getenv("SEMANTIC_CACHE_NGRAM", "3")),
+                "ttl": float(os.getenv("SEMANTIC_CACHE_TTL", "600")),
+                "max_entries": int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "100000"))
+            }
         }
     
     def validate(self) -> bool:
@@ -128,21 +350,25 @@ class Config:
         Returns:
             bool: 如果配置有效返回True
         """
-        # 检查RAG配置
+        # 检查RAG配置（包括提供商链中的备用提供商）
         if self.rag_config:
-            provider = self.rag_config.get("provider")
-            if provider == "context" and not self.rag_config.get("api_key"):
-                logger.error("CONTEXT_API_KEY is required for Context provider")
-                return False
-            elif provider == "openai" and not self.rag_config.get("api_key"):
-                logger.error("OPENAI_API_KEY is required for OpenAI provider")
-                return False
-            elif provider == "dify" and not self.rag_config.get("api_key"):
-                logger.error("DIFY_API_KEY is required for Dify provider")
-                return False
-            elif provider == "custom" and not self.rag_config.get("api_url"):
-                logger.error("CUSTOM_RAG_API_URL is required for Custom provider")
-                return False
+            for rag_config in [self.rag_config, *self.rag_config.get("fallbacks", [])]:
+                provider = rag_config.get("provider")
+                if provider == "context" and not rag_config.get("api_key"):
+                    logger.error("CONTEXT_API_KEY is required for Context provider")
+                    return False
+                elif provider == "openai" and not rag_config.get("api_key"):
+                    logger.error("OPENAI_API_KEY is required for OpenAI provider")
+                    return False
+                elif provider == "dify" and not rag_config.get("api_key"):
+                    logger.error("DIFY_API_KEY is required for Dify provider")
+                    return False
+                elif provider == "custom" and not rag_config.get("api_url"):
+                    logger.error("CUSTOM_RAG_API_URL is required for Custom provider")
+                    return False
+                elif provider == "mock" and rag_config.get("mode") == "record" and not rag_config.get("record"):
+                    logger.error("MOCK_RECORD_PROVIDER is required for Mock provider in record mode")
+                    return False
         
         # 检查搜索配置
         if self.search_config:
@@ -167,7 +393,13 @@ class Config:
         return {
             "rag": self.rag_config,
             "search": self.search_config,
-            "batch": self.batch_config
+            "batch": self.batch_config,
+            "http": self.http_config,
+            "cache": self.cache_config,
+            "rate_limit": self.rate_limit_config,
+            "resilience": self.resilience_config,
+            "hedge": self.hedge_config,
+            "fusion": self.fusion_config
         }
     
     def __repr__(self) -> str:
@@ -1,6 +1,7 @@
 """Realtime RAG WebSocket Service - 主应用入口"""
 
 from fastapi import FastAPI, WebSocket
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
@@ -9,6 +10,8 @@ from typing import Dict, Any
 from app.config import config
 from app.services.rag_service import RAGService
 from app.services.batch_processor import BatchProcessor
+from app.services.buffered_websocket import BufferedWebSocket
+from app.services import metrics
 from app.routers import websocket as ws_router
 from app.routers import batch as batch_router
 
@@ -43,6 +46,7 @@ async def lifespan(app: FastAPI):
     try:
         service_config = config.get_service_config()
         rag_service = RAGService(service_config)
+        await rag_service.startup()
         logger.info(f"RAG service initialized: {rag_service.is_available}")
     except Exception as e:
         logger.error(f"Failed to initialize RAG service: {e}")
@@ -60,15 +64,25 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"Failed to initialize batch processor: {e}")
     
+    # 启动空闲会话清理
+    await ws_router.sessions.start()
+    
     logger.info("Application startup complete")
     
     yield
     
+    await ws_router.sessions.stop()
+    
     # 关闭批量处理器
     if batch_processor:
         await batch_processor.stop()
         logger.info("Batch processor stopped")
     
+    # 关闭提供商HTTP连接池
+    if rag_service:
+        await rag_service.shutdown()
+        logger.info("Provider HTTP pools closed")
+    
     logger.info("Application shutdown complete")
 
 
@@ -104,9 +118,12 @@ async def root():
 
 
 @app.get("/health")
-async def health_check() -> Dict[str, Any]:
+async def health_check(detail: bool = False) -> Dict[str, Any]:
     """健康检查端点
     
+    Args:
+        detail: 是否包含需要遍历所有会话的统计（会话内存估算），通过 ``?detail=1`` 开启
+    
     Returns:
         Dict[str, Any]: 健康检查结果
     """
@@ -137,10 +154,34 @@ async def health_check() -> Dict[str, Any]:
             "search": search_ok,
             "batch_processing": batch_status.get("is_running") if batch_status else False
         },
-        "providers": services_health.get("providers", {})
+        "providers": services_health.get("providers", {}),
+        "sessions": ws_router.sessions.get_stats(detail=detail),
+        "speculation": ws_router.speculator.get_stats(),
+        "send_queues": BufferedWebSocket.get_stats(),
+        "http_pools": rag_service.get_pool_stats() if rag_service else {},
+        "cache": rag_service.get_cache_stats() if rag_service else None,
+        "single_flight": rag_service.get_single_flight_stats() if rag_service else None,
+        "rate_limits": rag_service.get_rate_limit_stats() if rag_service else {},
+        "circuits": rag_service.get_circuit_stats() if rag_service else {},
+        "provider_chain": rag_service.get_chain_stats() if rag_service else None,
+        "fusion": rag_service.get_fusion_stats() if rag_service else None
     }
 
 
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    """Prometheus指标端点
+    
+    Returns:
+        Response: Prometheus文本格式的指标，未安装prometheus_client时返回503
+    """
+    if not metrics.is_available():
+        return PlainTextResponse("prometheus_client is not installed\n", status_code=503)
+    
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+
 @app.websocket(config.ws_path)
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket端点
@@ -64,8 +64,11 @@ class BatchTask:
     })
     """进度信息"""
     
-    results: Optional[List[QueryResult]] = None
-    """处理结果列表"""
+    results: Optional[List[Optional[QueryResult]]] = None
+    """处理结果列表，按输入文本的下标存放，未完成的位置为None"""
+    
+    completed_indices: List[int] = field(default_factory=list, repr=False)
+    """按完成顺序记录的文本下标，用于增量读取结果"""
     
     created_at: datetime = field(default_factory=datetime.now)
     """创建时间"""
@@ -114,9 +117,68 @@ class BatchTask:
         )
     
     def start(self) -> None:
-        """开始处理任务"""
+        """开始处理任务
+        
+        从检查点恢复的任务保留已保存的结果和开始时间，只需处理剩余的文本。
+        """
         self.status = "running"
-        self.started_at = datetime.now()
+        if self.started_at is None:
+            self.started_at = datetime.now()
+        if self.results is None or len(self.results) != len(self.texts):
+            self.results = [None] * len(self.texts)
+            self.completed_indices = []
+    
+    @property
+    def pending_indices(self) -> List[int]:
+        """尚未处理的文本下标"""
+        if self.results is None:
+            return list(range(len(self.texts)))
+        return [i for i, result in enumerate(self.results) if result is None]
+    
+    def set_result(self, index: int, result: QueryResult) -> None:
+        """记录单个文本的处理结果
+        
+        Args:
+            index: 文本在输入列表中的下标
+            result: 处理结果
+        """
+        self.results[index] = result
+        self.completed_indices.append(index)
+    
+    def result_item(self, index: int) -> Dict[str, Any]:
+        """获取单个文本的结果条目
+        
+        Args:
+            index: 文本在输入列表中的下标
+            
+        Returns:
+            Dict[str, Any]: 包含下标、原文、状态和查询结果的条目
+        """
+        result = self.results[index] if self.results else None
+        if result is None:
+            status = "pending"
+        elif result.metadata and result.metadata.get("error"):
+            status = "failed"
+        else:
+            status = "success"
+        
+        item = {
+            "index": index,
+            "text": self.texts[index],
+            "status": status,
+            "content": None,
+            "metadata": None,
+            "sources": None,
+            "usage": None
+        }
+        if result:
+            item.update(result.to_dict())
+        return item
+    
+    @property
+    def is_finished(self) -> bool:
+        """任务是否已结束（完成、失败或取消）"""
+        return self.status in ("completed", "failed", "cancelled")
     
     def complete(self) -> None:
         """完成任务"""
@@ -1,27 +1,61 @@
 """会话状态数据模型"""
 
-from typing import List, Optional
+from collections import deque
+from typing import Any, Deque, Optional
+from app.services.text_utils import question_detector
 import asyncio
-import re
+import sys
+import time
 
 
 class SessionState:
     """会话状态数据模型
     
     管理用户连接的完整状态信息，包括ASR文本累积、暂停状态和查询任务。
+    
+    累积文本最多保留 ``max_text_chars`` 个字符，超出时丢弃最早的文本块，
+    问题检测也只针对保留的文本（滑动窗口），长时间会话的内存占用有上限。
+    使用 ``__slots__`` 避免每个会话携带实例字典。
     """
     
-    def __init__(self, session_id: str):
+    __slots__ = (
+        "session_id", "max_text_chars", "final_chunks", "is_paused", "last_final_text",
+        "current_query_task", "last_active", "last_partial_text", "speculative_question",
+        "speculative_task", "speculative_answer", "report_timings", "_appended", "_question_mask",
+        "_text_length", "_text_cache"
+    )
+    
+    def __init__(self, session_id: str, max_text_chars: int = 4000,
+                 report_timings: bool = False):
         """初始化会话状态
         
         Args:
             session_id: 会话唯一标识符
+            max_text_chars: 累积文本保留的最大字符数，0表示不限制
+            report_timings: 是否在每个答案后额外发送metrics消息
         """
         self.session_id: str = session_id
-        self.final_chunks: List[str] = []
+        self.max_text_chars: int = max_text_chars
+        self.final_chunks: Deque[str] = deque()
         self.is_paused: bool = False
         self.last_final_text: Optional[str] = None
         self.current_query_task: Optional[asyncio.Task] = None
+        # 最近一次非最终化文本，以及基于它发起的投机查询
+        self.last_partial_text: Optional[str] = None
+        self.speculative_question: Optional[str] = None
+        self.speculative_task: Optional[asyncio.Task] = None
+        # 投机查询已输出的增量（SpeculativeAnswer）
+        self.speculative_answer: Optional[Any] = None
+        self.report_timings: bool = report_timings
+        # 最近一次收到客户端消息的时间（time.monotonic），用于空闲回收
+        self.last_active: float = time.monotonic()
+        # 第i位表示final_chunks[i]是否包含问号或疑问词
+        self._question_mask: int = 0
+        # 聚合文本长度（含分隔空格）和缓存的聚合文本
+        self._text_length: int = 0
+        self._text_cache: Optional[str] = ""
+        # 累计添加的文本块数（含已丢弃的），用于定位某次查询包含的文本块
+        self._appended: int = 0
     
     def add_chunk(self, text: str, is_final: bool) -> None:
         """添加ASR文本块
@@ -31,17 +65,94 @@ class SessionState:
             is_final: 是否为最终化结果
         """
         if is_final and text.strip():
-            self.final_chunks.append(text.strip())
-            self.last_final_text = text.strip()
+            chunk = text.strip()
+            if self.max_text_chars > 0 and len(chunk) > self.max_text_chars:
+                chunk = chunk[-self.max_text_chars:]
+            
+            # 文本块之间以空格连接，疑问词不会跨块出现，只需扫描新增的文本块
+            is_question = question_detector.matches(chunk)
+            if self.final_chunks:
+                self._text_length += 1
+            self.final_chunks.append(chunk)
+            self._question_mask |= is_question << (len(self.final_chunks) - 1)
+            self._text_length += len(chunk)
+            self._appended += 1
+            self.last_final_text = chunk
+            self.last_partial_text = None
+            
+            # 超出上限时从最早的文本块开始丢弃
+            if self.max_text_chars > 0:
+                while self._text_length > self.max_text_chars and len(self.final_chunks) > 1:
+                    self._drop_oldest()
+            
+            self._text_cache = None
+    
+    def _drop_oldest(self) -> None:
+        """丢弃最早的文本块"""
+        dropped = self.final_chunks.popleft()
+        self._question_mask >>= 1
+        self._text_length -= len(dropped) + (1 if self.final_chunks else 0)
+        self._text_cache = None
+    
+    @property
+    def chunk_count(self) -> int:
+        """累计添加的最终化文本块数（含已丢弃的）"""
+        return self._appended
+    
+    def discard_through(self, chunk_count: int) -> None:
+        """丢弃前 ``chunk_count`` 个文本块，保留之后添加的文本块
+        
+        查询完成时用于移除已经回答的问题文本，查询期间新到达的文本块留给下一个问题。
+        
+        Args:
+            chunk_count: 查询开始时的 ``chunk_count``
+        """
+        keep = self._appended - chunk_count
+        while len(self.final_chunks) > max(keep, 0):
+            self._drop_oldest()
+        if not self.final_chunks:
+            self.last_final_text = None
     
     @property
     def aggregated_text(self) -> str:
         """获取聚合后的文本
         
+        聚合结果在文本块变化后首次访问时拼接一次并缓存。
+        
+        Returns:
+            保留的最终化文本块的聚合结果
+        """
+        if self._text_cache is None:
+            self._text_cache = " ".join(self.final_chunks)
+        return self._text_cache
+    
+    @property
+    def text_length(self) -> int:
+        """聚合文本的字符数（不拼接文本）"""
+        return self._text_length
+    
+    def touch(self) -> None:
+        """记录客户端活动"""
+        self.last_active = time.monotonic()
+    
+    def memory_size(self) -> int:
+        """估算会话占用的内存（字节）
+        
+        包括会话对象、文本块队列和保留的文本，不含查询任务本身。
+        
         Returns:
-            所有最终化文本块的聚合结果
+            估算的字节数
         """
-        return " ".join(self.final_chunks)
+        size = (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.session_id)
+            + sys.getsizeof(self.final_chunks)
+            + sys.getsizeof(self._question_mask)
+        )
+        size += sum(sys.getsizeof(chunk) for chunk in self.final_chunks)
+        if self._text_cache:
+            size += sys.getsizeof(self._text_cache)
+        return size
     
     @property
     def has_active_query(self) -> bool:
@@ -58,56 +169,43 @@ class SessionState:
         清除所有最终化文本块，重置为初始状态
         """
         self.final_chunks.clear()
+        self._question_mask = 0
+        self._text_length = 0
+        self._text_cache = ""
         self.last_final_text = None
+        self.last_partial_text = None
+        self.cancel_speculation()
         if self.current_query_task and not self.current_query_task.done():
             self.current_query_task.cancel()
         self.current_query_task = None
     
+    def cancel_speculation(self) -> None:
+        """取消进行中的投机查询"""
+        task = self.speculative_task
+        if task is not None:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # 读取已完成任务的异常，避免未读取异常的警告
+                task.exception()
+        self.speculative_task = None
+        self.speculative_answer = None
+        self.speculative_question = None
+    
     def looks_like_question(self) -> bool:
         """判断文本是否像问题
         
-        使用启发式算法判断聚合文本是否像问题：
+        使用启发式算法判断保留的聚合文本是否像问题：
         - 包含问号
         - 包含疑问词（中文：吗、呢、什么、怎么、为什么、如何等）
         - 包含英文疑问词（what、how、why、when、where、who等）
         
+        每个文本块在 ``add_chunk`` 时检测一次，这里只需检查窗口内是否有命中的文本块。
+        
         Returns:
             如果文本看起来像问题，返回True
         """
-        text = self.aggregated_text.lower()
-        if not text:
-            return False
-        
-        # 检查问号
-        if '?' in text or '？' in text:
-            return True
-        
-        # 中文疑问词
-        chinese_question_words = [
-            '吗', '呢', '什么', '怎么', '为什么', '如何', '哪里', 
-            '哪个', '谁', '几', '多少', '是否', '能否', '可否',
-            '干嘛', '咋', '啥'
-        ]
-        
-        # 英文疑问词
-        english_question_words = [
-            'what', 'how', 'why', 'when', 'where', 'who', 
-            'which', 'whom', 'whose', 'can', 'could', 'would',
-            'should', 'is', 'are', 'do', 'does', 'did'
-        ]
-        
-        # 检查中文疑问词
-        for word in chinese_question_words:
-            if word in text:
-                return True
-        
-        # 检查英文疑问词（单词边界）
-        for word in english_question_words:
-            pattern = r'\b' + word + r'\b'
-            if re.search(pattern, text):
-                return True
-        
-        return False
+        return self._question_mask != 0
     
     def __repr__(self) -> str:
         """字符串表示"""
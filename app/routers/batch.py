@@ -1,9 +1,11 @@
 """批量处理API路由"""
 
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 from app.services.batch_processor import BatchProcessor
+import json
 
 # 创建路由器
 router = APIRouter(prefix="/api/batch", tags=["Batch Processing"])
@@ -157,6 +159,34 @@ async def get_batch_task_results(
     return results
 
 
+@router.get("/tasks/{task_id}/results/stream")
+async def stream_batch_task_results(task_id: str):
+    """流式获取任务结果
+    
+    以NDJSON格式按完成顺序逐条返回结果，任务运行中即可开始读取，任务结束后关闭连接。
+    
+    Args:
+        task_id: 任务ID
+        
+    Returns:
+        StreamingResponse: NDJSON结果流，每行一个结果条目
+        
+    Raises:
+        HTTPException: 如果任务不存在
+    """
+    if not batch_processor:
+        raise HTTPException(status_code=503, detail="批量处理服务不可用")
+    
+    if not await batch_processor.get_task_status(task_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    async def ndjson_lines():
+        async for item in batch_processor.stream_task_results(task_id):
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
 @router.get("/tasks")
 async def list_batch_tasks(status: Optional[str] = Query(None, description="状态过滤")):
     """列出所有任务
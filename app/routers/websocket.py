@@ -1,19 +1,36 @@
 """WebSocket路由处理"""
 
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict
-import json
+from typing import AsyncIterator, Dict, List, Optional
 import uuid
 import asyncio
+import json
 import logging
+import time
+from app.config import config
 from app.models.session import SessionState
 from app.services.rag_service import RAGService
-from app.services.text_utils import split_answer_into_chunks
+from app.services.buffered_websocket import BufferedWebSocket
+from app.services.codec import MessageDecodeError, negotiate_codec
+from app.services.session_registry import SessionRegistry
+from app.services.speculation import SpeculativePrefetcher
+from app.services import metrics
+from app.services.spans import SpanRecorder, current_spans
+from app.services.text_utils import StreamingChunker
 
 logger = logging.getLogger(__name__)
 
 # 全局会话存储
-sessions: Dict[str, SessionState] = {}
+sessions = SessionRegistry(
+    shards=config.session_config["registry_shards"],
+    idle_timeout=config.session_config["idle_timeout"],
+    sweep_interval=config.session_config["sweep_interval"]
+)
+
+metrics.ACTIVE_SESSIONS.set_function(lambda: len(sessions))
+
+# 基于非最终化ASR文本的投机查询
+speculator = SpeculativePrefetcher(config.speculative_config)
 
 
 async def websocket_endpoint(websocket: WebSocket, rag_service: RAGService):
@@ -29,13 +46,37 @@ async def websocket_endpoint(websocket: WebSocket, rag_service: RAGService):
         websocket: WebSocket连接对象
         rag_service: RAG服务实例
     """
-    # 接受连接
-    await websocket.accept()
+    # 协商编解码器（默认JSON，客户端请求msgpack子协议时使用MessagePack）并接受连接
+    codec = negotiate_codec(websocket.scope.get("subprotocols", []),
+                            config.session_config["msgpack_enabled"])
+    await websocket.accept(subprotocol=codec.subprotocol)
+    
+    # 所有发送都经过连接自己的发送队列，慢客户端不会阻塞消息处理和RAG查询
+    websocket = BufferedWebSocket(
+        websocket,
+        max_backlog=config.session_config["send_queue_max"],
+        lag_backlog=config.session_config["send_queue_lag"],
+        codec=codec
+    )
+    websocket.start()
     
     # 生成会话ID
     session_id = str(uuid.uuid4())
-    session = SessionState(session_id)
-    sessions[session_id] = session
+    session = SessionState(
+        session_id,
+        max_text_chars=config.session_config["max_text_chars"],
+        report_timings=websocket.query_params.get("metrics", "").lower() in ("1", "true", "yes")
+    )
+    
+    evicted = False
+    
+    async def close_idle(_: SessionState) -> None:
+        nonlocal evicted
+        evicted = True
+        await send_status(websocket, session_id, "closed", "会话空闲超时")
+        await websocket.close(code=1001)
+    
+    sessions.add(session, on_evict=close_idle)
     
     logger.info(f"WebSocket connected: {session_id}")
     
@@ -52,12 +93,13 @@ async def websocket_endpoint(websocket: WebSocket, rag_service: RAGService):
     try:
         while True:
             # 接收消息
-            data = await websocket.receive_text()
+            data = await websocket.receive_frame()
+            session.touch()
             
             try:
-                message = json.loads(data)
+                message = websocket.decode(data)
                 await handle_message(websocket, session, message, rag_service)
-            except json.JSONDecodeError:
+            except MessageDecodeError:
                 await send_error(websocket, session_id, "INVALID_JSON", "无效的JSON格式")
             except Exception as e:
                 logger.error(f"Error handling message: {e}")
@@ -69,13 +111,16 @@ async def websocket_endpoint(websocket: WebSocket, rag_service: RAGService):
         logger.error(f"WebSocket error: {e}")
     finally:
         # 清理会话
-        if session_id in sessions:
+        session.cancel_speculation()
+        if sessions.remove(session_id) is not None:
             # 取消正在进行的查询
             if session.has_active_query:
                 session.current_query_task.cancel()
-            del sessions[session_id]
         
-        await send_status(websocket, session_id, "closed", "连接已关闭")
+        # 空闲回收时已经发送过closed状态并关闭了连接
+        if not evicted:
+            await send_status(websocket, session_id, "closed", "连接已关闭")
+        await websocket.shutdown()
 
 
 async def handle_message(websocket: WebSocket, session: SessionState, 
@@ -115,6 +160,7 @@ async def handle_asr_chunk(websocket: WebSocket, session: SessionState,
         message: ASR消息
         rag_service: RAG服务实例
     """
+    received_at = time.monotonic()
     text = message.get("text", "").strip()
     is_final = message.get("is_final", False)
     
@@ -134,6 +180,10 @@ async def handle_asr_chunk(websocket: WebSocket, session: SessionState,
     # 添加文本块
     session.add_chunk(text, is_final)
     
+    # 非最终化文本已经像问题时提前发起投机查询
+    if not is_final:
+        speculator.on_partial(session, text, rag_service)
+    
     # 确认接收
     await send_message(websocket, {
         "type": "ack",
@@ -146,7 +196,7 @@ async def handle_asr_chunk(websocket: WebSocket, session: SessionState,
     if is_final:
         if session.looks_like_question():
             # 触发RAG查询
-            await process_question(websocket, session, rag_service)
+            await process_question(websocket, session, rag_service, received_at=received_at)
         else:
             await send_status(websocket, session.session_id, 
                             "waiting_for_question", "等待完整问题")
@@ -162,6 +212,7 @@ async def handle_control(websocket: WebSocket, session: SessionState,
         message: 控制消息
         rag_service: RAG服务实例
     """
+    received_at = time.monotonic()
     action = message.get("action")
     
     if action == "pause":
@@ -173,18 +224,22 @@ async def handle_control(websocket: WebSocket, session: SessionState,
         await send_status(websocket, session.session_id, "listening", "会话已恢复")
     
     elif action == "stop":
-        # 取消当前查询
-        if session.has_active_query:
-            session.current_query_task.cancel()
+        # 取消当前查询（reset会取消查询任务），等待其退出后再确认
+        task = session.current_query_task
         session.reset()
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
         await send_status(websocket, session.session_id, "idle", "会话已停止")
     
     elif action == "instant_query":
         # 即时查询，强制查询当前文本
         if session.aggregated_text:
+            if session.has_active_query:
+                await interrupt_query(websocket, session)
             await send_status(websocket, session.session_id, 
                             "instant_query", "执行即时查询", mode="instant")
-            await process_question(websocket, session, rag_service, instant=True)
+            await process_question(websocket, session, rag_service, instant=True,
+                                   received_at=received_at)
         else:
             await send_error(websocket, session.session_id, 
                            "NO_FINAL_ASR", "没有可用的最终化ASR文本")
@@ -195,14 +250,19 @@ async def handle_control(websocket: WebSocket, session: SessionState,
 
 
 async def process_question(websocket: WebSocket, session: SessionState,
-                          rag_service: RAGService, instant: bool = False):
-    """处理问题并查询RAG服务
+                          rag_service: RAGService, instant: bool = False,
+                          received_at: Optional[float] = None):
+    """处理问题，在后台任务中查询RAG服务
+    
+    查询作为 ``session.current_query_task`` 运行，接收循环在答案生成期间继续处理
+    keepalive和控制消息，stop和instant_query可以中断正在进行的查询。
     
     Args:
         websocket: WebSocket连接对象
         session: 会话状态
         rag_service: RAG服务实例
         instant: 是否为即时查询
+        received_at: 触发查询的消息到达时间（time.monotonic），作为耗时分解的起点
     """
     question = session.aggregated_text
     
@@ -211,11 +271,60 @@ async def process_question(websocket: WebSocket, session: SessionState,
                         "EMPTY_QUESTION", "问题内容为空")
         return
     
-    # 检查是否有正在进行的查询
-    if session.has_active_query and not instant:
-        logger.warning(f"Query already in progress for session: {session.session_id}")
+    # 检查是否有正在进行的查询，即时查询会中断它
+    if session.has_active_query:
+        if not instant:
+            logger.warning(f"Query already in progress for session: {session.session_id}")
+            return
+        await interrupt_query(websocket, session)
+    
+    spans = SpanRecorder(received_at)
+    spans.lap("detection")
+    session.current_query_task = asyncio.create_task(
+        run_query(websocket, session, rag_service, question, session.chunk_count, instant, spans)
+    )
+
+
+async def interrupt_query(websocket: WebSocket, session: SessionState):
+    """中断正在进行的查询并等待其退出
+    
+    Args:
+        websocket: WebSocket连接对象
+        session: 会话状态
+    """
+    task = session.current_query_task
+    if task is None or task.done():
         return
     
+    await send_status(websocket, session.session_id, "interrupting", "正在中断当前查询")
+    task.cancel()
+    # 等待被中断的查询停止发送，避免与新查询的答案交错
+    await asyncio.gather(task, return_exceptions=True)
+    session.current_query_task = None
+
+
+async def run_query(websocket: WebSocket, session: SessionState, rag_service: RAGService,
+                    question: str, chunk_count: int, instant: bool = False,
+                    spans: Optional[SpanRecorder] = None):
+    """查询RAG服务并流式发送答案
+    
+    ``spans`` 通过上下文变量传给 ``RAGService`` 和提供商，由它们记录限流等待、建立连接、
+    首个片段和生成耗时。最终answer帧附带耗时分解，同时写一行结构化日志；
+    会话要求时另外发送一条metrics消息。
+    
+    Args:
+        websocket: WebSocket连接对象
+        session: 会话状态
+        rag_service: RAG服务实例
+        question: 问题文本
+        chunk_count: 问题包含的文本块数（查询开始时的 ``session.chunk_count``）
+        instant: 是否为即时查询
+        spans: 本次问题的耗时记录器
+    """
+    spans = spans or SpanRecorder()
+    spans.lap("queue_wait")
+    current_spans.set(spans)
+    
     try:
         # 发送状态更新
         await send_status(websocket, session.session_id, 
@@ -231,48 +340,178 @@ async def process_question(websocket: WebSocket, session: SessionState,
                         "querying_rag", "正在查询RAG服务",
                         **status_kwargs)
         
-        # 查询RAG服务
-        result = await rag_service.query(question)
-        
-        # 流式发送答案
-        await stream_answer(websocket, session.session_id, result.content)
+        # 投机查询命中时接着读取它的流，否则流式查询RAG服务，增量输出到达即转发
+        deltas = speculator.take(session, question) or rag_service.stream_query(question)
+        await stream_answer(websocket, session.session_id, deltas, spans)
+        await report_timings(websocket, session, question, spans)
         
-        # 重置会话（准备下一个问题）
-        session.reset()
+        finish_query(session, chunk_count)
         await send_status(websocket, session.session_id, "idle", "等待新的问题")
         
+    except asyncio.CancelledError:
+        logger.info(f"Query interrupted for session: {session.session_id}")
+        raise
     except Exception as e:
         logger.error(f"RAG query failed: {e}")
         await send_error(websocket, session.session_id, 
                         "RAG_ERROR", f"RAG查询失败: {str(e)}")
-        session.reset()
+        finish_query(session, chunk_count)
+        return
+    
+    # 查询期间到达的文本已经构成问题时继续回答
+    if session.looks_like_question():
+        await process_question(websocket, session, rag_service)
 
 
-async def stream_answer(websocket: WebSocket, session_id: str, answer: str):
+def finish_query(session: SessionState, chunk_count: int):
+    """查询结束后移除已回答的问题文本，保留查询期间新到达的文本块
+    
+    Args:
+        session: 会话状态
+        chunk_count: 问题包含的文本块数
+    """
+    if session.current_query_task is asyncio.current_task():
+        session.current_query_task = None
+    session.discard_through(chunk_count)
+
+
+async def report_timings(websocket: WebSocket, session: SessionState,
+                         question: str, spans: SpanRecorder):
+    """记录一个问题的耗时分解，会话要求时发送metrics消息
+    
+    Args:
+        websocket: WebSocket连接对象
+        session: 会话状态
+        question: 问题文本
+        spans: 本次问题的耗时记录器
+    """
+    timings = spans.as_dict()
+    logger.info("Question timings: " + json.dumps({
+        "session_id": session.session_id,
+        "question": question[:50],
+        "timings_ms": timings
+    }, ensure_ascii=False))
+    
+    if session.report_timings:
+        await send_message(websocket, {
+            "type": "metrics",
+            "session_id": session.session_id,
+            "question": question,
+            "timings": timings
+        })
+
+
+async def stream_answer(websocket: WebSocket, session_id: str, 
+                        deltas: AsyncIterator[str], spans: Optional[SpanRecorder] = None):
     """流式发送答案
     
+    使用 ``StreamingChunker`` 将提供商返回的增量片段在句子边界处重新分组为
+    ``answer`` 帧，缓冲内容超过最大延迟时强制发送。最近一块会暂缓发送，
+    流结束时直接作为 ``final`` 帧发送，只有答案为空时才发送内容为空的最终帧；
+    暂缓的块同样受最大延迟约束。
+    提供 ``spans`` 时最终帧附带 ``timings`` 字段（各阶段毫秒数）。
+    
     Args:
         websocket: WebSocket连接对象
         session_id: 会话ID
-        answer: 完整答案
+        deltas: 答案增量片段的异步迭代器
+        spans: 本次问题的耗时记录器，提供时记录首帧延迟和发送耗时
     """
-    # 分割答案为块
-    chunks = split_answer_into_chunks(answer, chunk_size=120)
+    answer_config = config.answer_config
+    chunker = StreamingChunker(
+        max_chars=answer_config["chunk_max_chars"],
+        min_chars=answer_config["chunk_min_chars"],
+        max_latency=answer_config["chunk_max_latency"]
+    )
+    stream_index = 0
     
-    for idx, chunk in enumerate(chunks):
-        is_final = (idx == len(chunks) - 1)
-        
-        await send_message(websocket, {
+    async def send_chunk(content: str, final: bool = False):
+        nonlocal stream_index
+        message = {
             "type": "answer",
-            "stream_index": idx,
-            "content": chunk,
-            "final": is_final,
+            "stream_index": stream_index,
+            "content": content,
+            "final": final,
             "session_id": session_id
-        })
+        }
+        if spans is None:
+            await send_message(websocket, message)
+            stream_index += 1
+            return
         
-        # 添加小延迟，模拟流式传输
-        if not is_final:
-            await asyncio.sleep(0.05)
+        if stream_index == 0:
+            metrics.ANSWER_LATENCY.observe(spans.elapsed())
+        started = time.monotonic()
+        if final:
+            spans.add("total", spans.elapsed())
+            message["timings"] = spans.as_dict()
+        await send_message(websocket, message)
+        spans.since("send", started)
+        stream_index += 1
+    
+    # 暂缓发送的最近一块：流结束时它就是最终帧，避免再多发一条空的最终帧
+    pending: Optional[str] = None
+    pending_at = 0.0
+    
+    async def hold(chunks: List[str]):
+        nonlocal pending, pending_at
+        for chunk in chunks:
+            if pending is not None:
+                await send_chunk(pending)
+            pending = chunk
+            pending_at = time.monotonic()
+    
+    def time_until_release() -> Optional[float]:
+        timeouts = [t for t in (
+            chunker.time_until_flush(),
+            None if pending is None or chunker.max_latency is None
+            else max(0.0, pending_at + chunker.max_latency - time.monotonic())
+        ) if t is not None]
+        return min(timeouts) if timeouts else None
+    
+    iterator = deltas.__aiter__()
+    next_delta: Optional[asyncio.Future] = None
+    
+    try:
+        while True:
+            if next_delta is None:
+                next_delta = asyncio.ensure_future(iterator.__anext__())
+            
+            # 等待下一个增量，超过最大延迟时先发送暂缓的块和已缓冲的内容
+            done, _ = await asyncio.wait({next_delta}, timeout=time_until_release())
+            if not done:
+                if pending is not None and time.monotonic() - pending_at >= chunker.max_latency:
+                    await send_chunk(pending)
+                    pending = None
+                chunk = chunker.poll()
+                if chunk:
+                    await hold([chunk])
+                continue
+            
+            try:
+                delta = next_delta.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_delta = None
+            
+            await hold(chunker.feed(delta))
+    except Exception:
+        # 上游中途失败时先发出暂缓的块，客户端收到的内容与失败前已生成的一致
+        if pending is not None:
+            await send_chunk(pending)
+        raise
+    finally:
+        if next_delta is not None and not next_delta.done():
+            next_delta.cancel()
+    
+    # 最后一块作为最终帧发送；没有任何剩余内容时才发送空的最终帧
+    remaining = chunker.flush()
+    if remaining:
+        await hold([remaining])
+    await send_chunk(pending or "", final=True)
+
+
 
 
 async def send_message(websocket: WebSocket, message: Dict):
@@ -1,9 +1,9 @@
 """服务层模块"""
 
 from .rag_service import RAGService
-from .text_utils import split_answer_into_chunks
+from .text_utils import split_answer_into_chunks, StreamingChunker
 from .batch_processor import BatchProcessor
 from .task_queue import TaskQueue
 
-__all__ = ["RAGService", "split_answer_into_chunks", "BatchProcessor", "TaskQueue"]
+__all__ = ["RAGService", "split_answer_into_chunks", "StreamingChunker", "BatchProcessor", "TaskQueue"]
 
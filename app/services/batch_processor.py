@@ -1,11 +1,15 @@
 """批量处理引擎"""
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional
 from app.models.batch_task import BatchTask, QueryResult
 from app.services.task_queue import TaskQueue
+from app.services.task_store import create_task_store
 from app.services.rag_service import RAGService
+from app.services.rag_providers.rate_limiter import Priority, request_priority
+from app.services import metrics
 import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +20,9 @@ class BatchProcessor:
     处理离线批量任务，支持任务队列管理和并发处理。
     """
     
+    # 清理过期任务的间隔（秒）
+    CLEANUP_INTERVAL = 3600.0
+    
     def __init__(self, rag_service: RAGService, config: Optional[Dict[str, Any]] = None):
         """初始化批量处理器
         
@@ -26,17 +33,30 @@ class BatchProcessor:
         self.rag_service = rag_service
         self.config = config or {}
         
-        # 任务队列
+        # 任务队列，启用持久化时任务和结果保存在storage_path下的SQLite数据库中
         max_queue_size = self.config.get("max_queue_size", 1000)
-        self.task_queue = TaskQueue(max_size=max_queue_size)
+        self.task_queue = TaskQueue(
+            max_size=max_queue_size,
+            store=create_task_store(self.config),
+            retention_hours=self.config.get("retention_hours", 24)
+        )
+        metrics.BATCH_QUEUE_DEPTH.set_function(lambda: len(self.task_queue.pending_queue))
         
         # 并发控制
         self.max_concurrent = self.config.get("max_concurrent", 5)
         self.semaphore = asyncio.Semaphore(self.max_concurrent)
         
+        # 所有批量任务共享的上游请求并发上限
+        self.max_inflight = max(1, self.config.get("max_inflight", 20))
+        self.inflight_semaphore = asyncio.Semaphore(self.max_inflight)
+        
+        # 有新结果或任务结束时唤醒流式读取方
+        self._results_updated = asyncio.Condition()
+        
         # 处理器状态
         self.is_running = False
         self.worker_task: Optional[asyncio.Task] = None
+        self.cleanup_task: Optional[asyncio.Task] = None
     
     async def start(self) -> None:
         """启动批量处理器"""
@@ -44,8 +64,13 @@ class BatchProcessor:
             logger.warning("Batch processor is already running")
             return
         
+        # 恢复上次未完成的任务，它们从检查点继续处理
+        await self.task_queue.open()
+        
         self.is_running = True
         self.worker_task = asyncio.create_task(self._worker_loop())
+        if self.task_queue.retention_hours > 0:
+            self.cleanup_task = asyncio.create_task(self._cleanup_loop())
         logger.info("Batch processor started")
     
     async def stop(self) -> None:
@@ -55,12 +80,15 @@ class BatchProcessor:
         
         self.is_running = False
         
-        if self.worker_task:
-            self.worker_task.cancel()
-            try:
-                await self.worker_task
-            except asyncio.CancelledError:
-                pass
+        for background in (self.worker_task, self.cleanup_task):
+            if background:
+                background.cancel()
+                try:
+                    await background
+                except asyncio.CancelledError:
+                    pass
+        
+        await self.task_queue.close()
         
         logger.info("Batch processor stopped")
     
@@ -70,20 +98,25 @@ class BatchProcessor:
         
         while self.is_running:
             try:
-                # 获取下一个任务
-                task = await self.task_queue.get_next_task()
+                # 等待下一个任务，队列为空时挂起直到有新任务提交
+                task = await self.task_queue.wait_next_task()
+                
+                # 异步处理任务
+                asyncio.create_task(self._process_task(task))
                 
-                if task:
-                    # 异步处理任务
-                    asyncio.create_task(self._process_task(task))
-                else:
-                    # 没有任务，等待一段时间
-                    await asyncio.sleep(1)
-                    
             except Exception as e:
                 logger.error(f"Error in worker loop: {e}")
                 await asyncio.sleep(1)
     
+    async def _cleanup_loop(self) -> None:
+        """定期清理超过保留时间的已结束任务"""
+        while self.is_running:
+            await asyncio.sleep(self.CLEANUP_INTERVAL)
+            try:
+                await self.task_queue.cleanup_old_tasks()
+            except Exception as e:
+                logger.error(f"Batch task cleanup failed: {e}")
+    
     async def _process_task(self, task: BatchTask) -> None:
         """处理单个任务
         
@@ -94,39 +127,42 @@ class BatchProcessor:
             try:
                 logger.info(f"Processing task: {task.task_id}")
                 
-                # 开始任务
-                task.start()
+                # 开始任务（从检查点恢复的任务保留已完成的结果）
+                await self.task_queue.start_task(task)
                 
-                # 处理所有文本
-                results: List[QueryResult] = []
-                completed = 0
-                failed = 0
+                # 处理剩余的文本，结果按输入下标存放
+                progress = {"completed": task.progress["completed"], "failed": task.progress["failed"]}
+                pending = task.pending_indices
                 
-                # 并发处理文本
-                tasks = []
-                for text in task.texts:
-                    tasks.append(self._process_single_text(text, task.options))
+                # 有界的生产者/消费者工作池：最多 max_inflight 个worker从队列领取文本，
+                # 实际发往上游的请求数再受全局并发上限约束
+                worker_count = min(self.max_inflight, len(pending))
+                queue: asyncio.Queue = asyncio.Queue(maxsize=worker_count * 2)
+                workers = [
+                    asyncio.create_task(self._text_worker(task, queue, progress))
+                    for _ in range(worker_count)
+                ]
                 
-                # 等待所有处理完成
-                for coro in asyncio.as_completed(tasks):
-                    try:
-                        result = await coro
-                        results.append(result)
-                        completed += 1
-                    except Exception as e:
-                        logger.error(f"Failed to process text: {e}")
-                        # 创建错误结果
-                        results.append(QueryResult(
-                            content=f"处理失败: {str(e)}",
-                            metadata={"error": True}
-                        ))
-                        failed += 1
+                try:
+                    for index in pending:
+                        if task.status != "running":
+                            break
+                        await queue.put((index, task.texts[index]))
                     
-                    # 更新进度
-                    task.update_progress(completed, failed)
+                    # 每个worker收到一个结束标记后退出
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+                
+                if task.status == "cancelled":
+                    logger.info(f"Task cancelled during processing: {task.task_id}")
+                    return
+                
+                completed, failed = progress["completed"], progress["failed"]
                 
-                # 保存结果
-                task.results = results
                 task.complete()
                 
                 # 标记任务完成
@@ -137,6 +173,61 @@ class BatchProcessor:
             except Exception as e:
                 logger.error(f"Task processing failed: {task.task_id}, error: {e}")
                 await self.task_queue.fail_task(task.task_id, str(e))
+            
+            finally:
+                await self._notify_results()
+    
+    async def _text_worker(self, task: BatchTask, queue: asyncio.Queue,
+                           progress: Dict[str, int]) -> None:
+        """批量任务的文本处理worker
+        
+        从队列领取文本并在全局并发上限内调用RAG服务，直到收到结束标记。
+        
+        Args:
+            task: 所属的批量处理任务
+            queue: (下标, 文本) 队列，None为结束标记
+            progress: 成功和失败计数
+        """
+        # worker运行在独立任务中，设置的优先级只影响本worker发出的请求
+        request_priority.set(Priority.BATCH)
+        
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            
+            # 任务已取消时只消费队列，不再发起请求
+            if task.status != "running":
+                continue
+            
+            index, text = item
+            started = time.monotonic()
+            try:
+                async with self.inflight_semaphore:
+                    result = await self._process_single_text(text, task.options)
+                progress["completed"] += 1
+                metrics.BATCH_ITEM_LATENCY.labels(status="success").observe(time.monotonic() - started)
+            except Exception as e:
+                metrics.BATCH_ITEM_LATENCY.labels(status="failed").observe(time.monotonic() - started)
+                logger.error(f"Failed to process text: {e}")
+                # 创建错误结果
+                result = QueryResult(
+                    content=f"处理失败: {str(e)}",
+                    metadata={"error": True}
+                )
+                progress["failed"] += 1
+            
+            task.set_result(index, result)
+            
+            # 更新进度并保存检查点
+            task.update_progress(progress["completed"], progress["failed"])
+            await self.task_queue.save_result(task, index)
+            await self._notify_results()
+    
+    async def _notify_results(self) -> None:
+        """唤醒等待结果的流式读取方"""
+        async with self._results_updated:
+            self._results_updated.notify_all()
     
     async def _process_single_text(self, text: str, options: Dict[str, Any]) -> QueryResult:
         """处理单个文本
@@ -211,19 +302,49 @@ class BatchProcessor:
         if not task or not task.results:
             return None
         
-        # 分页处理
+        # 分页处理，结果与输入文本一一对应，未完成的条目状态为pending
         start = (page - 1) * size
-        end = start + size
-        page_results = task.results[start:end]
+        end = min(start + size, len(task.results))
         
         return {
             "task_id": task.task_id,
-            "results": [r.to_dict() for r in page_results],
+            "results": [task.result_item(i) for i in range(start, end)],
             "total": len(task.results),
             "page": page,
             "size": size
         }
     
+    async def stream_task_results(self, task_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """按完成顺序增量读取任务结果
+        
+        先返回已完成的条目，之后每完成一条返回一条，任务结束后停止。
+        
+        Args:
+            task_id: 任务ID
+            
+        Yields:
+            Dict[str, Any]: 结果条目，包含输入下标和原文
+        """
+        task = await self.task_queue.get_task(task_id)
+        if not task:
+            return
+        
+        position = 0
+        while True:
+            async with self._results_updated:
+                await self._results_updated.wait_for(
+                    lambda: position < len(task.completed_indices) or task.is_finished
+                )
+            
+            # completed_indices在新任务开始时重置，需要每次重新读取
+            indices = task.completed_indices
+            while position < len(indices):
+                yield task.result_item(indices[position])
+                position += 1
+            
+            if task.is_finished and position >= len(task.completed_indices):
+                return
+    
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务
         
@@ -233,7 +354,10 @@ class BatchProcessor:
         Returns:
             bool: 如果成功取消返回True
         """
-        return await self.task_queue.cancel_task(task_id)
+        cancelled = await self.task_queue.cancel_task(task_id)
+        if cancelled:
+            await self._notify_results()
+        return cancelled
     
     async def list_tasks(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
         """列出所有任务
@@ -258,6 +382,7 @@ class BatchProcessor:
         return {
             "is_running": self.is_running,
             "max_concurrent": self.max_concurrent,
+            "max_inflight": self.max_inflight,
             "queue": queue_status
         }
 
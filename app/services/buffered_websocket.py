@@ -0,0 +1,237 @@
+"""WebSocket发送队列"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Union
+from fastapi import WebSocketDisconnect
+from app.services.codec import json_codec
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWebSocket:
+    """为WebSocket连接加上有界发送队列
+
+    ``send_json`` 只把消息放入队列，由独立的写任务按顺序发送，慢客户端不会阻塞查询和接收循环。
+    写任务每次唤醒后连续发送所有积压的消息。上一帧还在发送时，同一答案的相邻answer帧在队列中
+    合并为一帧（内容拼接，``final`` 取后一帧），之后的 ``stream_index`` 顺延重排，客户端看到的序号仍然连续。
+    积压达到 ``lag_backlog`` 时视为客户端滞后：
+    新的status消息取代队列中尚未发送的status消息，新的ack取代尚未发送的同类ack；
+    answer和error消息不会被丢弃。积压超过 ``max_backlog`` 时断开连接。
+    消息在写任务中用连接协商的编解码器编码，被取代的消息不会被编码。
+    其余属性和方法（如 ``receive_text``）直接转发给原连接。
+    """
+
+    # 所有连接的累计统计
+    coalesced_total = 0
+    superseded_total = 0
+    overflow_disconnects = 0
+
+    def __init__(self, websocket: Any, max_backlog: int = 256, lag_backlog: int = 32,
+                 codec: Any = json_codec):
+        """初始化发送队列
+
+        Args:
+            websocket: 已接受的WebSocket连接
+            max_backlog: 最大积压消息数，超过时断开连接
+            lag_backlog: 开始合并status/ack消息的积压数
+            codec: 消息编解码器
+        """
+        self.websocket = websocket
+        self.codec = codec
+        self.max_backlog = max_backlog
+        self.lag_backlog = lag_backlog
+        self.closed = False
+        self._pending: Deque[Dict[str, Any]] = deque()
+        # 当前答案中已被合并掉的帧数，用于重排后续帧的stream_index
+        self._answer_merged = 0
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """启动写任务"""
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    @property
+    def backlog(self) -> int:
+        """尚未发送的消息数"""
+        return len(self._pending)
+
+    async def send_json(self, message: Dict[str, Any]) -> None:
+        """把消息放入发送队列
+
+        Args:
+            message: 要发送的消息
+        """
+        if self.closed:
+            return
+
+        if message.get("type") == "answer" and self._coalesce(message):
+            return
+
+        if len(self._pending) >= self.lag_backlog:
+            self._supersede(message)
+
+        if len(self._pending) >= self.max_backlog:
+            BufferedWebSocket.overflow_disconnects += 1
+            logger.warning(f"Send backlog exceeded {self.max_backlog} frames, disconnecting slow client")
+            self._abort(code=1008)
+            return
+
+        self._pending.append(message)
+        self._drained.clear()
+        self._ready.set()
+
+    def _coalesce(self, message: Dict[str, Any]) -> bool:
+        """把answer帧合并进队尾尚未发送的同一答案的上一帧
+
+        Returns:
+            bool: 已合并时返回True；否则按重排后的序号修改 ``message`` 并返回False
+        """
+        index = message.get("stream_index")
+        if not isinstance(index, int):
+            return False
+        if index == 0:
+            self._answer_merged = 0
+        elif self._answer_merged:
+            message["stream_index"] = index = index - self._answer_merged
+
+        last = self._pending[-1] if self._pending else None
+        if (last is None or last.get("type") != "answer" or last.get("final")
+                or last.get("session_id") != message.get("session_id")
+                or last.get("stream_index") != index - 1):
+            return False
+
+        for key, value in message.items():
+            if key == "content":
+                last["content"] = (last.get("content") or "") + (value or "")
+            elif key != "stream_index":
+                last[key] = value
+        self._answer_merged += 1
+        BufferedWebSocket.coalesced_total += 1
+        return True
+
+    def _supersede(self, message: Dict[str, Any]) -> None:
+        """客户端滞后时移除被新消息取代的status/ack消息（相当于合并为最新的一条）"""
+        kind = message.get("type")
+        before = len(self._pending)
+        if kind == "status":
+            self._pending = deque(m for m in self._pending if m.get("type") != "status")
+        elif kind == "ack" and message.get("received_type"):
+            received_type = message["received_type"]
+            self._pending = deque(
+                m for m in self._pending
+                if m.get("type") != "ack" or m.get("received_type") != received_type
+            )
+        BufferedWebSocket.superseded_total += before - len(self._pending)
+
+    async def _write_loop(self) -> None:
+        """按顺序发送队列中的消息"""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._pending:
+                message = self._pending.popleft()
+                try:
+                    await self.codec.send(self.websocket, message)
+                except Exception as e:
+                    logger.error(f"Failed to send message: {e}")
+                    self.closed = True
+                    self._pending.clear()
+                    self._drained.set()
+                    return
+            self._drained.set()
+
+    async def receive_frame(self) -> Union[str, bytes]:
+        """接收一个文本或二进制帧（未解码）
+
+        Raises:
+            WebSocketDisconnect: 客户端断开连接
+        """
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("text")
+        return data if data is not None else message.get("bytes", b"")
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        """用连接协商的编解码器解码客户端消息
+
+        Raises:
+            MessageDecodeError: 消息格式无效
+        """
+        return self.codec.decode(data)
+
+    async def flush(self, timeout: float = 1.0) -> None:
+        """等待队列中的消息发送完毕
+
+        Args:
+            timeout: 最长等待时间（秒）
+        """
+        if self.closed or self._writer is None or self._writer.done():
+            return
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out flushing {len(self._pending)} pending frames")
+
+    async def shutdown(self, timeout: float = 1.0) -> None:
+        """尽量发送完剩余消息后停止写任务
+
+        Args:
+            timeout: 等待剩余消息发送的最长时间（秒）
+        """
+        await self.flush(timeout)
+        self.closed = True
+        self._pending.clear()
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+
+    async def close(self, code: int = 1000, timeout: float = 1.0) -> None:
+        """发送完剩余消息后关闭连接
+
+        Args:
+            code: WebSocket关闭码
+            timeout: 等待剩余消息发送的最长时间（秒）
+        """
+        await self.shutdown(timeout)
+        await self.websocket.close(code=code)
+
+    def _abort(self, code: int) -> None:
+        """丢弃积压的消息并在后台关闭连接"""
+        self.closed = True
+        self._pending.clear()
+        self._drained.set()
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+        asyncio.create_task(self._close_quietly(code))
+
+    async def _close_quietly(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            logger.debug(f"Failed to close websocket: {e}")
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """获取所有连接的发送队列统计
+
+        Returns:
+            Dict[str, Any]: 合并的answer帧数、被取代丢弃的消息数和因积压断开的连接数
+        """
+        return {
+            "coalesced": cls.coalesced_total,
+            "superseded": cls.superseded_total,
+            "overflow_disconnects": cls.overflow_disconnects
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.websocket, name)
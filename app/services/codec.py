@@ -0,0 +1,105 @@
+"""WebSocket消息编解码"""
+
+from typing import Any, Dict, Iterable, Optional, Union
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# MessagePack编码使用的WebSocket子协议名
+MSGPACK_SUBPROTOCOL = "msgpack"
+
+
+class MessageDecodeError(ValueError):
+    """客户端消息无法解码"""
+
+
+class JSONCodec:
+    """JSON文本帧编解码，安装了orjson时使用orjson，否则使用标准库json"""
+
+    subprotocol: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return "orjson" if orjson else "json"
+
+    def encode(self, message: Dict[str, Any]) -> str:
+        """把消息编码为文本帧"""
+        if orjson:
+            return orjson.dumps(message).decode()
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        """解码客户端消息帧
+
+        Raises:
+            MessageDecodeError: 不是合法的JSON
+        """
+        try:
+            return orjson.loads(data) if orjson else json.loads(data)
+        except ValueError as e:
+            raise MessageDecodeError(str(e)) from e
+
+    async def send(self, websocket: Any, message: Dict[str, Any]) -> None:
+        """编码并发送一条消息"""
+        await websocket.send_text(self.encode(message))
+
+
+class MsgpackCodec:
+    """MessagePack二进制帧编解码（需要安装msgpack）"""
+
+    subprotocol: Optional[str] = MSGPACK_SUBPROTOCOL
+    name = "msgpack"
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        """把消息编码为二进制帧"""
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        """解码客户端消息帧
+
+        Raises:
+            MessageDecodeError: 不是合法的MessagePack
+        """
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise MessageDecodeError(str(e)) from e
+
+    async def send(self, websocket: Any, message: Dict[str, Any]) -> None:
+        """编码并发送一条消息"""
+        await websocket.send_bytes(self.encode(message))
+
+
+json_codec = JSONCodec()
+msgpack_codec = MsgpackCodec()
+
+
+def negotiate_codec(requested: Iterable[str], allow_msgpack: bool = True) -> Any:
+    """根据客户端请求的子协议选择编解码器
+
+    客户端在 ``Sec-WebSocket-Protocol`` 中请求 ``msgpack`` 且服务端允许并安装了msgpack时使用
+    MessagePack二进制帧，否则使用JSON文本帧。
+
+    Args:
+        requested: 客户端请求的子协议列表
+        allow_msgpack: 是否允许MessagePack子协议
+
+    Returns:
+        Any: 编解码器，其 ``subprotocol`` 用于接受连接
+    """
+    if MSGPACK_SUBPROTOCOL in requested and allow_msgpack:
+        if msgpack is not None:
+            return msgpack_codec
+        logger.warning("Client requested msgpack subprotocol but 'msgpack' is not installed, using JSON")
+    return json_codec
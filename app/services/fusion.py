@@ -0,0 +1,216 @@
+"""搜索 + RAG 融合查询"""
+
+from dataclasses import replace
+from typing import Dict, Any, AsyncIterator, Optional
+from app.models.batch_task import QueryResult
+from app.services.provider_chain import open_stream, close_stream
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 把搜索结果作为上下文注入RAG问题的模板
+GROUNDED_QUESTION_TEMPLATE = (
+    "请参考以下实时搜索结果回答问题。如果搜索结果与问题无关，请忽略它们。\n\n"
+    "搜索结果：\n{context}\n\n"
+    "问题：{question}"
+)
+
+
+def build_grounded_question(question: str, search_result: QueryResult) -> str:
+    """把搜索摘要拼接到问题中
+
+    通过改写问题注入上下文，对所有RAG提供商都适用。
+
+    Args:
+        question: 用户问题
+        search_result: 搜索结果
+
+    Returns:
+        str: 带搜索上下文的问题
+    """
+    return GROUNDED_QUESTION_TEMPLATE.format(context=search_result.content, question=question)
+
+
+class FusionProvider:
+    """并行执行搜索和RAG查询并融合结果
+
+    搜索和普通RAG查询同时发起：
+    - 搜索在 ``search_timeout`` 内返回时，取消普通RAG，用搜索摘要作为上下文发起带依据的RAG查询；
+      该查询失败或超时则退回搜索结果。
+    - 搜索超时或失败时，直接使用已经在进行的普通RAG查询，不额外增加延迟；
+      普通RAG也失败时，如果搜索最终返回则退回搜索结果。
+    RAG查询（流式查询为第一个片段）受 ``rag_timeout`` 限制。
+    """
+
+    def __init__(self, rag_provider: Any, search_provider: Any, config: Optional[Dict[str, Any]] = None):
+        """初始化融合查询
+
+        Args:
+            rag_provider: RAG提供商
+            search_provider: 搜索提供商
+            config: 融合配置，包含search_timeout、rag_timeout
+        """
+        config = config or {}
+        self.rag_provider = rag_provider
+        self.search_provider = search_provider
+        self.search_timeout = config.get("search_timeout", 1.5)
+        self.rag_timeout = config.get("rag_timeout", 20.0)
+        self.outcomes = {"grounded": 0, "rag_only": 0, "search_only": 0}
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """融合结果使用独立的缓存作用域"""
+        return {"provider": f"fusion:{self.rag_provider.config.get('provider', self.rag_provider.name)}"}
+
+    @property
+    def name(self) -> str:
+        """提供商名称"""
+        return f"Fusion({self.rag_provider.name} + {self.search_provider.name})"
+
+    @property
+    def provider_type(self) -> str:
+        """提供商类型"""
+        return "RAG"
+
+    async def _wait_search(self, task: asyncio.Task, timeout: float) -> Optional[QueryResult]:
+        """在期限内等待搜索结果，超时不取消搜索（留作RAG失败时的后备）
+
+        Returns:
+            Optional[QueryResult]: 有内容的搜索结果，超时、失败或无结果时返回None
+        """
+        done, _ = await asyncio.wait({task}, timeout=max(0.0, timeout))
+        if not done:
+            return None
+        if task.exception() is not None:
+            logger.warning(f"Fusion search failed: {task.exception()}")
+            return None
+        result = task.result()
+        return result if result and result.content else None
+
+    def _tag(self, result: QueryResult, outcome: str,
+             search_result: Optional[QueryResult] = None) -> QueryResult:
+        """记录融合结果类型，带依据的答案附上搜索来源"""
+        self.outcomes[outcome] += 1
+        sources = result.sources
+        if search_result is not None and not sources:
+            sources = search_result.sources
+        return replace(
+            result,
+            metadata={**(result.metadata or {}), "fusion": outcome},
+            sources=sources
+        )
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        started = time.monotonic()
+        search_task = asyncio.ensure_future(self.search_provider.search(question, **kwargs))
+        plain_task = asyncio.ensure_future(self.rag_provider.query(question, **kwargs))
+
+        try:
+            search_result = await self._wait_search(search_task, self.search_timeout)
+            if search_result:
+                plain_task.cancel()
+                try:
+                    result = await asyncio.wait_for(
+                        self.rag_provider.query(build_grounded_question(question, search_result), **kwargs),
+                        self.rag_timeout
+                    )
+                    return self._tag(result, "grounded", search_result)
+                except Exception as e:
+                    logger.warning(f"Grounded RAG failed, falling back to search result: {e}")
+                    return self._tag(search_result, "search_only")
+
+            remaining = self.rag_timeout - (time.monotonic() - started)
+            try:
+                result = await asyncio.wait_for(plain_task, max(0.0, remaining))
+                return self._tag(result, "rag_only")
+            except Exception as e:
+                remaining = self.rag_timeout - (time.monotonic() - started)
+                fallback = await self._wait_search(search_task, remaining)
+                if fallback:
+                    logger.warning(f"RAG failed, falling back to search result: {e}")
+                    return self._tag(fallback, "search_only")
+                raise
+        finally:
+            self._cancel(search_task)
+            self._cancel(plain_task)
+
+    async def stream_query(self, question: str, **kwargs) -> AsyncIterator[str]:
+        started = time.monotonic()
+        search_task = asyncio.ensure_future(self.search_provider.search(question, **kwargs))
+        plain_task = asyncio.ensure_future(open_stream(self.rag_provider, question, kwargs))
+        stream = None
+
+        try:
+            search_result = await self._wait_search(search_task, self.search_timeout)
+            if search_result:
+                await self._discard(plain_task)
+                try:
+                    stream, first = await asyncio.wait_for(
+                        open_stream(self.rag_provider, build_grounded_question(question, search_result), kwargs),
+                        self.rag_timeout
+                    )
+                    self.outcomes["grounded"] += 1
+                except Exception as e:
+                    logger.warning(f"Grounded RAG stream failed, falling back to search result: {e}")
+                    self.outcomes["search_only"] += 1
+                    yield search_result.content
+                    return
+            else:
+                remaining = self.rag_timeout - (time.monotonic() - started)
+                try:
+                    stream, first = await asyncio.wait_for(plain_task, max(0.0, remaining))
+                    self.outcomes["rag_only"] += 1
+                except Exception as e:
+                    remaining = self.rag_timeout - (time.monotonic() - started)
+                    fallback = await self._wait_search(search_task, remaining)
+                    if not fallback:
+                        raise
+                    logger.warning(f"RAG stream failed, falling back to search result: {e}")
+                    self.outcomes["search_only"] += 1
+                    yield fallback.content
+                    return
+
+            if stream is None:
+                return
+
+            yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            self._cancel(search_task)
+            await self._discard(plain_task)
+            if stream is not None:
+                await stream.aclose()
+
+    @staticmethod
+    def _cancel(task: asyncio.Task) -> None:
+        """取消未完成的任务；已完成的任务读取其异常，避免未读取异常的警告"""
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    async def _discard(task: asyncio.Task) -> None:
+        """取消未使用的普通RAG流，已经打开的流需要关闭"""
+        if not task.done():
+            task.cancel()
+            return
+        if not task.cancelled() and task.exception() is None:
+            opened = task.result()
+            if opened[0] is not None:
+                await close_stream(opened)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取融合查询统计
+
+        Returns:
+            Dict[str, Any]: 各类结果（带依据、仅RAG、仅搜索）的次数
+        """
+        return {
+            **self.outcomes,
+            "search_timeout": self.search_timeout,
+            "rag_timeout": self.rag_timeout
+        }
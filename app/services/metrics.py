@@ -0,0 +1,111 @@
+"""Prometheus指标
+
+安装了 ``prometheus_client`` 时指标注册到默认注册表并通过 ``/metrics`` 导出；
+未安装时所有指标都是空操作，埋点代码无需判断。
+"""
+
+from contextlib import nullcontext
+from typing import Any, Callable, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+# 延迟类直方图的分桶（秒），覆盖从缓存命中到长答案生成
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+class _NoopMetric:
+    """未安装prometheus_client时使用的空指标"""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        pass
+
+    def track_inprogress(self) -> Any:
+        return nullcontext()
+
+
+def _histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+               buckets: Sequence[float] = LATENCY_BUCKETS) -> Any:
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def _gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Any:
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Gauge(name, documentation, labelnames)
+
+
+# 最终化ASR文本到达到第一条answer帧发出的延迟
+ANSWER_LATENCY = _histogram(
+    "realtime_rag_answer_first_frame_seconds",
+    "Latency from the final ASR chunk (or instant_query) to the first answer frame"
+)
+
+# 上游提供商调用耗时，mode为blocking（query/search）或stream
+PROVIDER_LATENCY = _histogram(
+    "realtime_rag_provider_latency_seconds",
+    "Upstream provider call duration",
+    ("provider", "mode")
+)
+
+# 流式查询的首个片段延迟
+TIME_TO_FIRST_TOKEN = _histogram(
+    "realtime_rag_time_to_first_token_seconds",
+    "Time from starting an upstream stream to its first chunk",
+    ("provider",)
+)
+
+# 批量任务中单个文本的处理耗时
+BATCH_ITEM_LATENCY = _histogram(
+    "realtime_rag_batch_item_seconds",
+    "Processing time of a single batch item",
+    ("status",)
+)
+
+ACTIVE_SESSIONS = _gauge("realtime_rag_active_sessions", "Open WebSocket sessions")
+
+INFLIGHT_REQUESTS = _gauge(
+    "realtime_rag_inflight_requests",
+    "Upstream provider requests in flight (after cache and single-flight)",
+    ("provider",)
+)
+
+BATCH_QUEUE_DEPTH = _gauge("realtime_rag_batch_queue_depth", "Batch tasks waiting to start")
+
+CACHE_HIT_RATIO = _gauge("realtime_rag_cache_hit_ratio", "Exact response cache hit ratio since start")
+
+
+def is_available() -> bool:
+    """是否安装了prometheus_client"""
+    return prometheus_client is not None
+
+
+def render() -> Tuple[bytes, str]:
+    """导出Prometheus文本格式的指标
+
+    Returns:
+        Tuple[bytes, str]: (指标内容, Content-Type)
+    """
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
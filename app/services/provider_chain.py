@@ -0,0 +1,271 @@
+"""RAG提供商链：故障转移与对冲请求"""
+
+from collections import deque
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from app.models.batch_task import QueryResult
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+async def open_stream(provider: Any, question: str,
+                      options: Dict[str, Any]) -> Tuple[Optional[AsyncIterator[str]], Optional[str]]:
+    """打开提供商的流并等待第一个片段
+
+    Args:
+        provider: RAG提供商
+        question: 用户问题
+        options: 查询选项
+
+    Returns:
+        Tuple: (流, 第一个片段)，流为空时返回 (None, None)
+    """
+    stream = provider.stream_query(question, **options)
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        return None, None
+    except BaseException:
+        # 失败或被取消（如对冲中落败）时关闭流，释放上游连接
+        await stream.aclose()
+        raise
+    return stream, first
+
+
+async def close_stream(opened: Tuple[Optional[AsyncIterator[str]], Optional[str]]) -> None:
+    """关闭 ``open_stream`` 打开但未被使用的流"""
+    stream, _ = opened
+    if stream is not None:
+        await stream.aclose()
+
+
+class LatencyTracker:
+    """记录最近若干次的首响应延迟并计算分位数"""
+
+    def __init__(self, window: int = 200):
+        """初始化延迟记录
+
+        Args:
+            window: 保留的最近样本数
+        """
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        """记录一次延迟（秒）"""
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        """计算延迟分位数
+
+        Args:
+            quantile: 分位（0-1）
+
+        Returns:
+            Optional[float]: 分位数（秒），没有样本时返回None
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(quantile * len(ordered)))
+        return ordered[index]
+
+
+class ProviderChain:
+    """按顺序组合多个RAG提供商
+
+    主提供商失败时立即转移到下一个提供商；启用对冲时，如果当前提供商在其历史首响应延迟的
+    p95（可配置）内还没有返回第一个片段，就同时向下一个提供商发起请求。
+    先返回的一方胜出，其余请求被取消。流式查询在输出第一个片段之后不再切换提供商。
+    """
+
+    def __init__(self, providers: List[Any], hedge_config: Optional[Dict[str, Any]] = None):
+        """初始化提供商链
+
+        Args:
+            providers: 按优先级排列的提供商
+            hedge_config: 对冲请求配置
+        """
+        hedge_config = hedge_config or {}
+        self.members = providers
+        self.hedge_enabled = hedge_config.get("enabled", True)
+        self.hedge_quantile = hedge_config.get("quantile", 0.95)
+        self.hedge_min_delay = hedge_config.get("min_delay", 0.3)
+        self.hedge_default_delay = hedge_config.get("default_delay", 2.0)
+        self.hedge_min_samples = hedge_config.get("min_samples", 20)
+
+        self.latency = {p.name: LatencyTracker() for p in providers}
+        self.wins = {p.name: 0 for p in providers}
+        self.hedges = 0
+        self.failovers = 0
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """主提供商的配置（缓存作用域等按主提供商计算）"""
+        return self.members[0].config
+
+    @property
+    def name(self) -> str:
+        """提供商名称"""
+        return "ProviderChain(" + " > ".join(p.name for p in self.members) + ")"
+
+    @property
+    def provider_type(self) -> str:
+        """提供商类型"""
+        return "RAG"
+
+    def hedge_delay(self, provider: Any) -> float:
+        """计算向下一个提供商发起对冲请求前的等待时间
+
+        Args:
+            provider: 当前最后发起请求的提供商
+
+        Returns:
+            float: 等待秒数，样本不足时使用默认值
+        """
+        tracker = self.latency[provider.name]
+        if len(tracker) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, tracker.percentile(self.hedge_quantile))
+
+    async def _race(self, start: Callable[[Any], Awaitable[Any]],
+                    discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Any:
+        """依次向提供商发起请求，返回最先成功的结果
+
+        Args:
+            start: 向指定提供商发起请求，返回首个结果
+            discard: 处理同时完成但未被采用的结果（如关闭流）
+
+        Returns:
+            Any: 胜出请求的结果
+
+        Raises:
+            Exception: 所有提供商都失败时抛出最后一个错误
+        """
+        candidates = iter(self.members)
+        running: Dict[asyncio.Task, Tuple[Any, float]] = {}
+        last_error: Optional[BaseException] = None
+        launched = 0
+
+        def launch() -> bool:
+            nonlocal launched
+            provider = next(candidates, None)
+            if provider is None:
+                return False
+            task = asyncio.ensure_future(start(provider))
+            running[task] = (provider, time.monotonic())
+            launched += 1
+            return True
+
+        launch()
+        try:
+            while running:
+                # 只有还能向下一个提供商发起请求时才按对冲延迟等待；
+                # 失败的请求已从running中移除，不能用len(running)判断是否还有候选
+                timeout = None
+                if self.hedge_enabled and launched < len(self.members):
+                    provider, started = max(running.values(), key=lambda item: item[1])
+                    timeout = max(0.0, started + self.hedge_delay(provider) - time.monotonic())
+
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 超过对冲延迟仍无响应，向下一个提供商发起对冲请求
+                    if launch():
+                        self.hedges += 1
+                        logger.info(f"Hedging request to next provider after {timeout:.2f}s")
+                    continue
+
+                winner = None
+                failures = 0
+                for task in done:
+                    provider, started = running.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        failures += 1
+                        logger.warning(f"{provider.name} failed in provider chain: {last_error}")
+                        continue
+                    if winner is None:
+                        winner = (task.result(), provider, started)
+                    elif discard:
+                        await discard(task.result())
+
+                if winner is not None:
+                    result, provider, started = winner
+                    self.latency[provider.name].record(time.monotonic() - started)
+                    self.wins[provider.name] += 1
+                    return result
+
+                # 每个失败的请求立即转移到下一个提供商
+                for _ in range(failures):
+                    if launch():
+                        self.failovers += 1
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        raise last_error or Exception("没有可用的RAG服务提供商")
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        return await self._race(lambda provider: provider.query(question, **kwargs))
+
+    async def stream_query(self, question: str, **kwargs) -> AsyncIterator[str]:
+        stream, first = await self._race(
+            lambda provider: open_stream(provider, question, kwargs),
+            discard=close_stream
+        )
+        if stream is None:
+            return
+
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def health_check(self) -> bool:
+        """任一提供商可用即视为可用"""
+        for provider in self.members:
+            try:
+                if await provider.health_check():
+                    return True
+            except Exception as e:
+                logger.error(f"{provider.name} health check failed: {e}")
+        return False
+
+    async def startup(self) -> None:
+        for provider in self.members:
+            await provider.startup()
+
+    async def shutdown(self) -> None:
+        for provider in self.members:
+            await provider.shutdown()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取提供商链统计信息
+
+        Returns:
+            Dict[str, Any]: 各提供商的胜出次数、首响应p95，以及对冲和故障转移次数
+        """
+        return {
+            "providers": [
+                {
+                    "name": p.name,
+                    "wins": self.wins[p.name],
+                    "samples": len(self.latency[p.name]),
+                    "p95": self.latency[p.name].percentile(0.95),
+                    "hedge_delay": round(self.hedge_delay(p), 3)
+                }
+                for p in self.members
+            ],
+            "hedge_enabled": self.hedge_enabled,
+            "hedges": self.hedges,
+            "failovers": self.failovers
+        }
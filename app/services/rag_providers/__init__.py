@@ -6,6 +6,7 @@ from .openai import OpenAIProvider
 from .serper import SerperProvider
 from .custom import CustomRAGProvider
 from .dify import DifyProvider
+from .mock import MockRAGProvider
 
 __all__ = [
     "BaseRAGProvider",
@@ -14,5 +15,6 @@ __all__ = [
     "OpenAIProvider",
     "SerperProvider",
     "CustomRAGProvider",
-    "DifyProvider"
+    "DifyProvider",
+    "MockRAGProvider"
 ]
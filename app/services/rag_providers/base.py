@@ -3,12 +3,14 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional, AsyncIterator
 from app.models.batch_task import QueryResult
+from .http_client import PooledHTTPClientMixin
 
 
-class BaseRAGProvider(ABC):
+class BaseRAGProvider(PooledHTTPClientMixin, ABC):
     """RAG提供商基础抽象类
     
     定义RAG服务提供商的标准接口。所有RAG提供商必须实现这些方法。
+    每个提供商持有一个长连接的HTTP连接池（见 ``client``）。
     """
     
     def __init__(self, config: Dict[str, Any]):
@@ -72,10 +74,11 @@ class BaseRAGProvider(ABC):
         return "RAG"
 
 
-class BaseSearchProvider(ABC):
+class BaseSearchProvider(PooledHTTPClientMixin, ABC):
     """搜索提供商基础抽象类
     
     定义搜索服务提供商的标准接口。所有搜索提供商必须实现这些方法。
+    每个提供商持有一个长连接的HTTP连接池（见 ``client``）。
     """
     
     def __init__(self, config: Dict[str, Any]):
@@ -55,28 +55,27 @@ class CustomRAGProvider(BaseRAGProvider):
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(self.api_url, json=payload, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                # 尝试从不同的响应格式中提取内容
-                content = (
-                    data.get("answer") or 
-                    data.get("content") or 
-                    data.get("response") or
-                    str(data)
-                )
-                
-                return QueryResult(
-                    content=content,
-                    metadata={
-                        "provider": self.name,
-                        **data.get("metadata", {})
-                    },
-                    sources=data.get("sources"),
-                    usage=data.get("usage")
-                )
+            response = await self.client.post(self.api_url, json=payload, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            # 尝试从不同的响应格式中提取内容
+            content = (
+                data.get("answer") or 
+                data.get("content") or 
+                data.get("response") or
+                str(data)
+            )
+            
+            return QueryResult(
+                content=content,
+                metadata={
+                    "provider": self.name,
+                    **data.get("metadata", {})
+                },
+                sources=data.get("sources"),
+                usage=data.get("usage")
+            )
         except httpx.HTTPError as e:
             logger.error(f"Custom RAG query failed: {e}")
             raise Exception(f"自定义RAG查询失败: {str(e)}")
@@ -103,21 +102,20 @@ class CustomRAGProvider(BaseRAGProvider):
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                async with client.stream("POST", self.api_url, json=payload, headers=headers) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line:
-                            # 尝试解析JSON格式的流式响应
-                            try:
-                                import json
-                                chunk = json.loads(line)
-                                content = chunk.get("content") or chunk.get("delta") or ""
-                                if content:
-                                    yield content
-                            except json.JSONDecodeError:
-                                # 如果不是JSON，直接返回文本
-                                yield line
+            async with self.client.stream("POST", self.api_url, json=payload, headers=headers) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        # 尝试解析JSON格式的流式响应
+                        try:
+                            import json
+                            chunk = json.loads(line)
+                            content = chunk.get("content") or chunk.get("delta") or ""
+                            if content:
+                                yield content
+                        except json.JSONDecodeError:
+                            # 如果不是JSON，直接返回文本
+                            yield line
         except httpx.HTTPError as e:
             logger.error(f"Custom RAG stream query failed: {e}")
             raise Exception(f"自定义RAG流式查询失败: {str(e)}")
@@ -131,10 +129,8 @@ class CustomRAGProvider(BaseRAGProvider):
         try:
             # 尝试发送一个健康检查请求
             health_url = self.config.get("health_url", f"{self.api_url}/health")
-            
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(health_url, headers=self.headers)
-                return response.status_code == 200
+            response = await self.client.get(health_url, headers=self.headers, timeout=5.0)
+            return response.status_code == 200
         except Exception as e:
             logger.error(f"Custom RAG health check failed: {e}")
             return False
@@ -62,41 +62,40 @@ class DifyProvider(BaseRAGProvider):
             payload["files"] = kwargs["files"]
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                # 提取答案内容
-                content = data.get("answer", "")
-                
-                # 提取来源信息
-                sources = []
-                if "metadata" in data and "retriever_resources" in data["metadata"]:
-                    for resource in data["metadata"]["retriever_resources"]:
-                        sources.append({
-                            "title": resource.get("document_name", ""),
-                            "content": resource.get("content", ""),
-                            "score": resource.get("score", 0),
-                            "position": resource.get("position", 0)
-                        })
-                
-                return QueryResult(
-                    content=content,
-                    metadata={
-                        "provider": self.name,
-                        "conversation_id": data.get("conversation_id"),
-                        "message_id": data.get("id"),
-                        "created_at": data.get("created_at"),
-                        "mode": data.get("mode", "chat")
-                    },
-                    sources=sources if sources else None,
-                    usage={
-                        "tokens": data.get("metadata", {}).get("usage", {}).get("total_tokens", 0),
-                        "prompt_tokens": data.get("metadata", {}).get("usage", {}).get("prompt_tokens", 0),
-                        "completion_tokens": data.get("metadata", {}).get("usage", {}).get("completion_tokens", 0)
-                    }
-                )
+            response = await self.client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            # 提取答案内容
+            content = data.get("answer", "")
+            
+            # 提取来源信息
+            sources = []
+            if "metadata" in data and "retriever_resources" in data["metadata"]:
+                for resource in data["metadata"]["retriever_resources"]:
+                    sources.append({
+                        "title": resource.get("document_name", ""),
+                        "content": resource.get("content", ""),
+                        "score": resource.get("score", 0),
+                        "position": resource.get("position", 0)
+                    })
+            
+            return QueryResult(
+                content=content,
+                metadata={
+                    "provider": self.name,
+                    "conversation_id": data.get("conversation_id"),
+                    "message_id": data.get("id"),
+                    "created_at": data.get("created_at"),
+                    "mode": data.get("mode", "chat")
+                },
+                sources=sources if sources else None,
+                usage={
+                    "tokens": data.get("metadata", {}).get("usage", {}).get("total_tokens", 0),
+                    "prompt_tokens": data.get("metadata", {}).get("usage", {}).get("prompt_tokens", 0),
+                    "completion_tokens": data.get("metadata", {}).get("usage", {}).get("completion_tokens", 0)
+                }
+            )
         except httpx.HTTPError as e:
             logger.error(f"Dify query failed: {e}")
             # 尝试解析错误响应
@@ -137,52 +136,51 @@ class DifyProvider(BaseRAGProvider):
             payload["files"] = kwargs["files"]
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                async with client.stream("POST", url, json=payload, headers=headers) as response:
-                    response.raise_for_status()
+            async with self.client.stream("POST", url, json=payload, headers=headers) as response:
+                response.raise_for_status()
+                
+                async for line in response.aiter_lines():
+                    if not line or not line.strip():
+                        continue
                     
-                    async for line in response.aiter_lines():
-                        if not line or not line.strip():
-                            continue
+                    # Dify使用SSE格式，每行以"data: "开头
+                    if line.startswith("data: "):
+                        data_str = line[6:]  # 移除"data: "前缀
                         
-                        # Dify使用SSE格式，每行以"data: "开头
-                        if line.startswith("data: "):
-                            data_str = line[6:]  # 移除"data: "前缀
+                        try:
+                            data = json.loads(data_str)
+                            event = data.get("event")
                             
-                            try:
-                                data = json.loads(data_str)
-                                event = data.get("event")
-                                
-                                # 处理不同的事件类型
-                                if event == "message":
-                                    # 消息内容
-                                    answer = data.get("answer", "")
-                                    if answer:
-                                        yield answer
-                                
-                                elif event == "agent_message":
-                                    # Agent消息
-                                    answer = data.get("answer", "")
-                                    if answer:
-                                        yield answer
-                                
-                                elif event == "message_end":
-                                    # 消息结束，可以获取完整的元数据
-                                    logger.info(f"Stream ended, conversation_id: {data.get('conversation_id')}")
-                                    break
-                                
-                                elif event == "error":
-                                    # 错误事件
-                                    error_msg = data.get("message", "Unknown error")
-                                    logger.error(f"Dify stream error: {error_msg}")
-                                    raise Exception(f"Dify流式查询错误: {error_msg}")
-                                
-                                # 其他事件类型（workflow_started, node_started等）可以忽略
-                                
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"Failed to parse SSE data: {data_str}, error: {e}")
-                                continue
-                        
+                            # 处理不同的事件类型
+                            if event == "message":
+                                # 消息内容
+                                answer = data.get("answer", "")
+                                if answer:
+                                    yield answer
+                            
+                            elif event == "agent_message":
+                                # Agent消息
+                                answer = data.get("answer", "")
+                                if answer:
+                                    yield answer
+                            
+                            elif event == "message_end":
+                                # 消息结束，可以获取完整的元数据
+                                logger.info(f"Stream ended, conversation_id: {data.get('conversation_id')}")
+                                break
+                            
+                            elif event == "error":
+                                # 错误事件
+                                error_msg = data.get("message", "Unknown error")
+                                logger.error(f"Dify stream error: {error_msg}")
+                                raise Exception(f"Dify流式查询错误: {error_msg}")
+                            
+                            # 其他事件类型（workflow_started, node_started等）可以忽略
+                            
+                        except json.JSONDecodeError as e:
+                            logger.warning(f"Failed to parse SSE data: {data_str}, error: {e}")
+                            continue
+                    
         except httpx.HTTPError as e:
             logger.error(f"Dify stream query failed: {e}")
             raise Exception(f"Dify流式查询失败: {str(e)}")
@@ -197,10 +195,8 @@ class DifyProvider(BaseRAGProvider):
             # 使用参数列表端点进行健康检查
             url = f"{self.base_url}/parameters"
             headers = {"Authorization": f"Bearer {self.api_key}"}
-            
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(url, headers=headers)
-                return response.status_code == 200
+            response = await self.client.get(url, headers=headers, timeout=5.0)
+            return response.status_code == 200
         except Exception as e:
             logger.error(f"Dify health check failed: {e}")
             return False
@@ -230,10 +226,9 @@ class DifyProvider(BaseRAGProvider):
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return response.json()
+            response = await self.client.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPError as e:
             logger.error(f"Failed to get conversation messages: {e}")
             raise Exception(f"获取会话消息失败: {str(e)}")
@@ -260,10 +255,9 @@ class DifyProvider(BaseRAGProvider):
             params["last_id"] = last_id
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return response.json()
+            response = await self.client.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPError as e:
             logger.error(f"Failed to get conversations: {e}")
             raise Exception(f"获取会话列表失败: {str(e)}")
@@ -290,10 +284,9 @@ class DifyProvider(BaseRAGProvider):
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                return response.json()
+            response = await self.client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPError as e:
             logger.error(f"Failed to rename conversation: {e}")
             raise Exception(f"重命名会话失败: {str(e)}")
@@ -312,10 +305,9 @@ class DifyProvider(BaseRAGProvider):
         params = {"user": self.user}
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.delete(url, headers=headers, params=params)
-                response.raise_for_status()
-                return True
+            response = await self.client.delete(url, headers=headers, params=params)
+            response.raise_for_status()
+            return True
         except httpx.HTTPError as e:
             logger.error(f"Failed to delete conversation: {e}")
             return False
@@ -334,10 +326,9 @@ class DifyProvider(BaseRAGProvider):
         params = {"user": self.user}
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return response.json()
+            response = await self.client.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPError as e:
             logger.error(f"Failed to get suggested questions: {e}")
             raise Exception(f"获取建议问题失败: {str(e)}")
@@ -359,10 +350,9 @@ class DifyProvider(BaseRAGProvider):
         payload = {"user": self.user}
         
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                return True
+            response = await self.client.post(url, json=payload, headers=headers, timeout=5.0)
+            response.raise_for_status()
+            return True
         except httpx.HTTPError as e:
             logger.error(f"Failed to stop message: {e}")
             return False
@@ -393,10 +383,9 @@ class DifyProvider(BaseRAGProvider):
             payload["content"] = content
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                return True
+            response = await self.client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            return True
         except httpx.HTTPError as e:
             logger.error(f"Failed to send feedback: {e}")
             return False
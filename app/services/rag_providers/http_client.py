@@ -0,0 +1,138 @@
+"""提供商共享的HTTP连接池"""
+
+import httpx
+from typing import Dict, Any, Optional
+from app.services.spans import connect_tracer, current_spans
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    """检查是否安装了HTTP/2依赖（h2）"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_http_client(http_config: Dict[str, Any], timeout: float,
+                      event_hooks: Optional[Dict[str, list]] = None) -> httpx.AsyncClient:
+    """根据连接池配置创建长连接的httpx客户端
+
+    Args:
+        http_config: 连接池配置，包含max_connections、max_keepalive_connections、
+            keepalive_expiry、http2、connect_timeout等
+        timeout: 默认请求超时时间（秒）
+        event_hooks: httpx事件钩子
+
+    Returns:
+        httpx.AsyncClient: 带连接池的异步客户端
+    """
+    limits = httpx.Limits(
+        max_connections=http_config.get("max_connections", 100),
+        max_keepalive_connections=http_config.get("max_keepalive_connections", 20),
+        keepalive_expiry=http_config.get("keepalive_expiry", 30.0)
+    )
+
+    http2 = http_config.get("http2", False)
+    if http2 and not _http2_available():
+        logger.warning("HTTP_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=http_config.get("connect_timeout", timeout)),
+        limits=limits,
+        http2=http2,
+        event_hooks=event_hooks or {}
+    )
+
+
+class PooledHTTPClientMixin:
+    """为提供商提供一个长生命周期的连接池客户端
+
+    客户端由应用生命周期（startup/shutdown）打开和关闭；
+    未经生命周期启动时在首次使用时惰性创建。
+    """
+
+    _client: Optional[httpx.AsyncClient] = None
+    _requests_total: int = 0
+
+    @property
+    def http_config(self) -> Dict[str, Any]:
+        """连接池配置"""
+        return self.config.get("http", {})
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """获取共享的HTTP客户端
+
+        Returns:
+            httpx.AsyncClient: 连接池客户端
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = build_http_client(
+                self.http_config,
+                getattr(self, "timeout", 30.0),
+                event_hooks={"request": [self._on_request]}
+            )
+        return self._client
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        """请求事件钩子，用于统计请求数，并在记录问题耗时时跟踪建立连接的时间"""
+        self._requests_total += 1
+        recorder = current_spans.get()
+        if recorder is not None:
+            request.extensions["trace"] = connect_tracer(recorder)
+
+    async def startup(self) -> None:
+        """打开连接池"""
+        _ = self.client
+        logger.info(f"{self.name} HTTP pool opened")
+
+    async def shutdown(self) -> None:
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info(f"{self.name} HTTP pool closed")
+        self._client = None
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息
+
+        Returns:
+            Dict[str, Any]: 连接数、空闲连接数、等待中的请求数等
+        """
+        http_config = self.http_config
+        stats = {
+            "open": self._client is not None and not self._client.is_closed,
+            "http2": bool(http_config.get("http2", False)) and _http2_available(),
+            "max_connections": http_config.get("max_connections", 100),
+            "max_keepalive_connections": http_config.get("max_keepalive_connections", 20),
+            "requests_total": self._requests_total,
+            "connections": 0,
+            "idle_connections": 0,
+            "active_connections": 0,
+            "pending_requests": 0
+        }
+
+        if not stats["open"]:
+            return stats
+
+        # httpcore没有公开的连接池统计接口，这里尽力读取内部状态
+        pool = getattr(self._client._transport, "_pool", None)
+        if pool is None:
+            return stats
+
+        try:
+            connections = list(getattr(pool, "connections", []))
+            idle = sum(1 for conn in connections if conn.is_idle())
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = idle
+            stats["active_connections"] = len(connections) - idle
+            stats["pending_requests"] = len(getattr(pool, "_requests", []))
+        except Exception as e:
+            logger.debug(f"Failed to read HTTP pool stats for {self.name}: {e}")
+
+        return stats
@@ -0,0 +1,318 @@
+"""本地模拟和录制回放RAG提供商实现"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+from .base import BaseRAGProvider
+from app.models.batch_task import QueryResult
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANSWER = (
+    "这是模拟提供商生成的答案。检索增强生成先从知识库中找出与问题相关的文档片段，"
+    "再把这些片段和问题一起交给语言模型。模型根据检索到的内容组织答案，因此可以引用最新的资料。"
+)
+
+DISTRIBUTIONS = ("constant", "uniform", "normal", "exponential", "lognormal")
+
+
+class LatencyDistribution:
+    """延迟分布
+
+    ``jitter`` 是相对离散程度：uniform在均值的 ±jitter 范围内均匀分布，
+    normal的标准差为 ``mean * jitter``，lognormal的对数标准差为 ``jitter``（均值保持不变），
+    exponential只使用均值。
+    """
+
+    def __init__(self, kind: str, mean: float, jitter: float, rng: random.Random):
+        """初始化延迟分布
+
+        Args:
+            kind: 分布类型，见 ``DISTRIBUTIONS``
+            mean: 平均延迟（秒）
+            jitter: 相对离散程度
+            rng: 随机数生成器
+
+        Raises:
+            ValueError: 未知的分布类型
+        """
+        if kind not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.mean = max(mean, 0.0)
+        self.jitter = max(jitter, 0.0)
+        self.rng = rng
+
+    def sample(self) -> float:
+        """采样一次延迟（秒，不小于0）"""
+        if self.mean == 0 or self.kind == "constant":
+            return self.mean
+        if self.kind == "uniform":
+            value = self.mean * (1 + self.rng.uniform(-self.jitter, self.jitter))
+        elif self.kind == "normal":
+            value = self.rng.gauss(self.mean, self.mean * self.jitter)
+        elif self.kind == "exponential":
+            value = self.rng.expovariate(1 / self.mean)
+        else:
+            sigma = self.jitter
+            value = self.rng.lognormvariate(math.log(self.mean) - sigma * sigma / 2, sigma)
+        return max(value, 0.0)
+
+
+def _normalize(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+class MockRAGProvider(BaseRAGProvider):
+    """本地模拟RAG提供商，用于压测和容量规划
+
+    支持三种模式：
+
+    - ``synthetic``：按配置的首个片段延迟、片段间隔和错误率生成答案
+    - ``record``：转发给真实提供商，把响应和每个片段的时间追加到录制文件（JSON Lines）
+    - ``replay``：按原始时间回放录制文件中的响应；问题没有录制时依次使用其他录制
+    """
+
+    def __init__(self, config: Dict[str, Any], upstream: Optional[BaseRAGProvider] = None):
+        """初始化模拟提供商
+
+        Args:
+            config: 配置，包含mode、ttft、token_interval、distribution、jitter、
+                error_rate、tokens、answer、record_path、seed等
+            upstream: record模式下被录制的真实提供商
+
+        Raises:
+            ValueError: 模式无效或录制模式缺少真实提供商
+        """
+        super().__init__(config)
+        self.mode = config.get("mode", "synthetic")
+        self.record_path = config.get("record_path", "./data/mock_recordings.jsonl")
+        self.upstream = upstream
+        self.rng = random.Random(config.get("seed"))
+
+        distribution = config.get("distribution", "uniform")
+        jitter = config.get("jitter", 0.2)
+        self.ttft = LatencyDistribution(distribution, config.get("ttft", 0.3), jitter, self.rng)
+        self.token_interval = LatencyDistribution(
+            distribution, config.get("token_interval", 0.02), jitter, self.rng
+        )
+        self.error_rate = config.get("error_rate", 0.0)
+        self.tokens = max(1, config.get("tokens", 40))
+        self.answer = config.get("answer") or DEFAULT_ANSWER
+
+        self.recordings: Dict[str, List[Dict[str, Any]]] = {}
+        self._replay_order: List[Dict[str, Any]] = []
+        self._replay_cursor = 0
+
+        if self.mode == "record":
+            if upstream is None:
+                raise ValueError("Mock RAG Provider in record mode requires an upstream provider")
+        elif self.mode == "replay":
+            self._load_recordings()
+        elif self.mode != "synthetic":
+            raise ValueError(f"Unknown mock provider mode: {self.mode}")
+
+    def _pieces(self, content: str) -> List[str]:
+        size = max(1, math.ceil(len(content) / self.tokens))
+        return [content[i:i + size] for i in range(0, len(content), size)]
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate > 0 and self.rng.random() < self.error_rate:
+            raise Exception("模拟RAG查询失败")
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        """查询（模拟、录制或回放）
+
+        Args:
+            question: 用户问题
+            **kwargs: 额外参数，record模式下透传给真实提供商
+
+        Returns:
+            QueryResult: 查询结果
+        """
+        if self.mode == "record":
+            return await self._record_query(question, **kwargs)
+        if self.mode == "replay":
+            return await self._replay_query(question)
+
+        await asyncio.sleep(self.ttft.sample())
+        self._maybe_fail()
+        pieces = self._pieces(self.answer)
+        await asyncio.sleep(sum(self.token_interval.sample() for _ in pieces[1:]))
+        return QueryResult(
+            content=self.answer,
+            metadata={"provider": self.name, "mode": self.mode}
+        )
+
+    async def stream_query(self, question: str, **kwargs) -> AsyncIterator[str]:
+        """流式查询（模拟、录制或回放）
+
+        Args:
+            question: 用户问题
+            **kwargs: 额外参数，record模式下透传给真实提供商
+
+        Yields:
+            str: 答案片段
+        """
+        if self.mode == "record":
+            async for chunk in self._record_stream(question, **kwargs):
+                yield chunk
+            return
+        if self.mode == "replay":
+            async for chunk in self._replay_stream(question):
+                yield chunk
+            return
+
+        await asyncio.sleep(self.ttft.sample())
+        self._maybe_fail()
+        for index, piece in enumerate(self._pieces(self.answer)):
+            if index:
+                await asyncio.sleep(self.token_interval.sample())
+            yield piece
+
+    async def _record_query(self, question: str, **kwargs) -> QueryResult:
+        started = time.monotonic()
+        result = await self.upstream.query(question, **kwargs)
+        await self._append({
+            "question": question,
+            "mode": "query",
+            "duration": round(time.monotonic() - started, 4),
+            "content": result.content,
+            "metadata": result.metadata,
+            "sources": result.sources,
+            "usage": result.usage
+        })
+        return result
+
+    async def _record_stream(self, question: str, **kwargs) -> AsyncIterator[str]:
+        started = time.monotonic()
+        chunks = []
+        async for chunk in self.upstream.stream_query(question, **kwargs):
+            chunks.append([round(time.monotonic() - started, 4), chunk])
+            yield chunk
+        # 只录制完整结束的流
+        await self._append({
+            "question": question,
+            "mode": "stream",
+            "duration": round(time.monotonic() - started, 4),
+            "chunks": chunks
+        })
+
+    async def _append(self, entry: Dict[str, Any]) -> None:
+        """把一条录制追加到录制文件"""
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+
+        def write() -> None:
+            directory = os.path.dirname(self.record_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.record_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as e:
+            logger.error(f"Failed to write mock recording: {e}")
+
+    def _load_recordings(self) -> None:
+        """加载录制文件
+
+        Raises:
+            ValueError: 录制文件不存在
+        """
+        if not os.path.exists(self.record_path):
+            raise ValueError(f"Mock recording file not found: {self.record_path}")
+
+        with open(self.record_path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping invalid mock recording at line {number}")
+                    continue
+                self.recordings.setdefault(_normalize(entry.get("question", "")), []).append(entry)
+                self._replay_order.append(entry)
+
+        logger.info(f"Loaded {len(self._replay_order)} mock recordings from {self.record_path}")
+
+    def _find_recording(self, question: str, mode: str) -> Dict[str, Any]:
+        """查找问题的录制，优先使用相同模式的录制
+
+        Raises:
+            Exception: 没有任何录制
+        """
+        if not self._replay_order:
+            raise Exception("没有可回放的录制")
+
+        candidates = self.recordings.get(_normalize(question))
+        if not candidates:
+            # 没有录制的问题依次使用其他录制，压测时问题文本可以随机生成
+            entry = self._replay_order[self._replay_cursor % len(self._replay_order)]
+            self._replay_cursor += 1
+            return entry
+
+        for entry in candidates:
+            if entry.get("mode") == mode:
+                return entry
+        return candidates[0]
+
+    async def _replay_query(self, question: str) -> QueryResult:
+        entry = self._find_recording(question, "query")
+        await asyncio.sleep(entry.get("duration", 0.0))
+        content = entry.get("content")
+        if content is None:
+            content = "".join(chunk for _, chunk in entry.get("chunks", []))
+        return QueryResult(
+            content=content,
+            metadata={**(entry.get("metadata") or {}), "provider": self.name, "mode": "replay"},
+            sources=entry.get("sources"),
+            usage=entry.get("usage")
+        )
+
+    async def _replay_stream(self, question: str) -> AsyncIterator[str]:
+        entry = self._find_recording(question, "stream")
+        chunks = entry.get("chunks")
+        if chunks is None:
+            # 阻塞式查询的录制在原始耗时后一次性返回
+            chunks = [[entry.get("duration", 0.0), entry.get("content", "")]]
+
+        started = time.monotonic()
+        for offset, chunk in chunks:
+            delay = offset - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    async def health_check(self) -> bool:
+        """健康检查
+
+        Returns:
+            bool: synthetic模式总是可用；record模式取决于真实提供商；replay模式需要有录制
+        """
+        if self.mode == "record":
+            return await self.upstream.health_check()
+        if self.mode == "replay":
+            return bool(self._replay_order)
+        return True
+
+    async def startup(self) -> None:
+        """打开被录制提供商的连接池"""
+        if self.upstream is not None:
+            await self.upstream.startup()
+
+    async def shutdown(self) -> None:
+        """关闭被录制提供商的连接池"""
+        if self.upstream is not None:
+            await self.upstream.shutdown()
+
+    @property
+    def name(self) -> str:
+        """提供商名称"""
+        return "MockRAGProvider"
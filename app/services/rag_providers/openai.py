@@ -56,22 +56,21 @@ class OpenAIProvider(BaseRAGProvider):
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                
-                return QueryResult(
-                    content=content,
-                    metadata={
-                        "provider": self.name,
-                        "model": data.get("model"),
-                        "finish_reason": data.get("choices", [{}])[0].get("finish_reason")
-                    },
-                    usage=data.get("usage")
-                )
+            response = await self.client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+            
+            return QueryResult(
+                content=content,
+                metadata={
+                    "provider": self.name,
+                    "model": data.get("model"),
+                    "finish_reason": data.get("choices", [{}])[0].get("finish_reason")
+                },
+                usage=data.get("usage")
+            )
         except httpx.HTTPError as e:
             logger.error(f"OpenAI query failed: {e}")
             raise Exception(f"OpenAI查询失败: {str(e)}")
@@ -103,23 +102,22 @@ class OpenAIProvider(BaseRAGProvider):
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                async with client.stream("POST", url, json=payload, headers=headers) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data = line[6:]
-                            if data.strip() == "[DONE]":
-                                break
-                            try:
-                                import json
-                                chunk = json.loads(data)
-                                delta = chunk.get("choices", [{}])[0].get("delta", {})
-                                content = delta.get("content", "")
-                                if content:
-                                    yield content
-                            except json.JSONDecodeError:
-                                continue
+            async with self.client.stream("POST", url, json=payload, headers=headers) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        data = line[6:]
+                        if data.strip() == "[DONE]":
+                            break
+                        try:
+                            import json
+                            chunk = json.loads(data)
+                            delta = chunk.get("choices", [{}])[0].get("delta", {})
+                            content = delta.get("content", "")
+                            if content:
+                                yield content
+                        except json.JSONDecodeError:
+                            continue
         except httpx.HTTPError as e:
             logger.error(f"OpenAI stream query failed: {e}")
             raise Exception(f"OpenAI流式查询失败: {str(e)}")
@@ -133,10 +131,8 @@ class OpenAIProvider(BaseRAGProvider):
         try:
             url = f"{self.base_url}/v1/models"
             headers = {"Authorization": f"Bearer {self.api_key}"}
-            
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(url, headers=headers)
-                return response.status_code == 200
+            response = await self.client.get(url, headers=headers, timeout=5.0)
+            return response.status_code == 200
         except Exception as e:
             logger.error(f"OpenAI health check failed: {e}")
             return False
@@ -0,0 +1,61 @@
+"""提供商代理基类"""
+
+from typing import Dict, Any, AsyncIterator
+from app.models.batch_task import QueryResult
+
+
+class ProviderProxy:
+    """包装一个RAG或搜索提供商并透传其接口
+
+    限流、熔断等横切逻辑通过继承此类并覆盖 ``query``、``stream_query``、``search`` 实现，
+    其余属性和连接池生命周期直接转发给被包装的提供商，因此代理可以多层嵌套。
+    """
+
+    def __init__(self, provider: Any):
+        """初始化代理
+
+        Args:
+            provider: 被包装的提供商（也可以是另一个代理）
+        """
+        self.provider = provider
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """被包装提供商的配置"""
+        return self.provider.config
+
+    @property
+    def name(self) -> str:
+        """提供商名称"""
+        return self.provider.name
+
+    @property
+    def provider_type(self) -> str:
+        """提供商类型"""
+        return self.provider.provider_type
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        return await self.provider.query(question, **kwargs)
+
+    async def stream_query(self, question: str, **kwargs) -> AsyncIterator[str]:
+        async for chunk in self.provider.stream_query(question, **kwargs):
+            yield chunk
+
+    async def search(self, query: str, **kwargs) -> QueryResult:
+        return await self.provider.search(query, **kwargs)
+
+    async def health_check(self) -> bool:
+        return await self.provider.health_check()
+
+    async def startup(self) -> None:
+        await self.provider.startup()
+
+    async def shutdown(self) -> None:
+        await self.provider.shutdown()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        return self.provider.pool_stats()
+
+    def __getattr__(self, name: str) -> Any:
+        # 其他提供商特有的方法（如Dify的stop_message）直接转发
+        return getattr(self.provider, name)
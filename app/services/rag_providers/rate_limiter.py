@@ -0,0 +1,314 @@
+"""提供商请求限流（令牌桶 + 优先级通道）"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Any, AsyncIterator, Callable, Iterator, Optional
+from app.models.batch_task import QueryResult
+from app.services.spans import span
+from .proxy import ProviderProxy
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+_CJK_CHAR = re.compile(r"[一-鿿]")
+
+
+class Priority(IntEnum):
+    """请求优先级，数值越小越优先"""
+
+    REALTIME = 0
+    SPECULATIVE = 1
+    BATCH = 2
+
+
+# 当前请求的优先级，未设置时视为实时请求
+request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.REALTIME)
+
+
+@contextmanager
+def priority_scope(priority: Priority) -> Iterator[None]:
+    """在代码块内设置请求优先级
+
+    Args:
+        priority: 请求优先级
+    """
+    token = request_priority.set(priority)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数
+
+    中文按每个汉字一个token，其他字符按每4个字符一个token计算。
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_CHAR.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class TokenBucket:
+    """令牌桶
+
+    以固定速率补充令牌，容量为一分钟的配额。余额可以为负，用于事后按实际用量补扣。
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        """初始化令牌桶
+
+        Args:
+            per_minute: 每分钟配额
+            clock: 时钟函数
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> float:
+        """当前可用令牌数"""
+        self._refill()
+        return self.tokens
+
+    def time_until(self, amount: float) -> float:
+        """距离余额达到 ``amount`` 还需等待的秒数"""
+        self._refill()
+        deficit = amount - self.tokens
+        return deficit / self.rate if deficit > 0 else 0.0
+
+    def consume(self, amount: float) -> None:
+        """扣除令牌（负数表示退还）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """按请求数（RPM）和token数（TPM）限流，带优先级通道
+
+    有更高优先级的请求在等待时，低优先级请求不会取得令牌；
+    投机请求和批量请求只能使用预留额度以外的容量，突发的实时请求总有余量可用。
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, batch_reserve: float = 0.2,
+                 max_wait: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        """初始化限流器
+
+        Args:
+            rpm: 每分钟请求数上限，0表示不限制
+            tpm: 每分钟token数上限，0表示不限制
+            batch_reserve: 为实时请求预留、投机和批量请求不可使用的容量比例（0-1）
+            max_wait: 实时和投机请求最长排队时间（秒），超时抛出异常；批量请求一直等待剩余容量
+            clock: 时钟函数
+        """
+        self.requests = TokenBucket(rpm, clock) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, clock) if tpm > 0 else None
+        self.batch_reserve = min(max(batch_reserve, 0.0), 1.0)
+        self.max_wait = max_wait
+        self.clock = clock
+        self._waiting = [0] * len(Priority)
+        self._changed = asyncio.Condition()
+        self.throttled = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了任何限额"""
+        return self.requests is not None or self.tokens is not None
+
+    def _wait_time(self, priority: Priority, cost: int) -> Optional[float]:
+        """计算取得令牌还需等待的时间，可以立即取得时扣除令牌并返回0
+
+        Returns:
+            Optional[float]: 等待秒数，被更高优先级请求阻塞时返回None
+        """
+        if any(self._waiting[p] for p in range(priority)):
+            return None
+
+        reserve = self.batch_reserve if priority > Priority.REALTIME else 0.0
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.time_until(1 + reserve * self.requests.capacity))
+        if self.tokens:
+            # 单次请求的token数超过桶容量时按容量计，避免永远无法满足
+            need = min(cost, self.tokens.capacity * (1 - reserve))
+            wait = max(wait, self.tokens.time_until(need + reserve * self.tokens.capacity))
+
+        if wait == 0.0:
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(cost)
+        return wait
+
+    async def acquire(self, cost: int = 0, priority: Optional[Priority] = None) -> None:
+        """等待取得一次请求的额度
+
+        Args:
+            cost: 本次请求预估的token数
+            priority: 请求优先级，默认取当前上下文的优先级
+
+        Raises:
+            Exception: 实时或投机请求排队时间超过 ``max_wait``
+        """
+        if not self.enabled:
+            return
+
+        priority = request_priority.get() if priority is None else priority
+        with span("rate_limit_wait"):
+            await self._acquire(cost, priority)
+
+    async def _acquire(self, cost: int, priority: Priority) -> None:
+        deadline = self.clock() + self.max_wait if priority < Priority.BATCH else float("inf")
+
+        async with self._changed:
+            self._waiting[priority] += 1
+            try:
+                throttled = False
+                while True:
+                    wait = self._wait_time(priority, cost)
+                    if wait == 0.0:
+                        return
+
+                    if not throttled:
+                        throttled = True
+                        self.throttled += 1
+
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise Exception("请求速率超出提供商限额，请稍后再试")
+
+                    # 被更高优先级阻塞时等待其离开队列的通知
+                    timeout = min(wait if wait is not None else remaining, remaining)
+                    if timeout == float("inf"):
+                        timeout = None
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting[priority] -= 1
+                self._changed.notify_all()
+
+    def reconcile(self, estimated: int, actual: Optional[int]) -> None:
+        """按实际token用量修正预扣的额度
+
+        Args:
+            estimated: 请求前预扣的token数
+            actual: 实际用量，未知时不修正
+        """
+        if self.tokens and actual is not None:
+            self.tokens.consume(actual - estimated)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计信息
+
+        Returns:
+            Dict[str, Any]: 剩余额度、排队数和限流次数
+        """
+        return {
+            "rpm": int(self.requests.capacity) if self.requests else None,
+            "tpm": int(self.tokens.capacity) if self.tokens else None,
+            "requests_available": round(self.requests.available(), 2) if self.requests else None,
+            "tokens_available": round(self.tokens.available(), 2) if self.tokens else None,
+            "waiting": {p.name.lower(): self._waiting[p] for p in Priority},
+            "throttled": self.throttled,
+            "rejected": self.rejected
+        }
+
+
+def _usage_tokens(result: QueryResult) -> Optional[int]:
+    """从查询结果中读取实际token用量"""
+    usage = result.usage or {}
+    total = usage.get("total_tokens", usage.get("tokens"))
+    return int(total) if total else None
+
+
+class RateLimitedProvider(ProviderProxy):
+    """在提供商前加一层限流
+
+    每次调用前按预估的token数取得额度，调用结束后按实际用量修正。
+    """
+
+    def __init__(self, provider: Any, limiter: RateLimiter, completion_tokens: int = 256):
+        """初始化限流代理
+
+        Args:
+            provider: 被包装的提供商
+            limiter: 限流器
+            completion_tokens: 预估的回答token数，与问题token数一起预扣
+        """
+        super().__init__(provider)
+        self.limiter = limiter
+        self.completion_tokens = completion_tokens
+
+    def _estimate(self, question: str) -> int:
+        return estimate_tokens(question) + self.completion_tokens
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        estimated = self._estimate(question)
+        await self.limiter.acquire(estimated)
+        result = await self.provider.query(question, **kwargs)
+        self.limiter.reconcile(estimated, _usage_tokens(result))
+        return result
+
+    async def stream_query(self, question: str, **kwargs) -> AsyncIterator[str]:
+        estimated = self._estimate(question)
+        await self.limiter.acquire(estimated)
+        produced = 0
+        try:
+            async for chunk in self.provider.stream_query(question, **kwargs):
+                produced += estimate_tokens(chunk)
+                yield chunk
+        finally:
+            # 流式接口没有返回用量，按已输出内容估算
+            self.limiter.reconcile(estimated, estimate_tokens(question) + produced)
+
+    async def search(self, query: str, **kwargs) -> QueryResult:
+        await self.limiter.acquire(0)
+        return await self.provider.search(query, **kwargs)
+
+
+def wrap_with_rate_limit(provider: Any, rate_config: Dict[str, Any],
+                         limits: Optional[Dict[str, Any]]) -> Any:
+    """按配置为提供商加上限流代理
+
+    Args:
+        provider: 提供商实例
+        rate_config: 全局限流配置（批量预留比例、最长排队时间等）
+        limits: 提供商的限额配置（rpm、tpm），为空时不限流
+
+    Returns:
+        Any: 限流代理，未配置限额时返回原提供商
+    """
+    limits = limits or {}
+    if not limits.get("rpm") and not limits.get("tpm"):
+        return provider
+
+    limiter = RateLimiter(
+        rpm=limits.get("rpm", 0),
+        tpm=limits.get("tpm", 0),
+        batch_reserve=rate_config.get("batch_reserve", 0.2),
+        max_wait=rate_config.get("max_wait", 30.0)
+    )
+    logger.info(f"Rate limiting {provider.name}: rpm={limits.get('rpm')}, tpm={limits.get('tpm')}")
+    return RateLimitedProvider(provider, limiter, rate_config.get("completion_tokens", 256))
@@ -0,0 +1,424 @@
+"""提供商熔断与重试"""
+
+from collections import deque
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Optional
+from app.models.batch_task import QueryResult
+from .proxy import ProviderProxy
+import asyncio
+import httpx
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """提供商处于熔断状态，请求被直接拒绝"""
+
+
+def _http_error(error: BaseException) -> Optional[httpx.HTTPError]:
+    """沿异常链查找底层的httpx异常
+
+    提供商会把httpx异常包装成带中文消息的Exception，原始异常保存在 ``__cause__`` / ``__context__`` 中。
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, httpx.HTTPError):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+# 请求还没有发到上游的连接阶段错误，重试不会让上游重复执行非幂等的请求
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# 上游明确表示没有处理请求、可以稍后重试的状态码
+_RETRYABLE_STATUS = (429, 503)
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """判断失败是否由上游故障引起，计入熔断统计
+
+    网络错误、超时、5xx和429视为上游故障；其他4xx、参数错误等不计入。
+
+    Args:
+        error: 异常
+
+    Returns:
+        bool: 是否为上游故障
+    """
+    http_error = _http_error(error)
+    if isinstance(http_error, httpx.TransportError):
+        return True
+    if isinstance(http_error, httpx.HTTPStatusError):
+        status = http_error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+def is_retryable(error: BaseException) -> bool:
+    """判断失败后是否可以重试
+
+    查询请求（如Dify的chat-messages）不是幂等的，读超时或5xx时上游可能已经执行过，
+    因此只重试连接阶段的错误以及429/503。
+
+    Args:
+        error: 异常
+
+    Returns:
+        bool: 是否可以重试
+    """
+    http_error = _http_error(error)
+    if isinstance(http_error, _CONNECT_ERRORS):
+        return True
+    if isinstance(http_error, httpx.HTTPStatusError):
+        return http_error.response.status_code in _RETRYABLE_STATUS
+    return False
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """读取429/503响应中的Retry-After秒数"""
+    http_error = _http_error(error)
+    if isinstance(http_error, httpx.HTTPStatusError):
+        value = http_error.response.headers.get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+    return None
+
+
+class CircuitBreaker:
+    """熔断器（closed / open / half_open）
+
+    在最近 ``window_size`` 次调用中失败率达到阈值时打开，拒绝所有请求；
+    经过 ``open_seconds`` 后进入半开状态，放行少量探测请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_rate: float = 0.5, window_size: int = 20, min_calls: int = 5,
+                 open_seconds: float = 30.0, half_open_calls: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        """初始化熔断器
+
+        Args:
+            failure_rate: 打开熔断的失败率阈值（0-1）
+            window_size: 统计失败率的滑动窗口（最近调用次数）
+            min_calls: 窗口内至少有多少次调用才计算失败率
+            open_seconds: 打开状态持续时间（秒）
+            half_open_calls: 半开状态允许同时进行的探测请求数
+            clock: 时钟函数
+        """
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._window: deque = deque(maxlen=window_size)
+        self._probes = 0
+
+    def allow(self) -> bool:
+        """判断是否放行一次请求，放行后必须调用 ``record_success`` / ``record_failure`` / ``release`` 之一"""
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probes = 0
+
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self.rejected += 1
+                return False
+            self._probes += 1
+
+        return True
+
+    def record_success(self) -> None:
+        """记录一次成功调用"""
+        if self.state == self.HALF_OPEN:
+            logger.info("Circuit closed after successful probe")
+            self.state = self.CLOSED
+            self._window.clear()
+            self._probes = 0
+            return
+        self._window.append(False)
+
+    def record_failure(self) -> None:
+        """记录一次上游故障"""
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+
+        self._window.append(True)
+        if len(self._window) >= self.min_calls:
+            if sum(self._window) / len(self._window) >= self.failure_rate:
+                self._open()
+
+    def release(self) -> None:
+        """放行的请求既未成功也未计为故障（如参数错误、被取消）时归还探测名额"""
+        if self.state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        self.times_opened += 1
+        self._window.clear()
+        self._probes = 0
+
+    @property
+    def current_failure_rate(self) -> float:
+        """滑动窗口内的失败率"""
+        return sum(self._window) / len(self._window) if self._window else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取熔断统计信息
+
+        Returns:
+            Dict[str, Any]: 状态、失败率、打开次数和拒绝次数
+        """
+        return {
+            "state": self.state,
+            "failure_rate": round(self.current_failure_rate, 4),
+            "window_calls": len(self._window),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class RetryPolicy:
+    """带指数退避和随机抖动的有界重试
+
+    退避时间为 ``[0, min(max_delay, base_delay * 2^n)]`` 内的均匀随机数（full jitter）。
+    重试预算限制重试请求占总请求的比例，上游整体故障时不会因重试放大流量。
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0,
+                 budget_ratio: float = 0.2, budget_burst: float = 10.0, deadline: float = 30.0):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 最大尝试次数（含首次请求）
+            base_delay: 退避基准时间（秒）
+            max_delay: 单次退避上限（秒）
+            budget_ratio: 每个请求积累的重试额度，即长期重试比例上限
+            budget_burst: 重试额度上限
+            deadline: 一次调用所有尝试（含退避）的总时限（秒）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self._budget = budget_burst
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> Optional[float]:
+        """计算第 ``attempt`` 次失败后的等待时间
+
+        Args:
+            attempt: 已失败的次数（从1开始）
+            error: 失败的异常，带Retry-After时优先使用
+
+        Returns:
+            Optional[float]: 等待秒数，超过上限不应重试时返回None
+        """
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def on_request(self) -> None:
+        """每个新请求积累重试额度"""
+        self._budget = min(self.budget_burst, self._budget + self.budget_ratio)
+
+    def try_spend(self) -> bool:
+        """尝试消耗一次重试额度"""
+        if self._budget < 1.0:
+            self.budget_exhausted += 1
+            return False
+        self._budget -= 1.0
+        self.retries += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重试统计信息"""
+        return {
+            "max_attempts": self.max_attempts,
+            "deadline": self.deadline,
+            "retries": self.retries,
+            "budget": round(self._budget, 2),
+            "budget_exhausted": self.budget_exhausted
+        }
+
+
+class ResilientProvider(ProviderProxy):
+    """为提供商加上熔断和重试
+
+    熔断打开时直接抛出 ``CircuitOpenError``，不再等待上游超时；
+    连接阶段的错误和429/503按重试策略退避重试，所有尝试共用一个总时限；
+    流式查询只在输出第一个片段之前重试，总时限也只约束到第一个片段为止。
+    总时限到期是本地的等待上限，不计入熔断统计；限流排队应放在本代理外层，不占用总时限。
+    """
+
+    def __init__(self, provider: Any, breaker: CircuitBreaker, retry: RetryPolicy):
+        """初始化熔断代理
+
+        Args:
+            provider: 被包装的提供商
+            breaker: 熔断器
+            retry: 重试策略
+        """
+        super().__init__(provider)
+        self.breaker = breaker
+        self.retry = retry
+
+    def _reject(self) -> CircuitOpenError:
+        return CircuitOpenError(f"{self.name}暂时不可用（熔断中），请稍后再试")
+
+    def _deadline_error(self) -> Exception:
+        return Exception(f"{self.name}请求超过{self.retry.deadline:g}秒仍未完成")
+
+    def _next_delay(self, attempt: int, error: BaseException, deadline: float) -> Optional[float]:
+        """计算重试前的等待时间，不能重试时返回None"""
+        if not is_retryable(error) or attempt >= self.retry.max_attempts:
+            return None
+        delay = self.retry.backoff(attempt, error)
+        # 退避结束时已经超过总时限就不再重试
+        if delay is None or time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    async def _call(self, fn: Callable[[], Awaitable[QueryResult]]) -> QueryResult:
+        """在熔断和重试保护下执行一次调用"""
+        self.retry.on_request()
+        deadline = time.monotonic() + self.retry.deadline
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise self._reject()
+
+            attempt += 1
+            recorded = False
+            try:
+                result = await asyncio.wait_for(fn(), deadline - time.monotonic())
+                self.breaker.record_success()
+                recorded = True
+                return result
+            except asyncio.TimeoutError as e:
+                # 本地时限到期不计入熔断统计，上游故障由提供商自身的超时体现
+                raise self._deadline_error() from e
+            except Exception as e:
+                if not is_upstream_failure(e):
+                    raise
+                self.breaker.record_failure()
+                recorded = True
+
+                delay = self._next_delay(attempt, e, deadline)
+                if delay is None or not self.retry.try_spend():
+                    raise
+                logger.warning(f"{self.name} call failed (attempt {attempt}), retrying in {delay:.2f}s: {e}")
+            finally:
+                if not recorded:
+                    self.breaker.release()
+
+            await asyncio.sleep(delay)
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        return await self._call(lambda: self.provider.query(question, **kwargs))
+
+    async def search(self, query: str, **kwargs) -> QueryResult:
+        return await self._call(lambda: self.provider.search(query, **kwargs))
+
+    async def stream_query(self, question: str, **kwargs) -> AsyncIterator[str]:
+        self.retry.on_request()
+        deadline = time.monotonic() + self.retry.deadline
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise self._reject()
+
+            attempt += 1
+            started = False
+            recorded = False
+            stream = self.provider.stream_query(question, **kwargs)
+            try:
+                try:
+                    first = await asyncio.wait_for(stream.__anext__(), deadline - time.monotonic())
+                except StopAsyncIteration:
+                    self.breaker.record_success()
+                    recorded = True
+                    return
+                except asyncio.TimeoutError as e:
+                    raise self._deadline_error() from e
+
+                started = True
+                yield first
+                async for chunk in stream:
+                    yield chunk
+                self.breaker.record_success()
+                recorded = True
+                return
+            except Exception as e:
+                if recorded or not is_upstream_failure(e):
+                    raise
+                self.breaker.record_failure()
+                recorded = True
+
+                # 已经输出过片段时重试会产生重复内容，直接失败
+                delay = None if started else self._next_delay(attempt, e, deadline)
+                if delay is None or not self.retry.try_spend():
+                    raise
+                logger.warning(f"{self.name} stream failed before first chunk (attempt {attempt}), "
+                               f"retrying in {delay:.2f}s: {e}")
+            finally:
+                await stream.aclose()
+                if not recorded:
+                    self.breaker.release()
+
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取熔断和重试统计信息"""
+        return {**self.breaker.get_stats(), "retry": self.retry.get_stats()}
+
+
+def wrap_with_resilience(provider: Any, resilience_config: Dict[str, Any]) -> Any:
+    """按配置为提供商加上熔断和重试
+
+    Args:
+        provider: 提供商实例（限流代理应包在熔断代理外层）
+        resilience_config: 熔断和重试配置
+
+    Returns:
+        Any: 熔断代理，未启用时返回原提供商
+    """
+    if not resilience_config.get("enabled", True):
+        return provider
+
+    breaker = CircuitBreaker(
+        failure_rate=resilience_config.get("failure_rate", 0.5),
+        window_size=resilience_config.get("window_size", 20),
+        min_calls=resilience_config.get("min_calls", 5),
+        open_seconds=resilience_config.get("open_seconds", 30.0)
+    )
+    retry = RetryPolicy(
+        max_attempts=resilience_config.get("retry_attempts", 3),
+        base_delay=resilience_config.get("retry_base_delay", 0.2),
+        max_delay=resilience_config.get("retry_max_delay", 2.0),
+        budget_ratio=resilience_config.get("retry_budget_ratio", 0.2),
+        deadline=resilience_config.get("retry_deadline", 30.0)
+    )
+    return ResilientProvider(provider, breaker, retry)
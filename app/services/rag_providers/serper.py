@@ -52,45 +52,44 @@ class SerperProvider(BaseSearchProvider):
         }
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                
-                # 提取搜索结果
-                organic_results = data.get("organic", [])
-                
-                # 构建答案内容
-                content_parts = []
-                sources = []
-                
-                for idx, result in enumerate(organic_results[:5], 1):
-                    title = result.get("title", "")
-                    snippet = result.get("snippet", "")
-                    link = result.get("link", "")
-                    
-                    content_parts.append(f"{idx}. {title}\n{snippet}")
-                    sources.append({
-                        "title": title,
-                        "url": link,
-                        "snippet": snippet,
-                        "position": idx
-                    })
-                
-                content = "\n\n".join(content_parts)
+            response = await self.client.post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+            
+            # 提取搜索结果
+            organic_results = data.get("organic", [])
+            
+            # 构建答案内容
+            content_parts = []
+            sources = []
+            
+            for idx, result in enumerate(organic_results[:5], 1):
+                title = result.get("title", "")
+                snippet = result.get("snippet", "")
+                link = result.get("link", "")
                 
-                return QueryResult(
-                    content=content,
-                    metadata={
-                        "provider": self.name,
-                        "query": query,
-                        "search_time": data.get("searchParameters", {}).get("time")
-                    },
-                    sources=sources,
-                    usage={
-                        "results_count": len(organic_results)
-                    }
-                )
+                content_parts.append(f"{idx}. {title}\n{snippet}")
+                sources.append({
+                    "title": title,
+                    "url": link,
+                    "snippet": snippet,
+                    "position": idx
+                })
+            
+            content = "\n\n".join(content_parts)
+            
+            return QueryResult(
+                content=content,
+                metadata={
+                    "provider": self.name,
+                    "query": query,
+                    "search_time": data.get("searchParameters", {}).get("time")
+                },
+                sources=sources,
+                usage={
+                    "results_count": len(organic_results)
+                }
+            )
         except httpx.HTTPError as e:
             logger.error(f"Serper search failed: {e}")
             raise Exception(f"Serper搜索失败: {str(e)}")
@@ -1,12 +1,23 @@
 """RAG服务管理器"""
 
-from typing import Dict, Any, Optional, AsyncIterator
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+from dataclasses import replace
 from app.services.rag_providers.base import BaseRAGProvider, BaseSearchProvider
+from app.services.rag_providers.rate_limiter import wrap_with_rate_limit
+from app.services.rag_providers.resilience import wrap_with_resilience
 from app.services.rag_providers import (
-    ContextProvider, OpenAIProvider, SerperProvider, CustomRAGProvider, DifyProvider
+    ContextProvider, OpenAIProvider, SerperProvider, CustomRAGProvider, DifyProvider,
+    MockRAGProvider
 )
+from app.services.response_cache import create_response_cache, make_cache_key
+from app.services.semantic_cache import create_semantic_cache
+from app.services.single_flight import SingleFlight
+from app.services.provider_chain import ProviderChain
+from app.services.fusion import FusionProvider
+from app.services import metrics, spans
 from app.models.batch_task import QueryResult
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -27,37 +38,93 @@ class RAGService:
         self.rag_provider: Optional[BaseRAGProvider] = None
         self.search_provider: Optional[BaseSearchProvider] = None
         
-        # 初始化RAG提供商
+        # 查询结果缓存
+        cache_config = config.get("cache", {})
+        self.cache = create_response_cache(cache_config)
+        self.semantic_cache = create_semantic_cache(cache_config.get("semantic", {}))
+        self.cache_disabled_providers = set(cache_config.get("disabled_providers", []))
+        if self.cache:
+            metrics.CACHE_HIT_RATIO.set_function(lambda: self.cache.stats.hit_ratio)
+        
+        # 相同并发查询合并
+        self.single_flight = SingleFlight() if cache_config.get("single_flight", True) else None
+        
+        # 提供商共享的HTTP连接池配置
+        http_config = config.get("http", {})
+        
+        # 初始化RAG提供商（配置了备用提供商时组成提供商链）
+        rate_config = config.get("rate_limit", {})
+        resilience_config = config.get("resilience", {})
         rag_config = config.get("rag", {})
         if rag_config:
-            self._init_rag_provider(rag_config)
+            members = []
+            for provider_config in [rag_config, *rag_config.get("fallbacks", [])]:
+                provider = self._create_rag_provider({**provider_config, "http": http_config})
+                if provider:
+                    # 熔断和重试包在限流内层：重试总时限从取得限流额度后才开始计算，
+                    # 批量请求排队等待剩余容量不会被当成上游故障打开熔断
+                    members.append(wrap_with_rate_limit(
+                        wrap_with_resilience(provider, resilience_config),
+                        rate_config, provider_config.get("rate_limit")
+                    ))
+            
+            if len(members) > 1:
+                self.rag_provider = ProviderChain(members, config.get("hedge", {}))
+            elif members:
+                self.rag_provider = members[0]
         
         # 初始化搜索提供商
         search_config = config.get("search", {})
         if search_config:
-            self._init_search_provider(search_config)
+            self._init_search_provider({**search_config, "http": http_config})
+        
+        if self.search_provider:
+            self.search_provider = wrap_with_rate_limit(
+                wrap_with_resilience(self.search_provider, resilience_config),
+                rate_config, search_config.get("rate_limit")
+            )
+        
+        # 搜索 + RAG 融合查询
+        fusion_config = config.get("fusion", {})
+        self.fusion_mode = fusion_config.get("mode", "off")
+        self.fusion: Optional[FusionProvider] = None
+        if self.fusion_mode != "off" and self.rag_provider and self.search_provider:
+            self.fusion = FusionProvider(self.rag_provider, self.search_provider, fusion_config)
     
-    def _init_rag_provider(self, config: Dict[str, Any]) -> None:
-        """初始化RAG提供商
+    def _create_rag_provider(self, config: Dict[str, Any]) -> Optional[BaseRAGProvider]:
+        """创建RAG提供商
         
         Args:
             config: RAG提供商配置
+            
+        Returns:
+            Optional[BaseRAGProvider]: 提供商实例，类型未知或初始化失败时返回None
         """
         provider_type = config.get("provider", "").lower()
         
         try:
             if provider_type == "context":
-                self.rag_provider = ContextProvider(config)
+                return ContextProvider(config)
             elif provider_type == "openai":
-                self.rag_provider = OpenAIProvider(config)
+                return OpenAIProvider(config)
             elif provider_type == "dify":
-                self.rag_provider = DifyProvider(config)
+                return DifyProvider(config)
             elif provider_type == "custom":
-                self.rag_provider = CustomRAGProvider(config)
+                return CustomRAGProvider(config)
+            elif provider_type == "mock":
+                # record模式下先创建被录制的真实提供商
+                upstream = None
+                if config.get("record"):
+                    upstream = self._create_rag_provider(
+                        {**config["record"], "http": config.get("http", {})}
+                    )
+                return MockRAGProvider(config, upstream)
             else:
                 logger.warning(f"Unknown RAG provider type: {provider_type}")
         except Exception as e:
-            logger.error(f"Failed to initialize RAG provider: {e}")
+            logger.error(f"Failed to initialize RAG provider {provider_type}: {e}")
+        
+        return None
     
     def _init_search_provider(self, config: Dict[str, Any]) -> None:
         """初始化搜索提供商
@@ -75,9 +142,46 @@ class RAGService:
         except Exception as e:
             logger.error(f"Failed to initialize search provider: {e}")
     
+    @property
+    def providers(self) -> List[Any]:
+        """所有已初始化的提供商（提供商链展开为各成员）
+        
+        Returns:
+            List[Any]: RAG和搜索提供商列表
+        """
+        providers = []
+        for provider in (self.rag_provider, self.search_provider):
+            if provider is not None:
+                providers.extend(getattr(provider, "members", [provider]))
+        return providers
+    
+    async def startup(self) -> None:
+        """打开所有提供商的HTTP连接池"""
+        for provider in self.providers:
+            await provider.startup()
+    
+    async def shutdown(self) -> None:
+        """关闭所有提供商的HTTP连接池"""
+        for provider in self.providers:
+            try:
+                await provider.shutdown()
+            except Exception as e:
+                logger.error(f"Failed to close {provider.name} HTTP pool: {e}")
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取各提供商的连接池统计
+        
+        Returns:
+            Dict[str, Any]: 以提供商名称为键的连接池统计
+        """
+        return {provider.name: provider.pool_stats() for provider in self.providers}
+    
     async def query(self, question: str, use_search: bool = False, **kwargs) -> QueryResult:
         """执行查询
         
+        启用缓存时，先按归一化问题、提供商和查询选项查找缓存，未命中再调用提供商。
+        相同的并发查询共享同一次提供商调用，所有等待者得到同一个结果。
+        
         Args:
             question: 用户问题
             use_search: 是否使用搜索服务（如果检测到搜索关键词）
@@ -89,41 +193,311 @@ class RAGService:
         Raises:
             Exception: 如果查询失败或没有可用的提供商
         """
-        # 自动检测是否需要使用搜索
-        if not use_search:
-            use_search = self._should_use_search(question)
+        provider, is_search = self._select_provider(question, use_search)
         
-        # 优先使用搜索服务
-        if use_search and self.search_provider:
-            logger.info(f"Using search provider for question: {question}")
-            return await self.search_provider.search(question, **kwargs)
+        cached = await self._get_cached(question, provider, kwargs)
+        if cached:
+            return self._mark_cached(cached)
         
-        # 使用RAG服务
-        if self.rag_provider:
-            logger.info(f"Using RAG provider for question: {question}")
-            return await self.rag_provider.query(question, **kwargs)
+        if not self.single_flight:
+            return await self._query_provider(question, provider, is_search, kwargs)
         
-        raise Exception("没有可用的RAG或搜索服务提供商")
+        return await self.single_flight.do(
+            make_cache_key(question, self._provider_type(provider), kwargs),
+            lambda: self._query_provider(question, provider, is_search, kwargs)
+        )
     
-    async def stream_query(self, question: str, **kwargs) -> AsyncIterator[str]:
+    async def stream_query(self, question: str, use_search: bool = False, **kwargs) -> AsyncIterator[str]:
         """流式查询
         
+        与 ``query`` 使用相同的路由规则和缓存：命中缓存或使用搜索服务时答案一次性返回，
+        否则透传RAG提供商的增量输出，流正常结束后写入缓存。
+        相同的并发流式查询共享同一个上游流，每个订阅者都收到完整的增量序列。
+        
         Args:
             question: 用户问题
+            use_search: 是否使用搜索服务
             **kwargs: 额外参数
             
         Yields:
             str: 答案片段
             
         Raises:
-            Exception: 如果查询失败或没有可用的RAG提供商
+            Exception: 如果查询失败或没有可用的提供商
         """
-        if not self.rag_provider:
-            raise Exception("没有可用的RAG服务提供商")
+        provider, is_search = self._select_provider(question, use_search)
+        
+        cached = await self._get_cached(question, provider, kwargs)
+        if cached:
+            if cached.content:
+                yield cached.content
+            return
+        
+        if not self.single_flight:
+            stream = self._stream_provider(question, provider, is_search, kwargs)
+        else:
+            stream = self.single_flight.stream(
+                make_cache_key(question, self._provider_type(provider), kwargs),
+                lambda: self._stream_provider(question, provider, is_search, kwargs)
+            )
+        
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            # 提前退出时立即注销订阅，最后一个订阅者离开时取消共享的上游流
+            await stream.aclose()
+    
+    async def _query_provider(self, question: str, provider: Any, is_search: bool,
+                              options: Dict[str, Any]) -> QueryResult:
+        """调用提供商查询并写入缓存
+        
+        Args:
+            question: 用户问题
+            provider: 提供商实例
+            is_search: 是否为搜索提供商
+            options: 查询选项
+            
+        Returns:
+            QueryResult: 查询结果
+        """
+        started = time.monotonic()
+        with metrics.INFLIGHT_REQUESTS.labels(provider=provider.name).track_inprogress():
+            try:
+                if is_search:
+                    logger.info(f"Using search provider for question: {question}")
+                    result = await provider.search(question, **options)
+                else:
+                    logger.info(f"Using RAG provider for question: {question}")
+                    result = await provider.query(question, **options)
+            finally:
+                elapsed = time.monotonic() - started
+                metrics.PROVIDER_LATENCY.labels(provider=provider.name, mode="blocking").observe(elapsed)
+                spans.record("generation", elapsed)
+        
+        await self._set_cached(question, provider, options, result)
+        
+        return result
+    
+    async def _stream_provider(self, question: str, provider: Any, is_search: bool,
+                               options: Dict[str, Any]) -> AsyncIterator[str]:
+        """调用提供商流式查询，流正常结束后写入缓存
+        
+        Args:
+            question: 用户问题
+            provider: 提供商实例
+            is_search: 是否为搜索提供商
+            options: 查询选项
+            
+        Yields:
+            str: 答案片段
+        """
+        if is_search:
+            result = await self._query_provider(question, provider, True, options)
+            if result.content:
+                yield result.content
+            return
         
         logger.info(f"Streaming query for question: {question}")
-        async for chunk in self.rag_provider.stream_query(question, **kwargs):
-            yield chunk
+        parts: List[str] = []
+        started = time.monotonic()
+        inflight = metrics.INFLIGHT_REQUESTS.labels(provider=provider.name)
+        inflight.inc()
+        try:
+            async for chunk in provider.stream_query(question, **options):
+                if not parts:
+                    ttft = time.monotonic() - started
+                    metrics.TIME_TO_FIRST_TOKEN.labels(provider=provider.name).observe(ttft)
+                    spans.record("ttft", ttft)
+                parts.append(chunk)
+                yield chunk
+        finally:
+            inflight.dec()
+            elapsed = time.monotonic() - started
+            metrics.PROVIDER_LATENCY.labels(provider=provider.name, mode="stream").observe(elapsed)
+            spans.record("generation", elapsed)
+        
+        await self._set_cached(question, provider, options, QueryResult(
+            content="".join(parts),
+            metadata={"provider": provider.name, "mode": "stream"}
+        ))
+    
+    def _select_provider(self, question: str, use_search: bool = False) -> Tuple[Any, bool]:
+        """选择处理问题的提供商
+        
+        Args:
+            question: 用户问题
+            use_search: 是否强制使用搜索服务
+            
+        Returns:
+            Tuple[Any, bool]: 提供商实例，以及是否为搜索提供商
+            
+        Raises:
+            Exception: 如果没有可用的提供商
+        """
+        # 自动检测是否需要使用搜索
+        if not use_search:
+            use_search = self._should_use_search(question)
+        
+        # 融合模式下同时使用搜索和RAG
+        if self.fusion and (use_search or self.fusion_mode == "always"):
+            return self.fusion, False
+        
+        # 优先使用搜索服务
+        if use_search and self.search_provider:
+            return self.search_provider, True
+        
+        if self.rag_provider:
+            return self.rag_provider, False
+        
+        raise Exception("没有可用的RAG或搜索服务提供商")
+    
+    @staticmethod
+    def _provider_type(provider: Any) -> str:
+        """获取提供商类型（配置中的provider字段）"""
+        return provider.config.get("provider", provider.name).lower()
+    
+    def _cache_scope(self, provider: Any) -> Optional[str]:
+        """获取缓存作用域（提供商类型）
+        
+        Args:
+            provider: 提供商实例
+            
+        Returns:
+            Optional[str]: 提供商类型，未启用缓存或提供商不参与缓存时返回None
+        """
+        if not self.cache and not self.semantic_cache:
+            return None
+        
+        provider_type = self._provider_type(provider)
+        underlying = {provider_type}
+        if isinstance(provider, FusionProvider):
+            # 融合答案由RAG和搜索提供商共同生成，任一提供商禁用缓存时都不缓存
+            underlying = {self._provider_type(provider.rag_provider),
+                          self._provider_type(provider.search_provider)}
+        if underlying & self.cache_disabled_providers:
+            return None
+        
+        return provider_type
+    
+    async def _get_cached(self, question: str, provider: Any, 
+                          options: Dict[str, Any]) -> Optional[QueryResult]:
+        """依次查找精确缓存和近似缓存
+        
+        Args:
+            question: 用户问题
+            provider: 提供商实例
+            options: 查询选项
+            
+        Returns:
+            Optional[QueryResult]: 缓存的结果，未命中返回None
+        """
+        provider_type = self._cache_scope(provider)
+        if not provider_type:
+            return None
+        
+        if self.cache:
+            cached = await self.cache.get(make_cache_key(question, provider_type, options))
+            if cached:
+                logger.info(f"Cache hit for question: {question}")
+                return cached
+        
+        if self.semantic_cache:
+            cached = await self.semantic_cache.get(question, make_cache_key("", provider_type, options))
+            if cached:
+                logger.info(f"Semantic cache hit for question: {question}")
+                return cached
+        
+        return None
+    
+    async def _set_cached(self, question: str, provider: Any, 
+                          options: Dict[str, Any], result: QueryResult) -> None:
+        """将结果写入精确缓存和近似缓存
+        
+        Args:
+            question: 用户问题
+            provider: 提供商实例
+            options: 查询选项
+            result: 查询结果
+        """
+        provider_type = self._cache_scope(provider)
+        if not provider_type:
+            return
+        
+        if self.cache:
+            await self.cache.set(make_cache_key(question, provider_type, options), result)
+        
+        if self.semantic_cache:
+            await self.semantic_cache.set(question, make_cache_key("", provider_type, options), result)
+    
+    @staticmethod
+    def _mark_cached(result: QueryResult) -> QueryResult:
+        """返回带缓存标记的结果副本"""
+        return replace(result, metadata={**(result.metadata or {}), "cached": True})
+    
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """获取缓存统计信息
+        
+        Returns:
+            Optional[Dict[str, Any]]: 命中、未命中等统计，未启用缓存时返回None
+        """
+        if not self.cache and not self.semantic_cache:
+            return None
+        
+        return {
+            "exact": self.cache.get_stats() if self.cache else None,
+            "semantic": self.semantic_cache.get_stats() if self.semantic_cache else None
+        }
+    
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """获取各提供商的限流统计
+        
+        Returns:
+            Dict[str, Any]: 以提供商名称为键的限流统计，只包含配置了限额的提供商
+        """
+        return {
+            provider.name: provider.limiter.get_stats()
+            for provider in self.providers
+            if getattr(provider, "limiter", None)
+        }
+    
+    def get_circuit_stats(self) -> Dict[str, Any]:
+        """获取各提供商的熔断和重试统计
+        
+        Returns:
+            Dict[str, Any]: 以提供商名称为键的熔断状态
+        """
+        return {
+            provider.name: provider.get_stats()
+            for provider in self.providers
+            if getattr(provider, "breaker", None)
+        }
+    
+    def get_chain_stats(self) -> Optional[Dict[str, Any]]:
+        """获取RAG提供商链统计
+        
+        Returns:
+            Optional[Dict[str, Any]]: 胜出、对冲和故障转移统计，未配置提供商链时返回None
+        """
+        if isinstance(self.rag_provider, ProviderChain):
+            return self.rag_provider.get_stats()
+        return None
+    
+    def get_fusion_stats(self) -> Optional[Dict[str, Any]]:
+        """获取融合查询统计
+        
+        Returns:
+            Optional[Dict[str, Any]]: 各类融合结果的次数，未启用融合时返回None
+        """
+        return self.fusion.get_stats() if self.fusion else None
+    
+    def get_single_flight_stats(self) -> Optional[Dict[str, Any]]:
+        """获取并发查询合并统计
+        
+        Returns:
+            Optional[Dict[str, Any]]: 进行中和已合并的调用数，未启用时返回None
+        """
+        return self.single_flight.get_stats() if self.single_flight else None
     
     def _should_use_search(self, question: str) -> bool:
         """判断是否应该使用搜索服务
@@ -0,0 +1,238 @@
+"""RAG查询结果缓存"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+from app.models.batch_task import QueryResult
+from app.services.text_utils import clean_text
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 归一化时去除的首尾标点
+_EDGE_PUNCTUATION = " \t\r\n.,!?;:，。！？；：、…~～\"'“”‘’"
+
+
+def normalize_question(question: str) -> str:
+    """归一化问题文本，用于生成缓存键
+
+    合并空白、转小写，并去除首尾标点，使“怎么退款？”和“怎么退款”命中同一条缓存。
+
+    Args:
+        question: 原始问题
+
+    Returns:
+        str: 归一化后的问题
+    """
+    return clean_text(question).lower().strip(_EDGE_PUNCTUATION)
+
+
+def make_cache_key(question: str, provider: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """生成缓存键
+
+    Args:
+        question: 用户问题
+        provider: 提供商名称
+        options: 查询选项
+
+    Returns:
+        str: 缓存键
+    """
+    payload = json.dumps(
+        [normalize_question(question), options or {}],
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{provider}:{digest}"
+
+
+def estimate_result_size(result: QueryResult) -> int:
+    """估算查询结果占用的字节数
+
+    Args:
+        result: 查询结果
+
+    Returns:
+        int: 序列化后的字节数
+    """
+    return len(json.dumps(result.to_dict(), ensure_ascii=False, default=str).encode("utf-8"))
+
+
+@dataclass
+class CacheStats:
+    """缓存统计信息"""
+
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """命中率（0-1）"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hit_ratio, 4)
+        }
+
+
+class BaseResponseCache(ABC):
+    """查询结果缓存基础抽象类
+
+    定义缓存后端的标准接口，可以扩展为Redis等外部缓存。
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[QueryResult]:
+        """读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[QueryResult]: 缓存的结果，未命中返回None
+        """
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, result: QueryResult) -> None:
+        """写入缓存
+
+        Args:
+            key: 缓存键
+            result: 查询结果
+        """
+        pass
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """清空缓存"""
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 统计信息
+        """
+        return self.stats.to_dict()
+
+
+class MemoryResponseCache(BaseResponseCache):
+    """进程内LRU缓存
+
+    支持TTL过期、条目数上限和字节预算，超出时按最近最少使用顺序淘汰。
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        """初始化内存缓存
+
+        Args:
+            ttl: 条目存活时间（秒），0表示不过期
+            max_entries: 最大条目数
+            max_bytes: 最大字节预算
+        """
+        super().__init__()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # key -> (过期时间, 字节数, 结果)
+        self._entries: "OrderedDict[str, Tuple[float, int, QueryResult]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[QueryResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        expires_at, _, result = entry
+        if expires_at and expires_at < time.monotonic():
+            self._remove(key)
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return result
+
+    async def set(self, key: str, result: QueryResult) -> None:
+        size = estimate_result_size(result)
+        if size > self.max_bytes:
+            logger.debug(f"Result too large to cache: {size} bytes")
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        self._entries[key] = (expires_at, size, result)
+        self.current_bytes += size
+        self.stats.sets += 1
+
+        # 按LRU顺序淘汰，直到满足条目数和字节预算
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.stats.evictions += 1
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        """移除条目并更新字节计数"""
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats.to_dict(),
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl
+        }
+
+
+def create_response_cache(config: Dict[str, Any]) -> Optional[BaseResponseCache]:
+    """根据配置创建缓存实例
+
+    Args:
+        config: 缓存配置
+
+    Returns:
+        Optional[BaseResponseCache]: 缓存实例，未启用时返回None
+    """
+    if not config.get("enabled"):
+        return None
+
+    backend = config.get("backend", "memory")
+    if backend == "memory":
+        return MemoryResponseCache(
+            ttl=config.get("ttl", 300.0),
+            max_entries=config.get("max_entries", 10000),
+            max_bytes=config.get("max_bytes", 64 * 1024 * 1024)
+        )
+
+    logger.warning(f"Unknown cache backend: {backend}")
+    return None
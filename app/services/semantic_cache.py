@@ -0,0 +1,352 @@
+"""近似重复问题缓存（MinHash + LSH）"""
+
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, FrozenSet, List, Optional, Set, Tuple, Union
+from app.models.batch_task import QueryResult
+from app.services.response_cache import CacheStats
+from app.services.text_utils import STOP_WORDS
+import logging
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+_MASK_64 = (1 << 64) - 1
+_MAX_HASH = 0xFFFFFFFF
+_EMPTY = _MAX_HASH + 1
+# 致密化偏移（黄金分割常数），使借用的桶值与原值区分开
+_DENSIFY_OFFSET = 0x9E3779B9
+
+# 英文缩写展开
+_CONTRACTIONS = [
+    (re.compile(r"n['’]t\b"), " not"),
+    (re.compile(r"['’]re\b"), " are"),
+    (re.compile(r"['’]s\b"), " is"),
+    (re.compile(r"['’]m\b"), " am"),
+    (re.compile(r"['’]ll\b"), " will"),
+    (re.compile(r"['’]ve\b"), " have"),
+    (re.compile(r"['’]d\b"), " would"),
+]
+
+# 不影响问题语义的口头填充词
+_FILLER_WORDS = frozenset({
+    'please', 'pls', 'plz', 'um', 'uh', 'hey', 'hi', 'hello', 'ok', 'okay',
+    'so', 'just', 'me', 'tell', 'i', 'you', 'can', 'could', 'would', 'do',
+    'does', 'my', 'your', 'us', 'we', 'know', 'want', 'like'
+})
+_CJK_FILLERS = re.compile(r"请问|麻烦|一下|你好|您好|那个|就是|我想|想问|[呢啊吧呀嘛吗哦]")
+_NON_WORD = re.compile(r"[^\w\s]")
+_CJK_CHAR = re.compile(r"[一-鿿]")
+
+
+def semantic_normalize(text: str) -> str:
+    """归一化问题文本，消除ASR转写中常见的非语义差异
+
+    展开英文缩写、去除标点、停用词和口头填充词（中英文），
+    使“what's the refund policy”和“what is the refund policy please”归一化为相同文本。
+
+    Args:
+        text: 原始问题
+
+    Returns:
+        str: 归一化后的文本
+    """
+    text = text.lower()
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = _CJK_FILLERS.sub(" ", text)
+    text = _NON_WORD.sub(" ", text)
+
+    words = [w for w in text.split() if w not in STOP_WORDS and w not in _FILLER_WORDS]
+    return " ".join(words)
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """生成字符n-gram集合
+
+    中文文本按字符切分，使用二元组；其他文本使用 ``size`` 元组。
+
+    Args:
+        text: 归一化后的文本
+        size: n-gram长度
+
+    Returns:
+        Set[str]: n-gram集合
+    """
+    if _CJK_CHAR.search(text):
+        size = 2
+        text = text.replace(" ", "")
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def shingle_hashes(items: Set[str]) -> List[int]:
+    """计算n-gram的64位哈希
+
+    使用进程内的字符串哈希，速度快且在进程生命周期内稳定，适用于内存缓存。
+
+    Args:
+        items: n-gram集合
+
+    Returns:
+        List[int]: 64位无符号哈希值列表
+    """
+    return [hash(item) & _MASK_64 for item in items]
+
+
+class MinHasher:
+    """MinHash签名生成器
+
+    使用单次排列哈希（one permutation hashing）：每个n-gram只哈希一次并分配到一个桶，
+    空桶按各自独立的探测序列从非空桶借值（致密化），计算开销为 O(n-gram数 + 签名长度)。
+    独立的探测序列避免了相邻空桶借用同一个值，使短文本的LSH分带保持独立。
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        """初始化签名生成器
+
+        Args:
+            num_perm: 签名长度（桶数量）
+            seed: 探测序列的随机种子
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        # 每个桶的探测序列：随机排列，保证能遍历所有桶
+        self._probes = []
+        for _ in range(num_perm):
+            order = list(range(num_perm))
+            rng.shuffle(order)
+            self._probes.append(order)
+
+    def signature(self, hashes: List[int]) -> array:
+        """计算MinHash签名
+
+        Args:
+            hashes: n-gram的64位哈希值
+
+        Returns:
+            array: 长度为 ``num_perm`` 的32位签名
+        """
+        k = self.num_perm
+        if not hashes:
+            return array("I", [_MAX_HASH] * k)
+
+        bins = [_EMPTY] * k
+        for h in hashes:
+            index = h % k
+            value = (h // k) & _MAX_HASH
+            if value < bins[index]:
+                bins[index] = value
+
+        signature = list(bins)
+        for i in range(k):
+            if bins[i] != _EMPTY:
+                continue
+            for attempt, j in enumerate(self._probes[i], 1):
+                if bins[j] != _EMPTY:
+                    signature[i] = (bins[j] + attempt * _DENSIFY_OFFSET) & _MAX_HASH
+                    break
+
+        return array("I", signature)
+
+
+class SemanticCache:
+    """近似重复问题缓存
+
+    对归一化后的问题计算MinHash签名，通过LSH分桶快速找到候选，
+    再对候选计算n-gram集合的Jaccard相似度并与阈值比较。
+    每个桶只保留最近的若干条目，因此查找开销与缓存条目总数无关。
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 ngram: int = 3, ttl: float = 600.0, max_entries: int = 100000,
+                 bucket_size: int = 32):
+        """初始化近似缓存
+
+        Args:
+            threshold: 命中所需的最小Jaccard相似度（0-1）
+            num_perm: MinHash签名长度
+            bands: LSH分带数量，必须整除 ``num_perm``
+            ngram: 字符n-gram长度
+            ttl: 条目存活时间（秒），0表示不过期
+            max_entries: 最大条目数，超出时按LRU淘汰
+            bucket_size: 每个LSH桶保留的最大条目数
+        """
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bucket_size = bucket_size
+        self.hasher = MinHasher(num_perm)
+        self.stats = CacheStats()
+
+        self._next_id = 0
+        # entry_id -> (过期时间, scope, 分带桶键, n-gram哈希, 结果)
+        self._entries: "OrderedDict[int, Tuple[float, str, array, array, QueryResult]]" = OrderedDict()
+        # 分带桶键 -> entry_id，多个条目时为列表（大多数桶只有一个条目，节省内存）
+        self._buckets: Dict[int, Union[int, List[int]]] = {}
+
+    def _prepare(self, question: str, scope: str) -> Optional[Tuple[FrozenSet[int], array]]:
+        """计算问题的n-gram哈希集合和分带桶键，归一化后为空时返回None"""
+        items = shingles(semantic_normalize(question), self.ngram)
+        if not items:
+            return None
+
+        hashes = shingle_hashes(items)
+        signature = self.hasher.signature(hashes)
+        rows = self.rows
+        band_keys = array("q", [
+            hash((scope, band, signature[band * rows:(band + 1) * rows].tobytes()))
+            for band in range(self.bands)
+        ])
+        return frozenset(h & _MAX_HASH for h in hashes), band_keys
+
+    @staticmethod
+    def _jaccard(a: FrozenSet[int], b: array) -> float:
+        """计算n-gram哈希集合与已缓存条目的Jaccard相似度"""
+        intersection = len(a.intersection(b))
+        return intersection / (len(a) + len(b) - intersection)
+
+    async def get(self, question: str, scope: str) -> Optional[QueryResult]:
+        """查找近似重复问题的缓存结果
+
+        Args:
+            question: 用户问题
+            scope: 缓存作用域（提供商和查询选项），只在同一作用域内匹配
+
+        Returns:
+            Optional[QueryResult]: 最相似且超过阈值的缓存结果，未命中返回None
+        """
+        prepared = self._prepare(question, scope)
+        if prepared is None:
+            self.stats.misses += 1
+            return None
+
+        items, band_keys = prepared
+        now = time.monotonic()
+        best_id, best_score = None, 0.0
+        seen: Set[int] = set()
+
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            for entry_id in (bucket if isinstance(bucket, list) else (bucket,)):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+
+                expires_at, entry_scope, _, entry_items, _ = self._entries[entry_id]
+                if entry_scope != scope or (expires_at and expires_at < now):
+                    continue
+
+                score = self._jaccard(items, entry_items)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+        if best_id is None or best_score < self.threshold:
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(best_id)
+        self.stats.hits += 1
+        logger.debug(f"Semantic cache hit (similarity={best_score:.2f}): {question}")
+        return self._entries[best_id][4]
+
+    async def set(self, question: str, scope: str, result: QueryResult) -> None:
+        """写入缓存
+
+        Args:
+            question: 用户问题
+            scope: 缓存作用域
+            result: 查询结果
+        """
+        prepared = self._prepare(question, scope)
+        if prepared is None:
+            return
+
+        items, band_keys = prepared
+        entry_id = self._next_id
+        self._next_id += 1
+
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        self._entries[entry_id] = (expires_at, scope, band_keys, array("I", items), result)
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = entry_id
+            elif isinstance(bucket, list):
+                bucket.append(entry_id)
+                # 桶满时丢弃最旧的索引（条目本身仍由LRU管理）
+                if len(bucket) > self.bucket_size:
+                    bucket.pop(0)
+            else:
+                self._buckets[key] = [bucket, entry_id]
+        self.stats.sets += 1
+
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.stats.evictions += 1
+
+    async def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._buckets.clear()
+
+    def _remove(self, entry_id: int) -> None:
+        """移除条目及其分桶索引"""
+        _, _, band_keys, _, _ = self._entries.pop(entry_id)
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket == entry_id:
+                del self._buckets[key]
+            elif isinstance(bucket, list) and entry_id in bucket:
+                bucket.remove(entry_id)
+                if len(bucket) == 1:
+                    self._buckets[key] = bucket[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 统计信息
+        """
+        return {
+            **self.stats.to_dict(),
+            "entries": len(self._entries),
+            "buckets": len(self._buckets),
+            "threshold": self.threshold,
+            "max_entries": self.max_entries
+        }
+
+
+def create_semantic_cache(config: Dict[str, Any]) -> Optional[SemanticCache]:
+    """根据配置创建近似缓存
+
+    Args:
+        config: 近似缓存配置
+
+    Returns:
+        Optional[SemanticCache]: 缓存实例，未启用时返回None
+    """
+    if not config.get("enabled"):
+        return None
+
+    return SemanticCache(
+        threshold=config.get("threshold", 0.8),
+        num_perm=config.get("num_perm", 64),
+        bands=config.get("bands", 16),
+        ngram=config.get("ngram", 3),
+        ttl=config.get("ttl", 600.0),
+        max_entries=config.get("max_entries", 100000),
+        bucket_size=config.get("bucket_size", 32)
+    )
@@ -0,0 +1,180 @@
+"""分片会话注册表"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from app.models.session import SessionState
+import asyncio
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# 会话被空闲回收时调用的回调（通常用于关闭对应的WebSocket连接）
+EvictCallback = Callable[[SessionState], Awaitable[None]]
+
+
+class SessionRegistry:
+    """按会话ID分片存储的会话注册表
+
+    会话分散在多个字典中，单个分片的增删和扫描都很小；会话总数单独计数，读取为O(1)。
+    后台清理任务每轮只扫描一个分片，回收超过 ``idle_timeout`` 没有收到消息且没有进行中查询的会话。
+    """
+
+    def __init__(self, shards: int = 64, idle_timeout: float = 900.0, sweep_interval: float = 30.0):
+        """初始化会话注册表
+
+        Args:
+            shards: 分片数
+            idle_timeout: 空闲回收时间（秒），0表示不回收
+            sweep_interval: 清理周期（秒），每个周期内所有分片各扫描一次
+        """
+        self.shard_count = max(1, shards)
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._shards: List[Dict[str, Tuple[SessionState, Optional[EvictCallback]]]] = [
+            {} for _ in range(self.shard_count)
+        ]
+        self._count = 0
+        self._peak = 0
+        self.evicted = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _shard(self, session_id: str) -> Dict[str, Tuple[SessionState, Optional[EvictCallback]]]:
+        return self._shards[zlib.crc32(session_id.encode()) % self.shard_count]
+
+    def add(self, session: SessionState, on_evict: Optional[EvictCallback] = None) -> None:
+        """注册会话
+
+        Args:
+            session: 会话状态
+            on_evict: 会话被空闲回收时调用的回调
+        """
+        shard = self._shard(session.session_id)
+        if session.session_id not in shard:
+            self._count += 1
+            self._peak = max(self._peak, self._count)
+        shard[session.session_id] = (session, on_evict)
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        """按ID获取会话"""
+        entry = self._shard(session_id).get(session_id)
+        return entry[0] if entry else None
+
+    def remove(self, session_id: str) -> Optional[SessionState]:
+        """注销会话
+
+        Returns:
+            Optional[SessionState]: 被注销的会话，不存在时返回None
+        """
+        entry = self._shard(session_id).pop(session_id, None)
+        if entry is None:
+            return None
+        self._count -= 1
+        return entry[0]
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._shard(session_id)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[SessionState]:
+        for shard in self._shards:
+            for session, _ in list(shard.values()):
+                yield session
+
+    async def evict_idle(self, shard_index: Optional[int] = None, now: Optional[float] = None) -> int:
+        """回收空闲会话
+
+        Args:
+            shard_index: 只扫描指定分片，默认扫描全部分片
+            now: 当前时间（``time.monotonic``），默认取当前时间
+
+        Returns:
+            int: 回收的会话数
+        """
+        if self.idle_timeout <= 0:
+            return 0
+
+        now = time.monotonic() if now is None else now
+        shards = self._shards if shard_index is None else [self._shards[shard_index]]
+        expired = [
+            entry
+            for shard in shards
+            for entry in list(shard.values())
+            if not entry[0].has_active_query and now - entry[0].last_active >= self.idle_timeout
+        ]
+
+        evicted = 0
+        for session, on_evict in expired:
+            if self.remove(session.session_id) is None:
+                continue
+            evicted += 1
+            self.evicted += 1
+            logger.info(f"Evicting idle session: {session.session_id}")
+            session.reset()
+            if on_evict:
+                try:
+                    await on_evict(session)
+                except Exception as e:
+                    logger.warning(f"Failed to close idle session {session.session_id}: {e}")
+        return evicted
+
+    async def start(self) -> None:
+        """启动后台空闲会话清理"""
+        if self._sweeper or self.idle_timeout <= 0:
+            return
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        """停止后台清理"""
+        if not self._sweeper:
+            return
+        self._sweeper.cancel()
+        try:
+            await self._sweeper
+        except asyncio.CancelledError:
+            pass
+        self._sweeper = None
+
+    async def _sweep_loop(self) -> None:
+        """轮流扫描各个分片，把一次全量扫描分摊到整个清理周期"""
+        interval = max(self.sweep_interval / self.shard_count, 0.01)
+        index = 0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle(index)
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+            index = (index + 1) % self.shard_count
+
+    def memory_usage(self) -> int:
+        """估算所有会话占用的内存（字节）
+
+        需要遍历所有会话及其文本块，耗时与会话数和文本量成正比。
+        """
+        return sum(session.memory_size() for session in self)
+
+    def get_stats(self, detail: bool = False) -> Dict[str, Any]:
+        """获取会话注册表统计信息
+
+        Args:
+            detail: 是否包含内存估算（需要遍历所有会话，不适合频繁的存活探测）
+
+        Returns:
+            Dict[str, Any]: 会话数、分片负载、回收次数，detail为True时还包括内存估算
+        """
+        stats = {
+            "sessions": self._count,
+            "peak_sessions": self._peak,
+            "shards": self.shard_count,
+            "max_shard_size": max(len(shard) for shard in self._shards),
+            "idle_timeout": self.idle_timeout,
+            "evicted": self.evicted
+        }
+        if detail:
+            memory = self.memory_usage()
+            stats["memory_bytes"] = memory
+            stats["avg_session_bytes"] = memory // self._count if self._count else 0
+        return stats
@@ -0,0 +1,158 @@
+"""相同并发请求的合并（single-flight）"""
+
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, TypeVar
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight:
+    """一次进行中的共享调用"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamFlight:
+    """一次进行中的共享流式调用
+
+    生产者任务消费上游流并记录所有增量，订阅者按各自的位置读取，
+    因此中途加入的订阅者也能从头拿到完整答案。
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.condition = asyncio.Condition()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """合并相同键的并发调用
+
+    同一时刻相同键的调用只执行一次上游请求，所有等待者得到同一个结果（或同一个异常）；
+    流式调用把同一组增量分发给所有订阅者。所有等待者都取消时，共享的上游请求也会被取消。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """执行或加入一次共享调用
+
+        Args:
+            key: 调用键，相同键的并发调用会被合并
+            fn: 创建上游调用的函数
+
+        Returns:
+            T: 共享调用的结果
+
+        Raises:
+            Exception: 共享调用抛出的异常
+        """
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._calls[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(self._calls, key, flight))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joined in-flight call: {key}")
+
+        flight.waiters += 1
+        try:
+            # shield: 单个等待者取消不影响其他等待者
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """执行或加入一次共享流式调用
+
+        Args:
+            key: 调用键
+            factory: 创建上游流的函数
+
+        Yields:
+            str: 上游流的增量片段
+
+        Raises:
+            Exception: 上游流抛出的异常
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._produce(flight, factory))
+            flight.task.add_done_callback(lambda _: self._forget(self._streams, key, flight))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joined in-flight stream: {key}")
+
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with flight.condition:
+                    await flight.condition.wait_for(
+                        lambda: position < len(flight.chunks) or flight.done
+                    )
+
+                while position < len(flight.chunks):
+                    chunk = flight.chunks[position]
+                    position += 1
+                    yield chunk
+
+                if flight.done and position >= len(flight.chunks):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def _produce(self, flight: _StreamFlight, factory: Callable[[], AsyncIterator[str]]) -> None:
+        """消费上游流并通知订阅者"""
+        try:
+            async for chunk in factory():
+                async with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            async with flight.condition:
+                flight.condition.notify_all()
+
+    @staticmethod
+    def _forget(flights: Dict[str, Any], key: str, flight: Any) -> None:
+        """调用结束后移除记录（只移除自己，避免误删同键的新调用）"""
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计信息
+
+        Returns:
+            Dict[str, Any]: 进行中的调用数和被合并的调用数
+        """
+        return {
+            "in_flight": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,107 @@
+"""单个问题的耗时分解
+
+``SpanRecorder`` 通过 ``current_spans`` 上下文变量在 ``process_question`` → ``RAGService`` →
+提供商之间传递。调用链上的各层用 ``record`` / ``span`` 记录耗时，没有记录器时为空操作。
+子任务创建时复制上下文，因此在同一个问题的子任务（流式读取、对冲请求等）中记录的耗时也会累加到同一个记录器。
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+import time
+
+# 各阶段的输出顺序
+PHASES = (
+    "detection", "queue_wait", "rate_limit_wait", "upstream_connect",
+    "ttft", "generation", "send", "total"
+)
+
+
+class SpanRecorder:
+    """累计一个问题各阶段的耗时"""
+
+    __slots__ = ("started", "durations", "_lap")
+
+    def __init__(self, started: Optional[float] = None):
+        """初始化记录器
+
+        Args:
+            started: 起点时间（time.monotonic），默认为当前时间
+        """
+        self.started = time.monotonic() if started is None else started
+        self.durations: Dict[str, float] = {}
+        self._lap = self.started
+
+    def add(self, name: str, seconds: float) -> None:
+        """累加一个阶段的耗时（秒）"""
+        self.durations[name] = self.durations.get(name, 0.0) + max(seconds, 0.0)
+
+    def since(self, name: str, start: float) -> None:
+        """记录从 ``start`` 到现在的耗时"""
+        self.add(name, time.monotonic() - start)
+
+    def lap(self, name: str) -> None:
+        """记录从上一次 ``lap``（或起点）到现在的耗时，用于首尾相接的阶段"""
+        now = time.monotonic()
+        self.add(name, now - self._lap)
+        self._lap = now
+
+    def elapsed(self) -> float:
+        """从起点到现在的秒数"""
+        return time.monotonic() - self.started
+
+    def as_dict(self) -> Dict[str, float]:
+        """按阶段顺序输出毫秒数，未记录的阶段不输出"""
+        ordered = [name for name in PHASES if name in self.durations]
+        ordered += [name for name in self.durations if name not in PHASES]
+        return {name: round(self.durations[name] * 1000, 2) for name in ordered}
+
+
+# 当前问题的耗时记录器
+current_spans: ContextVar[Optional[SpanRecorder]] = ContextVar("current_spans", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    """向当前记录器累加一个阶段的耗时"""
+    recorder = current_spans.get()
+    if recorder is not None:
+        recorder.add(name, seconds)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """记录代码块的耗时"""
+    recorder = current_spans.get()
+    if recorder is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        recorder.since(name, start)
+
+
+def connect_tracer(recorder: SpanRecorder) -> Callable[[str, Dict[str, Any]], Awaitable[None]]:
+    """创建httpcore的trace回调，把建立TCP连接和TLS握手的时间记为 ``upstream_connect``
+
+    复用连接池中的连接时不会触发，对应阶段不计时。
+
+    Args:
+        recorder: 耗时记录器
+
+    Returns:
+        Callable: 放入请求 ``extensions["trace"]`` 的异步回调
+    """
+    started: Dict[str, float] = {}
+
+    async def trace(event: str, info: Dict[str, Any]) -> None:
+        phase, _, stage = event.rpartition(".")
+        if phase not in ("connection.connect_tcp", "connection.start_tls"):
+            return
+        if stage == "started":
+            started[phase] = time.monotonic()
+        elif phase in started:
+            recorder.since("upstream_connect", started.pop(phase))
+
+    return trace
@@ -0,0 +1,229 @@
+"""基于非最终化ASR文本的投机查询"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.models.session import SessionState
+from app.services.rag_providers.rate_limiter import Priority, priority_scope
+from app.services.text_utils import calculate_similarity, question_detector
+import asyncio
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+_WORD_CHAR = re.compile(r"[A-Za-z0-9]")
+
+
+def stable_prefix(previous: Optional[str], current: str) -> str:
+    """计算两次非最终化识别结果的公共前缀
+
+    ASR的中间结果通常只改写末尾，前后两次结果一致的部分可以视为已经稳定。
+    公共前缀截断在英文单词中间时回退到上一个空格。
+
+    Args:
+        previous: 上一次的中间结果
+        current: 本次的中间结果
+
+    Returns:
+        str: 稳定的前缀（去除首尾空白）
+    """
+    if not previous:
+        return ""
+    prefix = os.path.commonprefix([previous, current])
+    if len(prefix) < len(current) and prefix and \
+            _WORD_CHAR.match(prefix[-1]) and _WORD_CHAR.match(current[len(prefix)]):
+        prefix = prefix[:prefix.rfind(" ") + 1]
+    return prefix.strip()
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class SpeculativeAnswer:
+    """投机查询的流式答案
+
+    后台任务以投机优先级消费 ``RAGService.stream_query``，记录已到达的增量；
+    最终问题命中后通过 ``follow`` 从头读取，已生成的部分立即输出，之后的增量到达即转发。
+    """
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+    @property
+    def started(self) -> bool:
+        """上游是否已经开始输出（已取得限流额度）"""
+        return bool(self.chunks) or (self.done and self.error is None)
+
+    async def produce(self, question: str, rag_service: Any) -> None:
+        """以投机优先级查询并记录增量"""
+        try:
+            with priority_scope(Priority.SPECULATIVE):
+                async for chunk in rag_service.stream_query(question):
+                    async with self.changed:
+                        self.chunks.append(chunk)
+                        self.changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            async with self.changed:
+                self.changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[str]:
+        """从头读取答案增量，直到投机查询结束
+
+        Raises:
+            Exception: 投机查询失败
+        """
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.chunks) or self.done)
+            while position < len(self.chunks):
+                position += 1
+                yield self.chunks[position - 1]
+            if self.done and position >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SpeculativePrefetcher:
+    """在用户说完之前提前发起RAG查询
+
+    非最终化文本的稳定前缀（与已有的最终化文本拼接后）看起来像问题时，以投机优先级发起流式查询。
+    最终问题与投机问题相同或相似度达到阈值、且投机查询已经开始输出时，接着读取投机查询的流；
+    否则取消投机查询，由调用方以实时优先级重新查询，实时问题不会排在投机优先级的限流队列中。
+    每个会话同时最多只有一个投机查询。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """初始化投机查询
+
+        Args:
+            config: 投机查询配置，包含enabled、min_chars、similarity
+        """
+        config = config or {}
+        self.enabled = config.get("enabled", False)
+        self.min_chars = config.get("min_chars", 6)
+        self.similarity = config.get("similarity", 0.8)
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.restarted = 0
+        self.not_started = 0
+        self.failed = 0
+
+    def matches(self, speculative: str, question: str) -> bool:
+        """判断最终问题能否使用投机问题的答案
+
+        Args:
+            speculative: 投机查询的问题
+            question: 最终问题
+
+        Returns:
+            bool: 归一化后相同或相似度达到阈值时返回True
+        """
+        if _normalize(speculative) == _normalize(question):
+            return True
+        return calculate_similarity(speculative, question) >= self.similarity
+
+    def on_partial(self, session: SessionState, text: str, rag_service: Any) -> None:
+        """处理非最终化文本，必要时发起或替换投机查询
+
+        Args:
+            session: 会话状态
+            text: 非最终化的ASR文本
+            rag_service: RAG服务实例
+        """
+        if not self.enabled:
+            return
+
+        prefix = stable_prefix(session.last_partial_text, text)
+        session.last_partial_text = text
+        if len(prefix) < self.min_chars or session.has_active_query:
+            return
+        if not (session.looks_like_question() or question_detector.matches(prefix)):
+            return
+
+        candidate = f"{session.aggregated_text} {prefix}".strip()
+        if session.speculative_task is not None and session.speculative_question is not None:
+            if self.matches(session.speculative_question, candidate):
+                return
+            self.restarted += 1
+            session.cancel_speculation()
+
+        session.speculative_question = candidate
+        answer = SpeculativeAnswer()
+        session.speculative_answer = answer
+        session.speculative_task = asyncio.create_task(answer.produce(candidate, rag_service))
+        self.started += 1
+        logger.debug(f"Speculative query started for session {session.session_id}: {candidate[:50]}")
+
+    def take(self, session: SessionState, question: str) -> Optional[AsyncIterator[str]]:
+        """取出与最终问题匹配的投机答案流
+
+        不匹配、尚未开始输出或已经失败时取消投机查询并返回None。
+
+        Args:
+            session: 会话状态
+            question: 最终问题
+
+        Returns:
+            Optional[AsyncIterator[str]]: 从头读取投机答案的增量流，没有可用结果时返回None
+        """
+        task = session.speculative_task
+        answer = session.speculative_answer
+        speculative = session.speculative_question
+        session.speculative_task = None
+        session.speculative_answer = None
+        session.speculative_question = None
+        session.last_partial_text = None
+        if task is None:
+            return None
+
+        if not self.matches(speculative, question):
+            self.misses += 1
+            task.cancel()
+            return None
+        if answer.error is not None:
+            self.failed += 1
+            logger.warning(f"Speculative query failed, querying again: {answer.error}")
+            return None
+        if not answer.started:
+            # 可能仍在投机优先级的限流队列中，改用实时查询
+            self.not_started += 1
+            task.cancel()
+            return None
+
+        self.hits += 1
+        return self._follow(task, answer)
+
+    async def _follow(self, task: asyncio.Task, answer: SpeculativeAnswer) -> AsyncIterator[str]:
+        """读取投机答案，读取方提前退出（如被中断）时取消投机查询"""
+        try:
+            async for chunk in answer.follow():
+                yield chunk
+        finally:
+            if not task.done():
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取投机查询统计
+
+        Returns:
+            Dict[str, Any]: 发起、命中、未命中、替换、未开始输出和失败次数
+        """
+        return {
+            "enabled": self.enabled,
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "restarted": self.restarted,
+            "not_started": self.not_started,
+            "failed": self.failed
+        }
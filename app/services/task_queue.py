@@ -1,7 +1,9 @@
 """任务队列管理"""
 
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from app.models.batch_task import BatchTask
+from app.services.task_store import SQLiteTaskStore
 import asyncio
 import logging
 from collections import deque
@@ -13,20 +15,88 @@ class TaskQueue:
     """任务队列管理器
     
     管理批量处理任务的队列，支持任务调度、状态管理和优先级处理。
-    当前实现使用内存队列，未来可以扩展为Redis或数据库支持。
+    队列在内存中调度；配置了持久化存储时，任务的提交、状态变化和每个文本的结果都会写入存储，
+    重启后未完成的任务从检查点恢复。已结束的任务保留 ``retention_hours`` 小时供查询，
+    由 ``cleanup_old_tasks`` 定期清理，不占用队列容量。
     """
     
-    def __init__(self, max_size: int = 1000):
+    def __init__(self, max_size: int = 1000, store: Optional[SQLiteTaskStore] = None,
+                 retention_hours: float = 24):
         """初始化任务队列
         
         Args:
-            max_size: 队列最大大小
+            max_size: 待处理和运行中任务数的上限
+            store: 持久化存储，None表示只保存在内存中
+            retention_hours: 已结束任务的保留时间（小时），0表示不清理
         """
         self.max_size = max_size
+        self.store = store
+        self.retention_hours = retention_hours
         self.tasks: Dict[str, BatchTask] = {}
         self.pending_queue: deque = deque()
         self.running_tasks: Dict[str, BatchTask] = {}
         self._lock = asyncio.Lock()
+        # 有新任务入队时唤醒等待中的消费者
+        self._task_available = asyncio.Condition(self._lock)
+    
+    async def open(self) -> int:
+        """打开持久化存储并恢复任务
+        
+        超过保留时间的已结束任务先从存储中删除，其余已结束的任务恢复为可查询状态；
+        待处理和运行中的任务重新入队，保留已保存的结果，只处理剩余的文本。
+        存储无法打开时退回为只使用内存。
+        
+        Returns:
+            int: 重新入队的任务数
+        """
+        if self.store is None:
+            return 0
+        
+        try:
+            await self.store.open()
+            if self.retention_hours > 0:
+                cutoff = datetime.now() - timedelta(hours=self.retention_hours)
+                expired = await self.store.delete_finished_before(cutoff)
+                if expired:
+                    logger.info(f"Deleted {expired} batch tasks past retention")
+            tasks = await self.store.load_tasks()
+        except Exception as e:
+            logger.error(f"Failed to open batch task store, tasks will not be persisted: {e}")
+            self.store = None
+            return 0
+        
+        resumed = 0
+        async with self._lock:
+            for task in tasks:
+                self.tasks[task.task_id] = task
+                if task.status in ("pending", "running"):
+                    task.status = "pending"
+                    self.pending_queue.append(task.task_id)
+                    resumed += 1
+            if resumed:
+                self._task_available.notify_all()
+        
+        logger.info(f"Restored {len(tasks)} batch tasks, {resumed} resumed from checkpoint")
+        return resumed
+    
+    async def close(self) -> None:
+        """关闭持久化存储，未完成的任务在下次启动时恢复"""
+        if self.store is not None:
+            store, self.store = self.store, None
+            await store.close()
+    
+    def _active_count(self) -> int:
+        """待处理和运行中的任务数（调用方需持有锁）"""
+        return len(self.pending_queue) + len(self.running_tasks)
+    
+    async def _save(self, task: BatchTask) -> None:
+        """把任务状态写入持久化存储，失败时只记录日志"""
+        if self.store is None:
+            return
+        try:
+            await self.store.update_task(task)
+        except Exception as e:
+            logger.error(f"Failed to persist task {task.task_id}: {e}")
     
     async def submit_task(self, task: BatchTask) -> str:
         """提交任务到队列
@@ -38,16 +108,25 @@ class TaskQueue:
             str: 任务ID
             
         Raises:
-            Exception: 如果队列已满
+            Exception: 如果待处理和运行中的任务已达上限
         """
         async with self._lock:
-            # 检查队列大小
-            if len(self.tasks) >= self.max_size:
+            # 已结束的任务只保留供查询，不占用队列容量
+            if self._active_count() >= self.max_size:
                 raise Exception("任务队列已满，请稍后再试")
             
+            # 先持久化再入队，接受的任务在重启后不会丢失
+            if self.store is not None:
+                try:
+                    await self.store.add_task(task)
+                except Exception as e:
+                    logger.error(f"Failed to persist task {task.task_id}: {e}")
+                    raise Exception(f"任务保存失败: {str(e)}")
+            
             # 添加任务
             self.tasks[task.task_id] = task
             self.pending_queue.append(task.task_id)
+            self._task_available.notify()
             
             logger.info(f"Task submitted: {task.task_id}, queue size: {len(self.pending_queue)}")
             
@@ -60,17 +139,64 @@ class TaskQueue:
             Optional[BatchTask]: 下一个任务，如果队列为空返回None
         """
         async with self._lock:
-            if not self.pending_queue:
-                return None
-            
-            task_id = self.pending_queue.popleft()
-            task = self.tasks.get(task_id)
-            
-            if task and task.status == "pending":
-                self.running_tasks[task_id] = task
-                return task
-            
+            return self._pop_pending()
+    
+    async def wait_next_task(self) -> BatchTask:
+        """等待并获取下一个待处理任务
+        
+        队列为空时挂起，直到有新任务提交后被唤醒，不需要轮询。
+        
+        Returns:
+            BatchTask: 下一个任务
+        """
+        async with self._task_available:
+            while True:
+                task = self._pop_pending()
+                if task:
+                    return task
+                if not self.pending_queue:
+                    await self._task_available.wait()
+    
+    def _pop_pending(self) -> Optional[BatchTask]:
+        """弹出队首任务（调用方需持有锁）
+        
+        Returns:
+            Optional[BatchTask]: 队首的待处理任务，队列为空或任务已不是pending状态时返回None
+        """
+        if not self.pending_queue:
             return None
+        
+        task_id = self.pending_queue.popleft()
+        task = self.tasks.get(task_id)
+        
+        if task and task.status == "pending":
+            self.running_tasks[task_id] = task
+            return task
+        
+        return None
+    
+    async def start_task(self, task: BatchTask) -> None:
+        """标记任务开始处理
+        
+        Args:
+            task: 批量处理任务
+        """
+        task.start()
+        await self._save(task)
+    
+    async def save_result(self, task: BatchTask, index: int) -> None:
+        """保存单个文本的结果作为检查点
+        
+        Args:
+            task: 批量处理任务
+            index: 文本下标
+        """
+        if self.store is None:
+            return
+        try:
+            await self.store.save_result(task, index)
+        except Exception as e:
+            logger.error(f"Failed to persist result {index} of task {task.task_id}: {e}")
     
     async def complete_task(self, task_id: str) -> None:
         """标记任务为已完成
@@ -85,6 +211,9 @@ class TaskQueue:
             task = self.tasks.get(task_id)
             if task:
                 logger.info(f"Task completed: {task_id}")
+        
+        if task:
+            await self._save(task)
     
     async def fail_task(self, task_id: str, error_message: str) -> None:
         """标记任务为失败
@@ -101,6 +230,9 @@ class TaskQueue:
             if task:
                 task.fail(error_message)
                 logger.error(f"Task failed: {task_id}, error: {error_message}")
+        
+        if task:
+            await self._save(task)
     
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务
@@ -131,8 +263,10 @@ class TaskQueue:
             
             task.cancel()
             logger.info(f"Task cancelled: {task_id}")
-            
-            return True
+        
+        await self._save(task)
+        
+        return True
     
     async def get_task(self, task_id: str) -> Optional[BatchTask]:
         """获取任务信息
@@ -176,19 +310,20 @@ class TaskQueue:
                 "pending": len(self.pending_queue),
                 "running": len(self.running_tasks),
                 "max_size": self.max_size,
-                "available_slots": self.max_size - len(self.tasks)
+                "available_slots": max(0, self.max_size - self._active_count())
             }
     
-    async def cleanup_old_tasks(self, max_age_hours: int = 24) -> int:
+    async def cleanup_old_tasks(self, max_age_hours: Optional[float] = None) -> int:
         """清理旧任务
         
         Args:
-            max_age_hours: 最大保留时间（小时）
+            max_age_hours: 最大保留时间（小时），默认使用 ``retention_hours``
             
         Returns:
             int: 清理的任务数量
         """
-        from datetime import datetime, timedelta
+        if max_age_hours is None:
+            max_age_hours = self.retention_hours
         
         async with self._lock:
             cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
@@ -203,6 +338,12 @@ class TaskQueue:
             for task_id in to_remove:
                 del self.tasks[task_id]
             
+            if self.store is not None and to_remove:
+                try:
+                    await self.store.delete_tasks(to_remove)
+                except Exception as e:
+                    logger.error(f"Failed to delete old tasks from store: {e}")
+            
             logger.info(f"Cleaned up {len(to_remove)} old tasks")
             
             return len(to_remove)
@@ -0,0 +1,271 @@
+"""批量任务的持久化存储"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from app.models.batch_task import BatchTask, QueryResult
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    texts TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    completed_at TEXT,
+    error_message TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    content TEXT,
+    metadata TEXT,
+    sources TEXT,
+    usage TEXT,
+    PRIMARY KEY (task_id, idx)
+);
+"""
+
+
+def _dumps(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def _loads(value: Optional[str]) -> Any:
+    return None if value is None else json.loads(value)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class SQLiteTaskStore:
+    """基于SQLite（WAL模式）的批量任务存储
+
+    保存任务的提交内容、状态和每个文本的处理结果，服务重启后可以从检查点恢复未完成的任务。
+    每次写入是一个事务；WAL模式下写入只追加日志，读写互不阻塞。
+    SQLite调用在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self, path: str):
+        """初始化存储
+
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # 单个连接在多个线程间共享，写入需要串行化
+        self._lock = threading.Lock()
+
+    async def open(self) -> None:
+        """打开数据库并创建表"""
+        await asyncio.to_thread(self._open)
+        logger.info(f"Batch task store opened: {self.path}")
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    async def close(self) -> None:
+        """关闭数据库"""
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    async def _run(self, statements: List[tuple]) -> None:
+        """在一个事务中执行多条语句"""
+        def execute() -> None:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    for sql, params in statements:
+                        self._conn.execute(sql, params)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+        await asyncio.to_thread(execute)
+
+    async def add_task(self, task: BatchTask) -> None:
+        """保存新提交的任务
+
+        Args:
+            task: 批量处理任务
+        """
+        await self._run([(
+            "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (task.task_id, task.name, task.description, _dumps(task.texts), _dumps(task.options),
+             task.status, _dumps(task.progress), _isoformat(task.created_at),
+             _isoformat(task.started_at), _isoformat(task.completed_at), task.error_message)
+        )])
+
+    def _update_statement(self, task: BatchTask) -> tuple:
+        return (
+            "UPDATE tasks SET status = ?, progress = ?, started_at = ?, completed_at = ?, "
+            "error_message = ? WHERE task_id = ?",
+            (task.status, _dumps(task.progress), _isoformat(task.started_at),
+             _isoformat(task.completed_at), task.error_message, task.task_id)
+        )
+
+    async def update_task(self, task: BatchTask) -> None:
+        """保存任务的状态、进度和时间
+
+        Args:
+            task: 批量处理任务
+        """
+        await self._run([self._update_statement(task)])
+
+    async def save_result(self, task: BatchTask, index: int) -> None:
+        """保存单个文本的结果及任务进度（检查点）
+
+        Args:
+            task: 批量处理任务
+            index: 文本下标
+        """
+        result = task.results[index]
+        await self._run([
+            (
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task.task_id, index, len(task.completed_indices), result.content,
+                 _dumps(result.metadata), _dumps(result.sources), _dumps(result.usage))
+            ),
+            self._update_statement(task)
+        ])
+
+    async def delete_tasks(self, task_ids: Iterable[str]) -> None:
+        """删除任务及其结果
+
+        Args:
+            task_ids: 任务ID
+        """
+        statements = []
+        for task_id in task_ids:
+            statements.append(("DELETE FROM results WHERE task_id = ?", (task_id,)))
+            statements.append(("DELETE FROM tasks WHERE task_id = ?", (task_id,)))
+        if statements:
+            await self._run(statements)
+
+    async def delete_finished_before(self, cutoff: datetime) -> int:
+        """删除在指定时间之前结束的任务及其结果
+
+        Args:
+            cutoff: 结束时间早于此时间的已完成、失败或取消的任务会被删除
+
+        Returns:
+            int: 删除的任务数
+        """
+        condition = "status IN ('completed', 'failed', 'cancelled') AND completed_at < ?"
+        params = (_isoformat(cutoff),)
+
+        def execute() -> int:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.execute(
+                        f"DELETE FROM results WHERE task_id IN (SELECT task_id FROM tasks WHERE {condition})",
+                        params
+                    )
+                    deleted = self._conn.execute(f"DELETE FROM tasks WHERE {condition}", params).rowcount
+                    self._conn.execute("COMMIT")
+                    return deleted
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+        return await asyncio.to_thread(execute)
+
+    async def load_tasks(self) -> List[BatchTask]:
+        """加载所有任务，已保存的结果按完成顺序恢复
+
+        Returns:
+            List[BatchTask]: 按创建时间排序的任务
+        """
+        return await asyncio.to_thread(self._load_tasks)
+
+    def _load_tasks(self) -> List[BatchTask]:
+        with self._lock:
+            task_rows = self._conn.execute(
+                "SELECT task_id, name, description, texts, options, status, progress, "
+                "created_at, started_at, completed_at, error_message FROM tasks ORDER BY created_at"
+            ).fetchall()
+            result_rows = self._conn.execute(
+                "SELECT task_id, idx, content, metadata, sources, usage FROM results ORDER BY task_id, seq"
+            ).fetchall()
+
+        results: Dict[str, List[tuple]] = {}
+        for row in result_rows:
+            results.setdefault(row[0], []).append(row[1:])
+
+        tasks = []
+        for (task_id, name, description, texts, options, status, progress,
+             created_at, started_at, completed_at, error_message) in task_rows:
+            task = BatchTask(
+                task_id=task_id,
+                name=name,
+                texts=_loads(texts),
+                options=_loads(options),
+                status=status,
+                progress=_loads(progress),
+                created_at=_parse_time(created_at),
+                started_at=_parse_time(started_at),
+                completed_at=_parse_time(completed_at),
+                error_message=error_message,
+                description=description
+            )
+            saved = results.get(task_id)
+            if saved:
+                task.results = [None] * len(task.texts)
+                for index, content, metadata, sources, usage in saved:
+                    if 0 <= index < len(task.texts):
+                        task.set_result(index, QueryResult(
+                            content=content,
+                            metadata=_loads(metadata),
+                            sources=_loads(sources),
+                            usage=_loads(usage)
+                        ))
+                # 并发写入时保存的进度可能落后于结果，以已保存的结果为准
+                failed = sum(1 for i in task.completed_indices
+                             if (task.results[i].metadata or {}).get("error"))
+                task.update_progress(len(task.completed_indices) - failed, failed)
+            tasks.append(task)
+
+        return tasks
+
+
+def create_task_store(config: Dict[str, Any]) -> Optional[SQLiteTaskStore]:
+    """根据批量处理配置创建任务存储
+
+    Args:
+        config: 批量处理配置，包含persistence_enabled和storage_path
+
+    Returns:
+        Optional[SQLiteTaskStore]: 任务存储，未启用持久化时返回None
+    """
+    if not config.get("persistence_enabled", True):
+        return None
+    return SQLiteTaskStore(os.path.join(config.get("storage_path", "./batch_results"), "tasks.db"))
@@ -1,6 +1,45 @@
 """文本处理工具"""
 
-from typing import List
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+import re
+import time
+
+# 中文句末标点，出现即可断句
+_CJK_SENTENCE_ENDS = frozenset("。？！；…")
+
+# 英文句末标点，需要后跟空白才确认为句子边界（避免切断 3.14 等）
+_LATIN_SENTENCE_ENDS = frozenset(".?!;")
+
+# 后跟空白也不是句子边界的常见英文缩写（小写）
+_ABBREVIATIONS = frozenset({
+    "e.g.", "i.e.", "vs.", "cf.", "approx.", "mr.", "mrs.", "ms.", "dr.", "prof.", "st."
+})
+_MAX_ABBREVIATION = max(len(a) for a in _ABBREVIATIONS)
+
+# 简单的停用词列表
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'is', 'are', 'was', 'were', 'be', 'been',
+    '的', '了', '和', '是', '在', '有', '我', '你', '他', '她', '它'
+})
+
+# 问号（中英文）
+QUESTION_MARKS = ('?', '？')
+
+# 中文疑问词
+CHINESE_QUESTION_WORDS = (
+    '吗', '呢', '什么', '怎么', '为什么', '如何', '哪里',
+    '哪个', '谁', '几', '多少', '是否', '能否', '可否',
+    '干嘛', '咋', '啥'
+)
+
+# 英文疑问词（按单词边界匹配）
+ENGLISH_QUESTION_WORDS = (
+    'what', 'how', 'why', 'when', 'where', 'who',
+    'which', 'whom', 'whose', 'can', 'could', 'would',
+    'should', 'is', 'are', 'do', 'does', 'did'
+)
 
 
 def split_answer_into_chunks(answer: str, chunk_size: int = 120) -> List[str]:
@@ -64,6 +103,155 @@ def split_answer_into_chunks(answer: str, chunk_size: int = 120) -> List[str]:
     return chunks
 
 
+def _ends_with_abbreviation(text: str, end: int) -> bool:
+    """判断 ``text[:end]`` 的最后一个单词是否为常见缩写"""
+    # 多取一个字符，窗口正好从单词中间开始时不会误判
+    words = text[max(0, end - _MAX_ABBREVIATION - 1):end].split()
+    return bool(words) and words[-1].lower() in _ABBREVIATIONS
+
+
+class StreamingChunker:
+    """增量句子边界分块器
+    
+    逐个接收流式增量片段，在中英文句子边界处输出答案块（不在 e.g.、Mr. 等常见缩写后切分），
+    同时支持最大长度和最大延迟两种强制切分。每个字符只扫描一次。
+    
+    示例:
+        >>> chunker = StreamingChunker(max_chars=120, min_chars=2)
+        >>> chunker.feed("你好。今天")
+        ['你好。']
+        >>> chunker.flush()
+        '今天'
+    """
+    
+    def __init__(self, max_chars: int = 120, min_chars: int = 1,
+                 max_latency: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """初始化分块器
+        
+        Args:
+            max_chars: 每个块的最大字符数，达到后强制切分
+            min_chars: 在句子边界切分所需的最小字符数
+            max_latency: 缓冲内容的最大滞留时间（秒），None表示不限制
+            clock: 时钟函数，便于测试
+        """
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self.max_latency = max_latency
+        self._clock = clock
+        self._buffer = ""
+        self._scanned = 0
+        self._boundary = 0
+        self._space = 0
+        self._buffered_at: Optional[float] = None
+    
+    def feed(self, delta: str) -> List[str]:
+        """接收一个增量片段
+        
+        Args:
+            delta: 增量文本
+            
+        Returns:
+            List[str]: 本次可以输出的答案块
+        """
+        if not delta:
+            return []
+        
+        if not self._buffer:
+            self._buffered_at = self._clock()
+        self._buffer += delta
+        
+        chunks: List[str] = []
+        buf = self._buffer
+        i = self._scanned
+        
+        while i < len(buf):
+            ch = buf[i]
+            if ch in _CJK_SENTENCE_ENDS or ch == "\n":
+                self._boundary = i + 1
+            elif ch.isspace():
+                if i > 0 and buf[i - 1] in _LATIN_SENTENCE_ENDS and \
+                        not (buf[i - 1] == "." and _ends_with_abbreviation(buf, i)):
+                    self._boundary = i
+                self._space = i + 1
+            i += 1
+            
+            if self._boundary and self._boundary >= self.min_chars:
+                cut = self._boundary
+            elif i >= self.max_chars:
+                cut = self._boundary or self._space or i
+            else:
+                continue
+            
+            self._emit(buf[:cut], chunks)
+            buf = buf[cut:]
+            i -= cut
+            self._boundary = 0
+            self._space = max(self._space - cut, 0)
+        
+        if chunks:
+            self._buffered_at = self._clock() if buf else None
+        self._buffer = buf
+        self._scanned = i
+        return chunks
+    
+    def poll(self) -> Optional[str]:
+        """检查最大延迟，超时则输出缓冲内容
+        
+        优先在句子边界切分，其次在空格处，否则输出全部缓冲内容。
+        
+        Returns:
+            Optional[str]: 超时输出的答案块，未超时返回None
+        """
+        if not self._buffer or self.max_latency is None:
+            return None
+        
+        if self._clock() - self._buffered_at < self.max_latency:
+            return None
+        
+        cut = self._boundary or self._space or len(self._buffer)
+        chunks: List[str] = []
+        self._emit(self._buffer[:cut], chunks)
+        self._buffer = self._buffer[cut:]
+        self._scanned = max(self._scanned - cut, 0)
+        self._boundary = 0
+        self._space = max(self._space - cut, 0)
+        self._buffered_at = self._clock() if self._buffer else None
+        
+        return chunks[0] if chunks else None
+    
+    def time_until_flush(self) -> Optional[float]:
+        """距离下一次延迟切分的剩余时间
+        
+        Returns:
+            Optional[float]: 剩余秒数，没有缓冲内容或未设置延迟时返回None
+        """
+        if not self._buffer or self.max_latency is None:
+            return None
+        
+        return max(0.0, self._buffered_at + self.max_latency - self._clock())
+    
+    def flush(self) -> str:
+        """输出并清空全部缓冲内容
+        
+        Returns:
+            str: 剩余文本
+        """
+        remaining = self._buffer.strip()
+        self._buffer = ""
+        self._scanned = 0
+        self._boundary = 0
+        self._space = 0
+        self._buffered_at = None
+        return remaining
+    
+    def _emit(self, text: str, chunks: List[str]) -> None:
+        """输出一个去除首尾空白的非空块"""
+        text = text.strip()
+        if text:
+            chunks.append(text)
+
+
 def clean_text(text: str) -> str:
     """清理文本，移除多余的空白字符
     
@@ -119,15 +307,8 @@ def extract_keywords(text: str, max_keywords: int = 10) -> List[str]:
     text = re.sub(r'[^\w\s]', ' ', text.lower())
     words = text.split()
     
-    # 简单的停用词列表
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-        'of', 'with', 'by', 'from', 'is', 'are', 'was', 'were', 'be', 'been',
-        '的', '了', '和', '是', '在', '有', '我', '你', '他', '她', '它'
-    }
-    
     # 过滤停用词和短词
-    keywords = [w for w in words if len(w) > 2 and w not in stop_words]
+    keywords = [w for w in words if len(w) > 2 and w not in STOP_WORDS]
     
     # 统计词频
     from collections import Counter
@@ -162,3 +343,108 @@ def calculate_similarity(text1: str, text2: str) -> float:
     union = keywords1 | keywords2
     
     return len(intersection) / len(union) if union else 0.0
+
+
+class AhoCorasick:
+    """多模式字符串匹配自动机
+
+    一次扫描即可判断文本是否包含任一模式串，耗时与文本长度成正比，与模式数量无关。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """构建自动机
+
+        Args:
+            patterns: 模式串
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._match: List[bool] = [False]
+
+        for pattern in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._match.append(False)
+                state = next_state
+            self._match[state] = True
+
+        # 按BFS顺序计算失败指针，并把后缀的匹配标记合并到当前状态
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._match[next_state] = self._match[next_state] or self._match[self._fail[next_state]]
+
+    def contains(self, text: str) -> bool:
+        """判断文本是否包含任一模式串
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            bool: 包含任一模式串时返回True
+        """
+        goto, fail, match = self._goto, self._fail, self._match
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if match[state]:
+                return True
+        return False
+
+
+class QuestionDetector:
+    """问题检测器
+
+    问号和中文疑问词使用Aho-Corasick自动机匹配，英文疑问词合并为一个预编译的正则，
+    每段文本只需扫描一遍。
+    """
+
+    def __init__(self, cjk_words: Iterable[str] = CHINESE_QUESTION_WORDS,
+                 english_words: Iterable[str] = ENGLISH_QUESTION_WORDS,
+                 marks: Iterable[str] = QUESTION_MARKS):
+        """初始化问题检测器
+
+        Args:
+            cjk_words: 中文疑问词（子串匹配）
+            english_words: 英文疑问词（单词边界匹配）
+            marks: 问号
+        """
+        self._automaton = AhoCorasick([*marks, *cjk_words])
+        words = sorted({w.lower() for w in english_words}, key=len, reverse=True)
+        self._english = re.compile(r'\b(?:' + '|'.join(map(re.escape, words)) + r')\b') if words else None
+
+    def matches(self, text: str) -> bool:
+        """判断文本是否像问题
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            bool: 包含问号或疑问词时返回True
+        """
+        if not text:
+            return False
+        if self._automaton.contains(text):
+            return True
+        return bool(self._english and self._english.search(text.lower()))
+
+
+# 默认的问题检测器（构建一次，所有会话共享）
+question_detector = QuestionDetector()
@@ -0,0 +1 @@
+"""WebSocket端点的压测工具"""
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""对比两份压测报告
+
+用法:
+    python -m bench.compare bench/results/base.json bench/results/head.json --threshold 10
+
+延迟、CPU、内存、错误和丢帧越低越好，吞吐越高越好。
+任一指标变差超过阈值（百分比）时以非零状态退出，可以在CI中使用。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import sys
+
+# (指标路径, 是否越高越好)
+METRICS: List[Tuple[str, bool]] = [
+    ("throughput.questions_per_second", True),
+    ("latency_ms.first_frame.p50", False),
+    ("latency_ms.first_frame.p95", False),
+    ("latency_ms.first_frame.p99", False),
+    ("latency_ms.final_frame.p50", False),
+    ("latency_ms.final_frame.p95", False),
+    ("latency_ms.final_frame.p99", False),
+    ("server_resources.cpu_percent_mean", False),
+    ("server_resources.rss_mb_max", False),
+    ("counts.errors", False),
+    ("counts.timeouts", False),
+    ("counts.dropped_frames", False),
+    ("counts.superseded_frames", False),
+    ("counts.disconnects", False)
+]
+
+
+def lookup(report: Dict[str, Any], path: str) -> Optional[float]:
+    """按点分路径读取报告中的数值"""
+    value: Any = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any],
+            threshold: float) -> Tuple[List[Dict[str, Any]], bool]:
+    """逐项对比两份报告
+
+    Args:
+        base: 基准报告
+        head: 新报告
+        threshold: 判定为变差的百分比阈值
+
+    Returns:
+        Tuple[List[Dict[str, Any]], bool]: 各指标的对比结果，以及是否有指标变差
+    """
+    rows = []
+    regressed = False
+    for path, higher_is_better in METRICS:
+        old, new = lookup(base, path), lookup(head, path)
+        if old is None or new is None:
+            continue
+        if old:
+            change = (new - old) / abs(old) * 100
+        else:
+            # 基准为0的计数类指标（错误、丢帧等）只要出现就算变差
+            change = 0.0 if new == old else float("inf")
+        worse = change < -threshold if higher_is_better else change > threshold
+        regressed = regressed or worse
+        rows.append({"metric": path, "base": old, "head": new, "change": change, "worse": worse})
+    return rows, regressed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("base", help="baseline report")
+    parser.add_argument("head", help="report to compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent change treated as a regression (default 10)")
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+
+    rows, regressed = compare(base, head, args.threshold)
+    print(f"base: {base['meta'].get('label') or base['meta'].get('revision')}  "
+          f"head: {head['meta'].get('label') or head['meta'].get('revision')}")
+    print(f"{'metric':40s} {'base':>10s} {'head':>10s} {'change':>9s}")
+    for row in rows:
+        marker = "  <-- worse" if row["worse"] else ""
+        print(f"{row['metric']:40s} {row['base']:>10} {row['head']:>10} {row['change']:>+8.1f}%{marker}")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""模拟并发ASR会话的负载生成器
+
+每个会话按照真实的识别节奏发送文本：一句话先以非最终化文本逐步增长，
+每隔 ``chunk_interval`` 发送一次，最后发送最终化文本；按 ``question_ratio`` 的比例说出问题，
+句子之间停顿（指数分布）。问题的延迟从发送最终化文本开始计时，
+分别记录到第一条answer帧和最终answer帧的时间。
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import random
+import time
+
+import websockets
+
+TOPICS = [
+    "检索增强生成", "向量数据库", "语义缓存", "提示词工程", "知识图谱",
+    "模型微调", "流式输出", "令牌限流", "熔断器", "连接池"
+]
+
+QUESTION_TEMPLATES = [
+    "请问{topic}在第{n}个场景里是怎么工作的？",
+    "第{n}次迭代的时候{topic}有什么优缺点？",
+    "为什么{topic}在第{n}个项目中很重要？",
+    "What is the role of {topic} in case {n}?"
+]
+
+STATEMENT_TEMPLATES = [
+    "我们刚才讨论了{topic}在第{n}个项目中的应用",
+    "下面继续看第{n}页关于{topic}的内容",
+    "这部分内容和{topic}的第{n}个例子有关"
+]
+
+
+@dataclass
+class LoadProfile:
+    """负载参数"""
+
+    sessions: int = 20
+    duration: float = 60.0
+    ramp_up: float = 5.0
+    chunk_interval: float = 0.25
+    chars_per_chunk: int = 4
+    question_ratio: float = 0.5
+    pause: float = 2.0
+    answer_timeout: float = 30.0
+    seed: Optional[int] = None
+
+
+@dataclass
+class LoadStats:
+    """所有会话的累计结果"""
+
+    questions: int = 0
+    answered: int = 0
+    statements: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    dropped_frames: int = 0
+    disconnects: int = 0
+    frames_received: int = 0
+    bytes_received: int = 0
+    first_frame_latencies: List[float] = field(default_factory=list)
+    final_frame_latencies: List[float] = field(default_factory=list)
+    server_timings: Dict[str, List[float]] = field(default_factory=dict)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """计算百分位数（线性插值）
+
+    Args:
+        values: 样本
+        q: 百分位（0-100）
+
+    Returns:
+        Optional[float]: 百分位数，没有样本时返回None
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float], scale: float = 1000.0) -> Dict[str, Any]:
+    """汇总延迟样本，默认把秒转换为毫秒
+
+    Args:
+        values: 样本
+        scale: 换算系数
+
+    Returns:
+        Dict[str, Any]: 样本数、均值和p50/p95/p99/max
+    """
+    def scaled(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * scale, 2)
+
+    return {
+        "count": len(values),
+        "mean": scaled(sum(values) / len(values)) if values else None,
+        "p50": scaled(percentile(values, 50)),
+        "p95": scaled(percentile(values, 95)),
+        "p99": scaled(percentile(values, 99)),
+        "max": scaled(max(values)) if values else None
+    }
+
+
+class SimulatedSession:
+    """一个模拟的ASR会话"""
+
+    def __init__(self, url: str, profile: LoadProfile, stats: LoadStats, rng: random.Random):
+        """初始化会话
+
+        Args:
+            url: WebSocket地址
+            profile: 负载参数
+            stats: 共享的结果
+            rng: 随机数生成器
+        """
+        self.url = url
+        self.profile = profile
+        self.stats = stats
+        self.rng = rng
+        self.inbox: asyncio.Queue = asyncio.Queue()
+
+    def _utterance(self, question: bool) -> str:
+        templates = QUESTION_TEMPLATES if question else STATEMENT_TEMPLATES
+        # 问题文本随机化，避免压测结果被响应缓存主导
+        return self.rng.choice(templates).format(
+            topic=self.rng.choice(TOPICS), n=self.rng.randint(1, 100000)
+        )
+
+    async def run(self, deadline: float) -> None:
+        """运行会话直到截止时间
+
+        Args:
+            deadline: 截止时间（time.monotonic）
+        """
+        try:
+            async with websockets.connect(self.url, max_size=None) as ws:
+                receiver = asyncio.create_task(self._receive(ws))
+                try:
+                    await self._wait_for(lambda m: m.get("stage") == "listening", 10.0)
+                    while time.monotonic() < deadline:
+                        await self._speak(ws, self.rng.random() < self.profile.question_ratio)
+                        await asyncio.sleep(self.rng.expovariate(1 / self.profile.pause)
+                                            if self.profile.pause > 0 else 0)
+                finally:
+                    receiver.cancel()
+        except (websockets.ConnectionClosed, OSError):
+            self.stats.disconnects += 1
+
+    async def _receive(self, ws: Any) -> None:
+        async for raw in ws:
+            self.stats.frames_received += 1
+            self.stats.bytes_received += len(raw)
+            await self.inbox.put(json.loads(raw))
+        # 服务端关闭连接时唤醒等待中的调用
+        await self.inbox.put(None)
+
+    async def _wait_for(self, predicate: Any, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待满足条件的消息，期间到达的其他消息被丢弃"""
+        end = time.monotonic() + timeout
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                message = await asyncio.wait_for(self.inbox.get(), remaining)
+            except asyncio.TimeoutError:
+                return None
+            if message is None:
+                raise websockets.ConnectionClosed(None, None)
+            if message.get("type") == "error":
+                self.stats.errors += 1
+            if predicate(message):
+                return message
+
+    async def _speak(self, ws: Any, question: bool) -> None:
+        """说一句话：逐步发送非最终化文本，最后发送最终化文本"""
+        text = self._utterance(question)
+        step = self.profile.chars_per_chunk
+        for end in range(step, len(text), step):
+            await ws.send(json.dumps({"type": "asr_chunk", "text": text[:end], "is_final": False}))
+            await asyncio.sleep(self.profile.chunk_interval)
+
+        sent_at = time.monotonic()
+        await ws.send(json.dumps({"type": "asr_chunk", "text": text, "is_final": True}))
+        if not question:
+            self.stats.statements += 1
+            return
+
+        self.stats.questions += 1
+        await self._collect_answer(sent_at)
+
+    async def _collect_answer(self, sent_at: float) -> None:
+        """接收一个完整答案并记录延迟和丢失的帧"""
+        expected_index = 0
+        first_frame = True
+        end = sent_at + self.profile.answer_timeout
+        while True:
+            message = await self._wait_for(
+                lambda m: m.get("type") in ("answer", "error"),
+                end - time.monotonic()
+            )
+            if message is None:
+                self.stats.timeouts += 1
+                return
+            if message["type"] == "error":
+                return
+
+            if first_frame:
+                first_frame = False
+                self.stats.first_frame_latencies.append(time.monotonic() - sent_at)
+            index = message.get("stream_index", expected_index)
+            if index > expected_index:
+                self.stats.dropped_frames += index - expected_index
+            expected_index = index + 1
+
+            if message.get("final"):
+                self.stats.answered += 1
+                self.stats.final_frame_latencies.append(time.monotonic() - sent_at)
+                for phase, value in (message.get("timings") or {}).items():
+                    self.stats.server_timings.setdefault(phase, []).append(value)
+                return
+
+
+async def run_load(url: str, profile: LoadProfile) -> Dict[str, Any]:
+    """运行负载并汇总结果
+
+    Args:
+        url: WebSocket地址
+        profile: 负载参数
+
+    Returns:
+        Dict[str, Any]: 吞吐、延迟分布和错误统计
+    """
+    stats = LoadStats()
+    seed_rng = random.Random(profile.seed)
+    started = time.monotonic()
+    deadline = started + profile.ramp_up + profile.duration
+
+    async def start_session(index: int) -> None:
+        # 在ramp_up时间内均匀地建立会话
+        if profile.sessions > 1:
+            await asyncio.sleep(profile.ramp_up * index / (profile.sessions - 1))
+        session = SimulatedSession(url, profile, stats, random.Random(seed_rng.random()))
+        await session.run(deadline)
+
+    await asyncio.gather(*(start_session(i) for i in range(profile.sessions)))
+    elapsed = time.monotonic() - started
+
+    return {
+        "profile": asdict(profile),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput": {
+            "questions_per_second": round(stats.answered / elapsed, 3) if elapsed else 0.0,
+            "frames_per_second": round(stats.frames_received / elapsed, 1) if elapsed else 0.0,
+            "bytes_received": stats.bytes_received
+        },
+        "counts": {
+            "questions": stats.questions,
+            "answered": stats.answered,
+            "statements": stats.statements,
+            "errors": stats.errors,
+            "timeouts": stats.timeouts,
+            "dropped_frames": stats.dropped_frames,
+            "disconnects": stats.disconnects
+        },
+        "latency_ms": {
+            "first_frame": summarize(stats.first_frame_latencies),
+            "final_frame": summarize(stats.final_frame_latencies)
+        },
+        # 服务端在最终answer帧中报告的各阶段耗时（已经是毫秒）
+        "server_timings_ms": {
+            phase: summarize(values, scale=1.0) for phase, values in stats.server_timings.items()
+        }
+    }
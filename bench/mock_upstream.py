@@ -0,0 +1,149 @@
+"""离线压测使用的模拟RAG上游
+
+实现 ``CustomRAGProvider`` 的接口：``POST /rag`` 返回JSON答案，请求体带 ``stream: true``
+时以分块传输逐行返回 ``{"content": ...}``；``GET /rag/health`` 返回200。
+服务端通过 ``RAG_PROVIDER=custom`` 和 ``CUSTOM_RAG_API_URL`` 指向它，压测覆盖真实的HTTP调用路径。
+只依赖标准库。
+"""
+
+from typing import Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+ANSWER_TEXT = (
+    "检索增强生成先从知识库中找出与问题相关的文档片段，再把这些片段和问题一起交给语言模型。"
+    "模型根据检索到的内容组织答案，因此可以引用最新的资料。"
+    "与直接微调相比，这种方式更新知识的成本更低，也更容易给出出处。"
+)
+
+
+class MockUpstream:
+    """模拟的RAG上游服务
+
+    每次请求先等待首个片段延迟（TTFT），之后每个片段间隔 ``token_interval``，
+    延迟按给定均值的 ±``jitter`` 比例均匀抖动。
+    """
+
+    def __init__(self, ttft: float = 0.3, token_interval: float = 0.02,
+                 tokens: int = 40, jitter: float = 0.2, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """初始化模拟上游
+
+        Args:
+            ttft: 首个片段的平均延迟（秒）
+            token_interval: 片段之间的平均间隔（秒）
+            tokens: 每个答案的片段数
+            jitter: 延迟抖动比例（0-1）
+            error_rate: 返回500错误的概率（0-1）
+            seed: 随机数种子
+        """
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    def _delay(self, mean: float) -> float:
+        return max(0.0, mean * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def _pieces(self) -> list:
+        size = max(1, len(ANSWER_TEXT) // self.tokens)
+        return [ANSWER_TEXT[i:i + size] for i in range(0, len(ANSWER_TEXT), size)][:self.tokens]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        """启动服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示随机端口
+
+        Returns:
+            Tuple[str, int]: 实际监听的地址和端口
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self) -> None:
+        """停止服务"""
+        if self._server is not None:
+            self._server.close()
+            # 关闭保持中的长连接并等待连接处理协程退出
+            handlers = list(self._connections)
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个长连接上的请求"""
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                if method == "GET":
+                    await self._respond(writer, 200, b'{"status":"ok"}')
+                else:
+                    await self._answer(writer, json.loads(body or b"{}"))
+        except Exception as e:
+            logger.debug(f"Mock upstream connection closed: {e}")
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _answer(self, writer: asyncio.StreamWriter, payload: dict) -> None:
+        """按配置的延迟返回答案"""
+        self.requests += 1
+        await asyncio.sleep(self._delay(self.ttft))
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            await self._respond(writer, 500, b'{"error":"mock upstream error"}')
+            return
+
+        pieces = self._pieces()
+        if not payload.get("stream"):
+            await asyncio.sleep(sum(self._delay(self.token_interval) for _ in pieces[1:]))
+            body = json.dumps({"answer": "".join(pieces)}, ensure_ascii=False).encode()
+            await self._respond(writer, 200, body)
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(self._delay(self.token_interval))
+            line = json.dumps({"content": piece}, ensure_ascii=False).encode() + b"\n"
+            writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: bytes) -> None:
+        reason = "OK" if status == 200 else "Internal Server Error"
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
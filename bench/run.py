@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""WebSocket端点压测
+
+默认完全离线运行：启动模拟RAG上游，再以子进程启动服务（``RAG_PROVIDER=custom`` 指向模拟上游）；
+``--provider mock`` 时服务改用进程内的 ``MockRAGProvider``，不经过HTTP。
+用 ``load_generator`` 模拟N个并发ASR会话，期间采样服务进程的CPU和RSS，
+最后把结果写成JSON报告，可以用 ``bench/compare.py`` 对比不同提交的报告。
+
+用法:
+    python -m bench.run --sessions 50 --duration 60
+    python -m bench.run --url ws://localhost:8000/ws/realtime-asr   # 压测已运行的服务
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.load_generator import LoadProfile, run_load  # noqa: E402
+from bench.mock_upstream import MockUpstream  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+WS_PATH = "/ws/realtime-asr"
+
+
+class ResourceSampler:
+    """定期采样进程的CPU使用率和常驻内存
+
+    安装了psutil时使用psutil，否则读取Linux的 ``/proc``。
+    """
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        """初始化采样器
+
+        Args:
+            pid: 进程ID
+            interval: 采样间隔（秒）
+        """
+        self.pid = pid
+        self.interval = interval
+        self.cpu: List[float] = []
+        self.rss: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._clock_ticks
+
+    def _rss_bytes(self) -> float:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0.0
+
+    async def _run(self) -> None:
+        process = psutil.Process(self.pid) if psutil else None
+        if process:
+            process.cpu_percent(None)
+        else:
+            last_cpu, last_time = self._cpu_seconds(), time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            if process:
+                self.cpu.append(process.cpu_percent(None))
+                self.rss.append(process.memory_info().rss)
+            else:
+                cpu, now = self._cpu_seconds(), time.monotonic()
+                self.cpu.append(100 * (cpu - last_cpu) / (now - last_time))
+                self.rss.append(self._rss_bytes())
+                last_cpu, last_time = cpu, now
+
+    def start(self) -> None:
+        """开始采样"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, Any]:
+        """停止采样并汇总
+
+        Returns:
+            Dict[str, Any]: CPU使用率（%）和RSS（MB）的均值与峰值
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, OSError):
+                pass
+        mb = [value / 1024 / 1024 for value in self.rss]
+        return {
+            "samples": len(self.cpu),
+            "cpu_percent_mean": round(sum(self.cpu) / len(self.cpu), 1) if self.cpu else None,
+            "cpu_percent_max": round(max(self.cpu), 1) if self.cpu else None,
+            "rss_mb_mean": round(sum(mb) / len(mb), 1) if mb else None,
+            "rss_mb_max": round(max(mb), 1) if mb else None
+        }
+
+
+def git_revision() -> Optional[str]:
+    """当前提交的短哈希，工作区有改动时加上 ``-dirty``"""
+    try:
+        revision = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        dirty = subprocess.call(
+            ["git", "diff", "--quiet", "HEAD", "--", "app"], cwd=ROOT, stderr=subprocess.DEVNULL
+        )
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(port: int, env: Dict[str, str], log_path: Optional[str] = None) -> subprocess.Popen:
+    """以子进程启动服务
+
+    Args:
+        port: 监听端口
+        env: 额外的环境变量
+        log_path: 服务日志文件，默认丢弃
+
+    Returns:
+        subprocess.Popen: 服务进程
+    """
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        stdout=log,
+        stderr=subprocess.STDOUT
+    )
+
+
+async def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    """等待服务的健康检查端点可用"""
+    end = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < end:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                await client.get(f"{base_url}/health", timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def fetch_health(base_url: str) -> Dict[str, Any]:
+    """读取服务的健康检查结果（发送队列、会话等统计）"""
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{base_url}/health", params={"detail": 1}, timeout=5.0)
+            return response.json()
+    except (httpx.HTTPError, ValueError):
+        return {}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """执行一次压测并生成报告"""
+    profile = LoadProfile(
+        sessions=args.sessions,
+        duration=args.duration,
+        ramp_up=args.ramp_up,
+        chunk_interval=args.chunk_interval,
+        chars_per_chunk=args.chars_per_chunk,
+        question_ratio=args.question_ratio,
+        pause=args.pause,
+        answer_timeout=args.answer_timeout,
+        seed=args.seed
+    )
+
+    upstream = None
+    process = None
+    sampler = None
+    url = args.url
+    base_url = None
+
+    try:
+        if url is None:
+            if args.provider == "mock":
+                provider_env = {
+                    "RAG_PROVIDER": "mock",
+                    "MOCK_TTFT": str(args.ttft),
+                    "MOCK_TOKEN_INTERVAL": str(args.token_interval),
+                    "MOCK_TOKENS": str(args.tokens),
+                    "MOCK_LATENCY_JITTER": str(args.jitter),
+                    "MOCK_ERROR_RATE": str(args.error_rate)
+                }
+            else:
+                upstream = MockUpstream(
+                    ttft=args.ttft, token_interval=args.token_interval, tokens=args.tokens,
+                    jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+                )
+                host, upstream_port = await upstream.start()
+                provider_env = {
+                    "RAG_PROVIDER": "custom",
+                    "CUSTOM_RAG_API_URL": f"http://{host}:{upstream_port}/rag"
+                }
+            process = start_server(args.port, {
+                **provider_env,
+                "SEARCH_PROVIDER": "",
+                **dict(item.split("=", 1) for item in args.env)
+            }, args.server_log)
+            base_url = f"http://127.0.0.1:{args.port}"
+            url = f"ws://127.0.0.1:{args.port}{WS_PATH}"
+            await wait_until_ready(base_url, process)
+            sampler = ResourceSampler(process.pid)
+            sampler.start()
+
+        results = await run_load(url, profile)
+
+        if sampler:
+            results["server_resources"] = await sampler.stop()
+        if base_url:
+            health = await fetch_health(base_url)
+            results["server_stats"] = {
+                key: health.get(key) for key in ("send_queues", "sessions", "single_flight", "cache")
+            }
+            send_queues = health.get("send_queues") or {}
+            # 服务端被合并的status/ack和因积压断开的连接也算作丢帧
+            results["counts"]["superseded_frames"] = send_queues.get("superseded", 0)
+            results["counts"]["overflow_disconnects"] = send_queues.get("overflow_disconnects", 0)
+            results["counts"]["coalesced_frames"] = send_queues.get("coalesced", 0)
+            results["upstream"] = {
+                "provider": args.provider,
+                "ttft": args.ttft, "token_interval": args.token_interval, "tokens": args.tokens,
+                "jitter": args.jitter, "error_rate": args.error_rate,
+                "requests": upstream.requests if upstream else None,
+                "errors": upstream.errors if upstream else None
+            }
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if upstream is not None:
+            await upstream.stop()
+
+    return {
+        "meta": {
+            "label": args.label,
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.url or "local"
+        },
+        **results
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the realtime ASR WebSocket endpoint")
+    load = parser.add_argument_group("load")
+    load.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    load.add_argument("--duration", type=float, default=60.0, help="seconds of steady load after ramp-up")
+    load.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which sessions connect")
+    load.add_argument("--chunk-interval", type=float, default=0.25, help="seconds between partial ASR chunks")
+    load.add_argument("--chars-per-chunk", type=int, default=4, help="characters added per partial chunk")
+    load.add_argument("--question-ratio", type=float, default=0.5, help="fraction of utterances that are questions")
+    load.add_argument("--pause", type=float, default=2.0, help="mean pause between utterances (seconds)")
+    load.add_argument("--answer-timeout", type=float, default=30.0)
+    load.add_argument("--seed", type=int, default=None)
+
+    upstream = parser.add_argument_group("mock upstream")
+    upstream.add_argument("--provider", choices=("http", "mock"), default="http",
+                          help="http: local mock HTTP upstream via the custom provider; "
+                               "mock: in-process MockRAGProvider")
+    upstream.add_argument("--ttft", type=float, default=0.3, help="mean time to first token (seconds)")
+    upstream.add_argument("--token-interval", type=float, default=0.02, help="mean delay between tokens (seconds)")
+    upstream.add_argument("--tokens", type=int, default=40, help="tokens per answer")
+    upstream.add_argument("--jitter", type=float, default=0.2, help="relative latency jitter")
+    upstream.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream requests that fail")
+
+    target = parser.add_argument_group("target")
+    target.add_argument("--url", default=None, help="benchmark a running server instead of starting one")
+    target.add_argument("--port", type=int, default=8765, help="port for the spawned server")
+    target.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the spawned server (repeatable)")
+    target.add_argument("--server-log", default=None, help="write the spawned server's log to this file")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--label", default=None, help="report label, defaults to the git revision")
+    output.add_argument("--output", default=None, help="report path (default bench/results/<label>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+
+    label = args.label or report["meta"]["revision"] or time.strftime("%Y%m%d-%H%M%S")
+    path = args.output or os.path.join(ROOT, "bench", "results", f"{label}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    latency = report["latency_ms"]
+    print(f"answered {report['counts']['answered']}/{report['counts']['questions']} questions, "
+          f"{report['throughput']['questions_per_second']} q/s")
+    for name in ("first_frame", "final_frame"):
+        stats = latency[name]
+        print(f"{name:12s} p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms")
+    if "server_resources" in report:
+        resources = report["server_resources"]
+        print(f"server cpu mean={resources['cpu_percent_mean']}% rss max={resources['rss_mb_max']}MB")
+    print(f"report written to {path}")
+
+
+if __name__ == "__main__":
+    main()
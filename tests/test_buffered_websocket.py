@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+WebSocket发送队列的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.buffered_websocket import BufferedWebSocket
+
+
+class SlowWebSocket:
+    """每次发送耗时 ``delay`` 秒并记录发送的消息"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.sent = []
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def send_json(self, message):
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class RecordingCodec:
+    """不编码，直接发送消息字典"""
+
+    async def send(self, websocket, message):
+        await websocket.send_json(dict(message))
+
+
+def answer(index: int, content: str, final: bool = False, session_id: str = "s1"):
+    return {"type": "answer", "stream_index": index, "content": content, "final": final, "session_id": session_id}
+
+
+async def send_all(messages, delay: float = 0.05, **options):
+    websocket = SlowWebSocket(delay)
+    buffered = BufferedWebSocket(websocket, codec=RecordingCodec(), **options)
+    buffered.start()
+    for number, message in enumerate(messages):
+        await buffered.send_json(message)
+        if number == 0:
+            # 让写任务取出第一帧开始发送，其余帧在队列中等待
+            await asyncio.sleep(0)
+    await buffered.shutdown(timeout=2.0)
+    return websocket.sent
+
+
+def frames(sent):
+    return [(m["stream_index"], m["content"], m["final"]) for m in sent if m["type"] == "answer"]
+
+
+def test_queued_answer_frames_are_coalesced():
+    sent = asyncio.run(send_all([answer(0, "一。"), answer(1, "二。"), answer(2, "三。"), answer(3, "四。", True)]))
+    # 第一帧发送期间其余帧在队列中合并为一帧
+    assert frames(sent) == [(0, "一。", False), (1, "二。三。四。", True)]
+
+
+def test_stream_index_renumbered_after_merge():
+    async def run():
+        websocket = SlowWebSocket(0.05)
+        buffered = BufferedWebSocket(websocket, codec=RecordingCodec())
+        buffered.start()
+        await buffered.send_json(answer(0, "0。"))
+        await asyncio.sleep(0)
+        await buffered.send_json(answer(1, "1。"))
+        await buffered.send_json(answer(2, "2。"))
+        # 等队列发送完，之后的帧不再与已发送的帧合并
+        await buffered.flush(timeout=2.0)
+        await buffered.send_json(answer(3, "3。"))
+        await asyncio.sleep(0)
+        await buffered.send_json(answer(4, "4。", True))
+        await buffered.shutdown(timeout=2.0)
+        return websocket.sent
+
+    assert frames(asyncio.run(run())) == [(0, "0。", False), (1, "1。2。", False), (2, "3。", False), (3, "4。", True)]
+
+
+def test_new_answer_is_not_merged_into_previous():
+    sent = asyncio.run(send_all([
+        answer(0, "旧。"), answer(1, "旧答案结束。", True), answer(0, "新。"), answer(1, "新答案结束。", True)
+    ]))
+    # 新答案的帧之间可以合并，但不会并入上一个答案的最终帧
+    assert frames(sent) == [(0, "旧。", False), (1, "旧答案结束。", True), (0, "新。新答案结束。", True)]
+
+
+def test_other_messages_break_merging():
+    status = {"type": "status", "stage": "idle", "session_id": "s1"}
+    sent = asyncio.run(send_all([answer(0, "一。"), answer(1, "二。"), status, answer(2, "三。", True)]))
+    assert [m["type"] for m in sent] == ["answer", "answer", "status", "answer"]
+    assert frames(sent) == [(0, "一。", False), (1, "二。", False), (2, "三。", True)]
+
+
+def test_final_frame_keeps_timings():
+    final = {**answer(2, "三。", True), "timings": {"total": 12.5}}
+    sent = asyncio.run(send_all([answer(0, "一。"), answer(1, "二。"), final]))
+    assert sent[-1]["timings"] == {"total": 12.5}
+    assert frames(sent)[-1] == (1, "二。三。", True)
+
+
+def test_status_superseded_when_lagging():
+    statuses = [{"type": "status", "stage": f"s{i}", "session_id": "s1"} for i in range(6)]
+    sent = asyncio.run(send_all(statuses, lag_backlog=2))
+    stages = [m["stage"] for m in sent]
+    assert stages[0] == "s0"
+    assert stages[-1] == "s5"
+    assert len(stages) < 6
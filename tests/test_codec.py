@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+WebSocket消息编解码的单元测试（离线运行，不需要启动服务）
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import codec
+from app.services.codec import JSONCodec, MessageDecodeError
+
+MESSAGE = {"type": "answer", "stream_index": 1, "content": "机器学习是人工智能的一个分支", "final": False}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_round_trip(monkeypatch, use_orjson):
+    if use_orjson and codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(codec, "orjson", None)
+
+    json_codec = JSONCodec()
+    encoded = json_codec.encode(MESSAGE)
+    # 两种实现输出相同的紧凑JSON，中文不转义
+    assert encoded == json.dumps(MESSAGE, ensure_ascii=False, separators=(",", ":"))
+    assert json_codec.decode(encoded) == MESSAGE
+    assert json_codec.decode(encoded.encode()) == MESSAGE
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_invalid_json_raises_decode_error(monkeypatch, use_orjson):
+    if use_orjson and codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(codec, "orjson", None)
+
+    with pytest.raises(MessageDecodeError):
+        JSONCodec().decode("{not json")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+提供商链故障转移与对冲请求的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.batch_task import QueryResult
+from app.services.provider_chain import ProviderChain
+
+
+class FakeProvider:
+    """在 ``delay`` 秒后返回答案或抛出异常"""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False):
+        self._name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+        self.config = {}
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise Exception(f"{self._name}查询失败")
+        return QueryResult(content=self._name)
+
+    async def stream_query(self, question: str, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise Exception(f"{self._name}查询失败")
+        for chunk in (self._name, "-", "end"):
+            yield chunk
+
+
+def chain(*providers, **hedge) -> ProviderChain:
+    return ProviderChain(list(providers), {"enabled": True, "default_delay": 0.1, "min_delay": 0.05, **hedge})
+
+
+def test_primary_wins_without_hedging():
+    a, b = FakeProvider("a", delay=0.01), FakeProvider("b")
+    result = asyncio.run(chain(a, b).query("问题"))
+    assert result.content == "a"
+    assert b.calls == 0
+
+
+def test_failover_on_error():
+    a, b = FakeProvider("a", fail=True), FakeProvider("b")
+    providers = chain(a, b, enabled=False)
+    assert asyncio.run(providers.query("问题")).content == "b"
+    assert providers.failovers == 1
+    assert providers.hedges == 0
+
+
+def test_all_failed_raises_last_error():
+    a, b = FakeProvider("a", fail=True), FakeProvider("b", fail=True)
+    with pytest.raises(Exception, match="b查询失败"):
+        asyncio.run(chain(a, b).query("问题"))
+
+
+def test_hedge_to_next_provider_when_slow():
+    a, b = FakeProvider("a", delay=1.0), FakeProvider("b", delay=0.01)
+    providers = chain(a, b)
+    started = time.monotonic()
+    assert asyncio.run(providers.query("问题")).content == "b"
+    assert time.monotonic() - started < 0.5
+    assert providers.hedges == 1
+    # 落败的请求被取消
+    assert a.cancelled == 1
+
+
+def test_fail_then_slow_does_not_busy_wait():
+    # a立即失败，b在0.3秒后返回：转移之后已没有候选提供商，不能以0超时反复轮询
+    a, b = FakeProvider("a", fail=True), FakeProvider("b", delay=0.3)
+    providers = chain(a, b)
+    original_wait = asyncio.wait
+    waits = 0
+
+    async def counting_wait(*args, **kwargs):
+        nonlocal waits
+        waits += 1
+        return await original_wait(*args, **kwargs)
+
+    asyncio.wait = counting_wait
+    try:
+        cpu_started = time.process_time()
+        assert asyncio.run(providers.query("问题")).content == "b"
+        cpu = time.process_time() - cpu_started
+    finally:
+        asyncio.wait = original_wait
+
+    assert waits <= 3
+    assert cpu < 0.2
+    assert providers.failovers == 1
+    assert providers.hedges == 0
+
+
+def test_hedge_delay_uses_latency_percentile():
+    a = FakeProvider("a")
+    providers = chain(a, FakeProvider("b"), min_samples=5, quantile=0.95, min_delay=0.05)
+    assert providers.hedge_delay(a) == 0.1
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5):
+        providers.latency["a"].record(seconds)
+    assert providers.hedge_delay(a) == 0.5
+    assert chain(a, FakeProvider("b"), min_samples=1, min_delay=1.0).hedge_delay(a) == 0.1
+
+
+def test_stream_failover_before_first_chunk():
+    a, b = FakeProvider("a", fail=True), FakeProvider("b")
+
+    async def collect():
+        return [chunk async for chunk in chain(a, b).stream_query("问题")]
+
+    assert asyncio.run(collect()) == ["b", "-", "end"]
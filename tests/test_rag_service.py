@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+RAG服务缓存作用域的单元测试（离线运行，不需要启动服务）
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.fusion import FusionProvider
+from app.services.rag_service import RAGService
+
+
+class FakeSearchProvider:
+    name = "FakeSearch"
+    config = {"provider": "serper"}
+
+
+def service(disabled_providers):
+    rag_service = RAGService({
+        "rag": {"provider": "mock"},
+        "cache": {"enabled": True, "disabled_providers": disabled_providers}
+    })
+    rag_service.search_provider = FakeSearchProvider()
+    rag_service.fusion = FusionProvider(rag_service.rag_provider, rag_service.search_provider)
+    return rag_service
+
+
+@pytest.mark.parametrize("disabled, rag_scope, fusion_scope", [
+    ([], "mock", "fusion:mock"),
+    (["mock"], None, None),
+    (["serper"], "mock", None),
+])
+def test_fusion_cache_follows_underlying_providers(disabled, rag_scope, fusion_scope):
+    rag_service = service(disabled)
+    assert rag_service._cache_scope(rag_service.rag_provider) == rag_scope
+    assert rag_service._cache_scope(rag_service.fusion) == fusion_scope
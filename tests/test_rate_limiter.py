@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+令牌桶限流与优先级通道的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.rag_providers.rate_limiter import Priority, RateLimiter, TokenBucket, estimate_tokens
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("机器学习") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("什么是RAG") == 4
+
+
+def test_bucket_refills_at_rate_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    bucket.consume(60)
+    assert bucket.available() == 0
+    assert bucket.time_until(3) == 3.0
+
+    clock.now = 2.0
+    assert bucket.available() == 2.0
+    clock.now = 1000.0
+    assert bucket.available() == 60.0
+
+
+def test_bucket_can_go_negative_and_refund():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    bucket.consume(70)
+    assert bucket.available() == -10
+    bucket.consume(-5)
+    assert bucket.available() == -5
+
+
+def test_batch_cannot_use_realtime_reserve():
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=10, batch_reserve=0.2, clock=clock)
+
+    async def run():
+        # 批量请求只能用到余额高于预留的2个额度之前的部分
+        for _ in range(8):
+            await asyncio.wait_for(limiter.acquire(priority=Priority.BATCH), 0.1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(priority=Priority.BATCH), 0.05)
+        # 实时请求可以使用预留额度
+        await asyncio.wait_for(limiter.acquire(priority=Priority.REALTIME), 0.1)
+        await asyncio.wait_for(limiter.acquire(priority=Priority.REALTIME), 0.1)
+
+    asyncio.run(run())
+    assert limiter.requests.available() == 0
+
+
+def test_speculative_also_respects_reserve():
+    limiter = RateLimiter(rpm=10, batch_reserve=0.5, clock=FakeClock())
+
+    async def run():
+        for _ in range(5):
+            await limiter.acquire(priority=Priority.SPECULATIVE)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(priority=Priority.SPECULATIVE), 0.05)
+
+    asyncio.run(run())
+
+
+def test_realtime_waiter_blocks_lower_priority():
+    # 每秒补充10个额度；批量请求先开始等待，实时请求后到但先取得额度
+    limiter = RateLimiter(rpm=600, batch_reserve=0.0)
+    limiter.requests.consume(limiter.requests.capacity)
+    order = []
+
+    async def take(priority: Priority):
+        await limiter.acquire(priority=priority)
+        order.append(priority)
+
+    async def run():
+        batch = asyncio.ensure_future(take(Priority.BATCH))
+        await asyncio.sleep(0.02)
+        realtime = asyncio.ensure_future(take(Priority.REALTIME))
+        await asyncio.wait_for(asyncio.gather(batch, realtime), 2.0)
+
+    asyncio.run(run())
+    assert order == [Priority.REALTIME, Priority.BATCH]
+
+
+def test_realtime_rejected_after_max_wait():
+    limiter = RateLimiter(rpm=1, max_wait=0.05)
+
+    async def run():
+        await limiter.acquire()
+        with pytest.raises(Exception, match="请求速率超出"):
+            await limiter.acquire()
+
+    asyncio.run(run())
+    assert limiter.rejected == 1
+    assert limiter.throttled == 1
+    assert limiter.get_stats()["waiting"] == {"realtime": 0, "speculative": 0, "batch": 0}
+
+
+def test_tpm_reconcile_with_actual_usage():
+    limiter = RateLimiter(tpm=1000, clock=FakeClock())
+    asyncio.run(limiter.acquire(cost=300))
+    assert limiter.tokens.available() == 700
+    # 实际只用了100个token，退还多扣的部分
+    limiter.reconcile(300, 100)
+    assert limiter.tokens.available() == 900
+    limiter.reconcile(300, None)
+    assert limiter.tokens.available() == 900
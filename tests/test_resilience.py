@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+熔断器与重试的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.batch_task import QueryResult
+from app.services.rag_providers.rate_limiter import Priority, priority_scope, wrap_with_rate_limit
+from app.services.rag_providers.resilience import (
+    CircuitBreaker, CircuitOpenError, ResilientProvider, RetryPolicy, is_retryable, is_upstream_failure,
+    wrap_with_resilience
+)
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def wrapped(error: BaseException) -> Exception:
+    """模拟提供商把httpx异常包装成带中文消息的Exception"""
+    try:
+        raise error
+    except BaseException as e:
+        try:
+            raise Exception("RAG查询失败") from e
+        except Exception as outer:
+            return outer
+
+
+def status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://upstream/chat-messages")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+class FakeProvider:
+    """按顺序抛出给定异常，之后返回答案
+
+    流式查询在输出 ``fail_after`` 个片段后抛出异常。
+    """
+
+    def __init__(self, errors, chunks=("答案",), delay: float = 0.0, fail_after: int = 0):
+        self.errors = list(errors)
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.delay = delay
+        self.calls = 0
+        self.config = {}
+
+    @property
+    def name(self) -> str:
+        return "FakeProvider"
+
+    async def query(self, question: str, **kwargs) -> QueryResult:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return QueryResult(content="".join(self.chunks))
+
+    async def stream_query(self, question: str, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        error = self.errors.pop(0) if self.errors else None
+        for index, chunk in enumerate(self.chunks):
+            if error is not None and index == self.fail_after:
+                raise error
+            yield chunk
+
+
+def resilient(provider, **retry_options) -> ResilientProvider:
+    options = {"base_delay": 0.0, "max_delay": 0.0, **retry_options}
+    return ResilientProvider(provider, CircuitBreaker(min_calls=100), RetryPolicy(**options))
+
+
+# ---------- 熔断器状态转换 ----------
+
+def test_breaker_opens_at_failure_rate():
+    breaker = CircuitBreaker(failure_rate=0.5, window_size=4, min_calls=4, clock=FakeClock())
+    for failed in (False, True, False):
+        assert breaker.allow()
+        breaker.record_failure() if failed else breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_seconds=10, half_open_calls=1, clock=clock)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 9.9
+    assert not breaker.allow()
+    clock.now = 10.0
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 探测请求进行中时不放行其他请求
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_half_open_probe_reopens_on_failure():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_seconds=10, clock=clock)
+    breaker.allow()
+    breaker.record_failure()
+
+    clock.now = 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+    assert breaker.opened_at == 10.0
+
+
+def test_breaker_release_returns_probe_slot():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_seconds=10, clock=clock)
+    breaker.allow()
+    breaker.record_failure()
+
+    clock.now = 10.0
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+# ---------- 重试范围 ----------
+
+@pytest.mark.parametrize("error, retryable, failure", [
+    (httpx.ConnectError("refused"), True, True),
+    (httpx.ConnectTimeout("timeout"), True, True),
+    (httpx.PoolTimeout("pool"), True, True),
+    (httpx.ReadTimeout("read"), False, True),
+    (httpx.RemoteProtocolError("closed"), False, True),
+    (status_error(429), True, True),
+    (status_error(503), True, True),
+    (status_error(500), False, True),
+    (status_error(502), False, True),
+    (status_error(400), False, False),
+    (ValueError("bad"), False, False),
+])
+def test_retry_classification(error, retryable, failure):
+    assert is_retryable(wrapped(error)) is retryable
+    assert is_upstream_failure(wrapped(error)) is failure
+
+
+def test_connect_error_is_retried():
+    provider = FakeProvider([wrapped(httpx.ConnectError("refused"))])
+    result = asyncio.run(resilient(provider).query("问题"))
+    assert result.content == "答案"
+    assert provider.calls == 2
+
+
+def test_read_timeout_is_not_retried():
+    provider = FakeProvider([wrapped(httpx.ReadTimeout("read"))])
+    proxy = resilient(provider)
+    with pytest.raises(Exception):
+        asyncio.run(proxy.query("问题"))
+    assert provider.calls == 1
+    # 不重试但仍计入熔断统计
+    assert proxy.breaker.current_failure_rate == 1.0
+
+
+def test_server_error_is_not_retried():
+    provider = FakeProvider([wrapped(status_error(500))])
+    with pytest.raises(Exception):
+        asyncio.run(resilient(provider).query("问题"))
+    assert provider.calls == 1
+
+
+def test_open_circuit_rejects_without_calling_provider():
+    provider = FakeProvider([])
+    proxy = resilient(provider)
+    proxy.breaker._open()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(proxy.query("问题"))
+    assert provider.calls == 0
+
+
+# ---------- 总时限 ----------
+
+def test_deadline_bounds_all_attempts():
+    # 每次连接超时耗时0.1秒，允许5次尝试，但总时限0.25秒到期后不再重试
+    provider = FakeProvider([wrapped(httpx.ConnectTimeout("timeout"))] * 5, delay=0.1)
+    proxy = resilient(provider, max_attempts=5, deadline=0.25)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(Exception):
+            await proxy.query("问题")
+        return loop.time() - started
+
+    elapsed = asyncio.run(run())
+    assert elapsed < 0.35
+    assert provider.calls < 5
+
+
+def test_deadline_cuts_slow_call():
+    provider = FakeProvider([], delay=1.0)
+    proxy = resilient(provider, deadline=0.1)
+    with pytest.raises(Exception, match="仍未完成"):
+        asyncio.run(proxy.query("问题"))
+    # 本地时限到期不计入熔断统计
+    assert proxy.breaker.current_failure_rate == 0.0
+    assert proxy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_rate_limit_queueing_does_not_open_breaker():
+    # 与RAGService相同的组合：限流在外层，批量请求排队等待额度的时间不占用重试总时限
+    provider = FakeProvider([])
+    member = wrap_with_rate_limit(
+        wrap_with_resilience(provider, {"min_calls": 1, "retry_deadline": 0.3}),
+        {"batch_reserve": 0.0}, {"rpm": 1}
+    )
+
+    async def run():
+        with priority_scope(Priority.BATCH):
+            batch = [asyncio.ensure_future(member.query(f"批量{i}")) for i in range(3)]
+            await asyncio.sleep(0.5)
+        for task in batch:
+            task.cancel()
+        await asyncio.gather(*batch, return_exceptions=True)
+        return [task.cancelled() for task in batch]
+
+    # 第一个批量请求取得额度，其余两个仍在排队，均未因总时限失败
+    assert asyncio.run(run()) == [False, True, True]
+    assert member.breaker.state == CircuitBreaker.CLOSED
+    assert member.breaker.current_failure_rate == 0.0
+    assert provider.calls == 1
+
+
+# ---------- 流式查询 ----------
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_stream_retries_before_first_chunk():
+    provider = FakeProvider([wrapped(httpx.ConnectError("refused"))], chunks=("答",))
+    chunks = asyncio.run(collect(resilient(provider).stream_query("问题")))
+    assert chunks == ["答"]
+    assert provider.calls == 2
+
+
+def test_stream_never_retries_after_data():
+    # 第一个片段之后出现可重试的错误也不能重试，否则会重复输出内容
+    provider = FakeProvider([wrapped(status_error(503))], chunks=("一", "二"), fail_after=1)
+    received = []
+
+    async def run():
+        async for chunk in resilient(provider).stream_query("问题"):
+            received.append(chunk)
+
+    with pytest.raises(Exception):
+        asyncio.run(run())
+    assert received == ["一"]
+    assert provider.calls == 1
+
+
+def test_stream_deadline_until_first_chunk():
+    provider = FakeProvider([], chunks=("答",), delay=1.0)
+    with pytest.raises(Exception, match="仍未完成"):
+        asyncio.run(collect(resilient(provider, deadline=0.1).stream_query("问题")))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+近似重复问题缓存的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.batch_task import QueryResult
+from app.services import semantic_cache
+from app.services.semantic_cache import SemanticCache, semantic_normalize
+
+SCOPE = "provider=custom"
+
+
+def answer(content: str) -> QueryResult:
+    return QueryResult(content=content)
+
+
+def test_normalize_removes_asr_noise():
+    assert semantic_normalize("What's the refund policy?") == semantic_normalize("what is the refund policy please")
+    assert semantic_normalize("请问一下退款政策是什么呢？") == semantic_normalize("退款政策是什么")
+
+
+def test_near_duplicate_hits():
+    cache = SemanticCache(threshold=0.8)
+
+    async def run():
+        await cache.set("what is the refund policy for annual plans", SCOPE, answer("30天内可退款"))
+        return (
+            await cache.get("What's the refund policy for annual plans please?", SCOPE),
+            await cache.get("how do I reset my password", SCOPE)
+        )
+
+    hit, miss = asyncio.run(run())
+    assert hit.content == "30天内可退款"
+    assert miss is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_chinese_near_duplicate_hits():
+    cache = SemanticCache(threshold=0.8)
+
+    async def run():
+        await cache.set("机器学习和深度学习有什么区别", SCOPE, answer("深度学习是机器学习的一个分支"))
+        return await cache.get("请问一下机器学习和深度学习有什么区别呢", SCOPE)
+
+    assert asyncio.run(run()).content == "深度学习是机器学习的一个分支"
+
+
+def test_scope_is_isolated():
+    cache = SemanticCache()
+
+    async def run():
+        await cache.set("what is the refund policy", SCOPE, answer("a"))
+        return await cache.get("what is the refund policy", "provider=dify")
+
+    assert asyncio.run(run()) is None
+
+
+def test_lru_eviction_removes_bucket_index():
+    cache = SemanticCache(max_entries=2)
+
+    async def run():
+        await cache.set("what is the refund policy", SCOPE, answer("refund"))
+        await cache.set("how do I reset my password", SCOPE, answer("password"))
+        # 访问第一条使其成为最近使用
+        assert await cache.get("what is the refund policy", SCOPE) is not None
+        await cache.set("where is the nearest office", SCOPE, answer("office"))
+        return (
+            await cache.get("what is the refund policy", SCOPE),
+            await cache.get("how do I reset my password", SCOPE)
+        )
+
+    kept, evicted = asyncio.run(run())
+    assert kept.content == "refund"
+    assert evicted is None
+    stats = cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(ttl=10)
+
+    async def run():
+        await cache.set("what is the refund policy", SCOPE, answer("refund"))
+        fresh = await cache.get("what is the refund policy", SCOPE)
+        now[0] = 111.0
+        return fresh, await cache.get("what is the refund policy", SCOPE)
+
+    fresh, expired = asyncio.run(run())
+    assert fresh is not None
+    assert expired is None
+
+
+def test_empty_after_normalization_is_not_cached():
+    cache = SemanticCache()
+
+    async def run():
+        await cache.set("请问一下", SCOPE, answer("x"))
+        return await cache.get("请问一下", SCOPE)
+
+    assert asyncio.run(run()) is None
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+会话注册表的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.session import SessionState
+from app.routers import websocket as ws_router
+from app.services.session_registry import SessionRegistry
+
+
+def registry_with(count: int, **options) -> SessionRegistry:
+    registry = SessionRegistry(shards=8, **options)
+    for index in range(count):
+        session = SessionState(f"session-{index}")
+        session.add_chunk("这是一段最终化的文本。", True)
+        registry.add(session)
+    return registry
+
+
+def test_count_and_remove():
+    registry = registry_with(10)
+    assert len(registry) == 10
+    assert "session-3" in registry
+    assert registry.remove("session-3").session_id == "session-3"
+    assert registry.remove("session-3") is None
+    assert len(registry) == 9
+    assert registry.get_stats()["peak_sessions"] == 10
+
+
+def test_stats_skip_memory_scan_by_default(monkeypatch):
+    registry = registry_with(50)
+    scanned = 0
+    original = SessionState.memory_size
+
+    def counting(self):
+        nonlocal scanned
+        scanned += 1
+        return original(self)
+
+    monkeypatch.setattr(SessionState, "memory_size", counting)
+
+    stats = registry.get_stats()
+    assert stats["sessions"] == 50
+    assert "memory_bytes" not in stats
+    assert scanned == 0
+
+    stats = registry.get_stats(detail=True)
+    assert scanned == 50
+    assert stats["memory_bytes"] > 0
+    assert stats["avg_session_bytes"] == stats["memory_bytes"] // 50
+
+
+def test_evict_idle_skips_active_sessions():
+    registry = registry_with(3, idle_timeout=10)
+    for session in registry:
+        session.last_active = 0.0
+    registry.get("session-1").last_active = 5.0
+
+    assert asyncio.run(registry.evict_idle(now=12.0)) == 2
+    assert list(s.session_id for s in registry) == ["session-1"]
+    assert registry.get_stats()["evicted"] == 2
+
+
+class IdleWebSocket:
+    """客户端连接后不再发送消息，服务端关闭连接时收到断开通知"""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.query_params = {}
+        self.sent = []
+        self.sent_after_close = []
+        self.closed = asyncio.Event()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive(self):
+        await self.closed.wait()
+        return {"type": "websocket.disconnect", "code": 1001}
+
+    async def send_text(self, data: str):
+        (self.sent_after_close if self.closed.is_set() else self.sent).append(json.loads(data))
+
+    async def close(self, code: int = 1000):
+        self.closed.set()
+
+
+def test_idle_eviction_sends_closed_once(monkeypatch):
+    registry = SessionRegistry(shards=1, idle_timeout=10)
+    monkeypatch.setattr(ws_router, "sessions", registry)
+    websocket = IdleWebSocket()
+    statuses = []
+    send_status = ws_router.send_status
+
+    async def recording_send_status(ws, session_id, stage, note="", **kwargs):
+        statuses.append((stage, note))
+        await send_status(ws, session_id, stage, note, **kwargs)
+
+    monkeypatch.setattr(ws_router, "send_status", recording_send_status)
+
+    async def run():
+        endpoint = asyncio.ensure_future(ws_router.websocket_endpoint(websocket, rag_service=None))
+        await asyncio.sleep(0.05)
+        assert await registry.evict_idle(now=float("inf")) == 1
+        await asyncio.wait_for(endpoint, 2.0)
+
+    asyncio.run(run())
+    # 回收时已经发送closed状态并关闭连接，连接处理结束时不再发送
+    assert [note for stage, note in statuses if stage == "closed"] == ["会话空闲超时"]
+    assert [m["note"] for m in websocket.sent if m.get("stage") == "closed"] == ["会话空闲超时"]
+    assert websocket.sent_after_close == []
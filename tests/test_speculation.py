@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+投机查询的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.session import SessionState
+from app.services.rag_providers.rate_limiter import Priority, request_priority
+from app.services.speculation import SpeculativePrefetcher, stable_prefix
+
+QUESTION = "what is the refund policy"
+
+
+class FakeRAGService:
+    """按给定间隔输出片段，记录查询时的优先级"""
+
+    def __init__(self, chunks=("一。", "二。", "三。"), first_delay: float = 0.0, delay: float = 0.05):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.delay = delay
+        self.priorities = []
+        self.cancelled = False
+
+    async def stream_query(self, question: str):
+        self.priorities.append(request_priority.get())
+        try:
+            await asyncio.sleep(self.first_delay)
+            for index, chunk in enumerate(self.chunks):
+                if index:
+                    await asyncio.sleep(self.delay)
+                yield chunk
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def speculating(rag_service: FakeRAGService, prefetcher: SpeculativePrefetcher) -> SessionState:
+    session = SessionState("s1")
+    prefetcher.on_partial(session, QUESTION, rag_service)
+    prefetcher.on_partial(session, QUESTION + " for annual", rag_service)
+    assert session.speculative_task is not None
+    return session
+
+
+def test_stable_prefix_backs_off_to_word_boundary():
+    assert stable_prefix(None, "hello") == ""
+    assert stable_prefix("what is the refund", "what is the refund policy") == "what is the refund"
+    assert stable_prefix("what is the ref", "what is the refund") == "what is the"
+    assert stable_prefix("退款政策是", "退款政策是什么") == "退款政策是"
+
+
+def test_hit_streams_without_waiting_for_full_answer():
+    prefetcher = SpeculativePrefetcher({"enabled": True, "min_chars": 6})
+    rag_service = FakeRAGService(delay=0.2)
+
+    async def run():
+        session = speculating(rag_service, prefetcher)
+        await asyncio.sleep(0.05)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deltas = prefetcher.take(session, QUESTION)
+        first = await deltas.__anext__()
+        first_latency = loop.time() - started
+        rest = [chunk async for chunk in deltas]
+        return first, first_latency, rest
+
+    first, first_latency, rest = asyncio.run(run())
+    # 首个片段立即可用，不等待投机查询生成完整答案
+    assert first == "一。"
+    assert first_latency < 0.1
+    assert rest == ["二。", "三。"]
+    assert rag_service.priorities == [Priority.SPECULATIVE]
+    assert prefetcher.get_stats()["hits"] == 1
+
+
+def test_not_started_speculation_is_replaced():
+    # 投机查询还没有输出（可能在限流队列中），实时问题不等待它
+    prefetcher = SpeculativePrefetcher({"enabled": True, "min_chars": 6})
+    rag_service = FakeRAGService(first_delay=1.0)
+
+    async def run():
+        session = speculating(rag_service, prefetcher)
+        await asyncio.sleep(0.01)
+        task = session.speculative_task
+        deltas = prefetcher.take(session, QUESTION)
+        await asyncio.gather(task, return_exceptions=True)
+        return deltas, task
+
+    deltas, task = asyncio.run(run())
+    assert deltas is None
+    assert task.cancelled()
+    assert prefetcher.get_stats()["not_started"] == 1
+
+
+def test_mismatch_cancels_speculation():
+    prefetcher = SpeculativePrefetcher({"enabled": True, "min_chars": 6})
+    rag_service = FakeRAGService()
+
+    async def run():
+        session = speculating(rag_service, prefetcher)
+        await asyncio.sleep(0.01)
+        task = session.speculative_task
+        deltas = prefetcher.take(session, "how do I reset my password")
+        await asyncio.gather(task, return_exceptions=True)
+        return deltas, task
+
+    deltas, task = asyncio.run(run())
+    assert deltas is None
+    assert task.cancelled()
+    assert prefetcher.get_stats()["misses"] == 1
+
+
+def test_closing_stream_cancels_speculation():
+    prefetcher = SpeculativePrefetcher({"enabled": True, "min_chars": 6})
+    rag_service = FakeRAGService(delay=1.0)
+
+    async def run():
+        session = speculating(rag_service, prefetcher)
+        await asyncio.sleep(0.01)
+        task = session.speculative_task
+        deltas = prefetcher.take(session, QUESTION)
+        assert await deltas.__anext__() == "一。"
+        # 例如查询被新问题中断
+        await deltas.aclose()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    assert asyncio.run(run()).cancelled()
+    assert rag_service.cancelled
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+答案流式分块的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routers.websocket import stream_answer
+from app.services.text_utils import StreamingChunker
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeWebSocket:
+    """记录发送的消息"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+async def deltas(*items):
+    for item in items:
+        yield item
+
+
+# ---------- StreamingChunker ----------
+
+def test_cuts_at_cjk_sentence_end():
+    chunker = StreamingChunker(min_chars=2)
+    assert chunker.feed("你好。今天") == ["你好。"]
+    assert chunker.feed("天气不错！明") == ["今天天气不错！"]
+    assert chunker.flush() == "明"
+
+
+def test_latin_boundary_needs_whitespace():
+    chunker = StreamingChunker(min_chars=2)
+    assert chunker.feed("Pi is 3.14 today") == []
+    assert chunker.feed(". Next") == ["Pi is 3.14 today."]
+    assert chunker.flush() == "Next"
+
+
+def test_no_cut_after_abbreviation():
+    chunker = StreamingChunker(min_chars=2)
+    assert chunker.feed("Use a cache, e.g. Redis. Mr. Smith agrees. Next") == [
+        "Use a cache, e.g. Redis.", "Mr. Smith agrees."
+    ]
+    assert chunker.flush() == "Next"
+
+
+def test_min_chars_defers_short_sentences():
+    chunker = StreamingChunker(min_chars=8)
+    assert chunker.feed("好。") == []
+    assert chunker.feed("这是第二句话。") == ["好。这是第二句话。"]
+
+
+def test_max_chars_forces_cut_at_space():
+    chunker = StreamingChunker(max_chars=12, min_chars=1)
+    assert chunker.feed("alpha beta gamma") == ["alpha beta"]
+    assert chunker.flush() == "gamma"
+
+
+def test_poll_waits_for_max_latency():
+    clock = FakeClock()
+    chunker = StreamingChunker(min_chars=2, max_latency=0.3, clock=clock)
+    assert chunker.time_until_flush() is None
+
+    chunker.feed("正在生成")
+    assert chunker.time_until_flush() == 0.3
+    clock.now = 0.2
+    assert chunker.poll() is None
+    assert abs(chunker.time_until_flush() - 0.1) < 1e-9
+
+    clock.now = 0.3
+    assert chunker.poll() == "正在生成"
+    assert chunker.time_until_flush() is None
+
+
+def test_poll_prefers_sentence_boundary():
+    clock = FakeClock()
+    chunker = StreamingChunker(min_chars=8, max_latency=0.3, clock=clock)
+    chunker.feed("好。后面的")
+    clock.now = 0.3
+    assert chunker.poll() == "好。"
+    # 剩余内容重新开始计时
+    assert chunker.time_until_flush() == 0.3
+    assert chunker.flush() == "后面的"
+
+
+def test_latency_restarts_after_emit():
+    clock = FakeClock()
+    chunker = StreamingChunker(min_chars=2, max_latency=0.3, clock=clock)
+    chunker.feed("第一")
+    clock.now = 0.25
+    assert chunker.feed("句。第二") == ["第一句。"]
+    assert abs(chunker.time_until_flush() - 0.3) < 1e-9
+
+
+# ---------- stream_answer ----------
+
+def answer_frames(websocket):
+    return [(m["stream_index"], m["content"], m["final"]) for m in websocket.sent if m["type"] == "answer"]
+
+
+def test_last_chunk_is_final_frame():
+    websocket = FakeWebSocket()
+    asyncio.run(stream_answer(websocket, "s1", deltas("第一句话说完了。", "第二句话也说完了。")))
+    assert answer_frames(websocket) == [
+        (0, "第一句话说完了。", False),
+        (1, "第二句话也说完了。", True)
+    ]
+
+
+def test_trailing_text_is_final_frame():
+    websocket = FakeWebSocket()
+    asyncio.run(stream_answer(websocket, "s1", deltas("第一句话说完了。", "没有句号")))
+    assert answer_frames(websocket) == [(0, "第一句话说完了。", False), (1, "没有句号", True)]
+
+
+def test_single_chunk_answer_is_one_frame():
+    websocket = FakeWebSocket()
+    asyncio.run(stream_answer(websocket, "s1", deltas("只有一句话。")))
+    assert answer_frames(websocket) == [(0, "只有一句话。", True)]
+
+
+def test_empty_answer_sends_empty_final_frame():
+    websocket = FakeWebSocket()
+    asyncio.run(stream_answer(websocket, "s1", deltas()))
+    assert answer_frames(websocket) == [(0, "", True)]
+
+
+def test_held_chunk_is_released_after_max_latency():
+    # 上游在第一句之后停顿，暂缓的块不能等到流结束才发送
+    websocket = FakeWebSocket()
+
+    async def slow():
+        yield "第一句话说完了。"
+        await asyncio.sleep(0.6)
+        yield "第二句话。"
+
+    async def run():
+        task = asyncio.ensure_future(stream_answer(websocket, "s1", slow()))
+        await asyncio.sleep(0.45)
+        early = answer_frames(websocket)
+        await task
+        return early
+
+    assert asyncio.run(run()) == [(0, "第一句话说完了。", False)]
+    assert answer_frames(websocket)[-1] == (1, "第二句话。", True)
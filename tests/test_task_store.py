@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+批量任务持久化与重启恢复的单元测试（离线运行，不需要启动服务）
+"""
+
+import asyncio
+import os
+import sys
+from datetime import timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.batch_task import BatchTask, QueryResult
+from app.services.task_queue import TaskQueue
+from app.services.task_store import SQLiteTaskStore, create_task_store
+
+
+async def open_queue(path: str) -> TaskQueue:
+    queue = TaskQueue(store=SQLiteTaskStore(path))
+    await queue.open()
+    return queue
+
+
+async def load_ids(path: str) -> set:
+    store = SQLiteTaskStore(path)
+    await store.open()
+    tasks = await store.load_tasks()
+    await store.close()
+    return {task.task_id for task in tasks}
+
+
+async def process(queue: TaskQueue, task: BatchTask, index: int, failed: bool = False) -> None:
+    metadata = {"error": "RAG查询失败"} if failed else {"provider": "mock"}
+    task.set_result(index, QueryResult(content=f"答案{index}", metadata=metadata, usage={"tokens": index}))
+    task.update_progress(task.progress["completed"] + (0 if failed else 1),
+                         task.progress["failed"] + (1 if failed else 0))
+    await queue.save_result(task, index)
+
+
+def test_running_task_resumes_from_checkpoint(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def before_restart():
+        queue = await open_queue(path)
+        task = BatchTask.create("批量任务", ["问题0", "问题1", "问题2", "问题3"], {"max_concurrent": 2})
+        await queue.submit_task(task)
+        task = await queue.wait_next_task()
+        await queue.start_task(task)
+        await process(queue, task, 2)
+        await process(queue, task, 0, failed=True)
+        # 模拟进程在处理中途退出：不完成任务，直接关闭存储
+        await queue.close()
+        return task.task_id, task.started_at
+
+    async def after_restart():
+        queue = await open_queue(path)
+        status = await queue.get_queue_status()
+        task = await queue.wait_next_task()
+        await queue.start_task(task)
+        await queue.close()
+        return status, task
+
+    task_id, started_at = asyncio.run(before_restart())
+    status, task = asyncio.run(after_restart())
+
+    assert status["pending"] == 1
+    assert task.task_id == task_id
+    assert task.options == {"max_concurrent": 2}
+    assert task.started_at == started_at
+    # 只处理剩余的文本，已保存的结果和进度保留
+    assert task.pending_indices == [1, 3]
+    assert task.completed_indices == [2, 0]
+    assert task.results[2].content == "答案2"
+    assert task.results[2].usage == {"tokens": 2}
+    assert task.result_item(0)["status"] == "failed"
+    assert task.progress == {"total": 4, "completed": 1, "failed": 1}
+
+
+def test_finished_tasks_are_restored_but_not_requeued(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def before_restart():
+        queue = await open_queue(path)
+        task = BatchTask.create("已完成", ["问题"])
+        await queue.submit_task(task)
+        task = await queue.wait_next_task()
+        await queue.start_task(task)
+        await process(queue, task, 0)
+        # 与BatchProcessor相同：先标记完成，再通知队列保存
+        task.complete()
+        await queue.complete_task(task.task_id)
+        await queue.close()
+        return task.task_id
+
+    async def after_restart():
+        queue = await open_queue(path)
+        restored = await queue.get_task(task_id)
+        next_task = await queue.get_next_task()
+        await queue.close()
+        return restored, next_task
+
+    task_id = asyncio.run(before_restart())
+    restored, next_task = asyncio.run(after_restart())
+
+    assert restored.status == "completed"
+    assert restored.completed_at is not None
+    assert restored.results[0].content == "答案0"
+    assert next_task is None
+
+
+def test_cancelled_task_is_not_resumed(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def before_restart():
+        queue = await open_queue(path)
+        task = BatchTask.create("取消", ["问题0", "问题1"])
+        await queue.submit_task(task)
+        await queue.cancel_task(task.task_id)
+        await queue.close()
+        return task.task_id
+
+    async def after_restart():
+        queue = await open_queue(path)
+        restored = await queue.get_task(task_id)
+        await queue.close()
+        return restored
+
+    task_id = asyncio.run(before_restart())
+    assert asyncio.run(after_restart()).status == "cancelled"
+
+
+def test_delete_removes_task_and_results(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def run():
+        store = SQLiteTaskStore(path)
+        await store.open()
+        task = BatchTask.create("删除", ["问题"])
+        task.start()
+        await store.add_task(task)
+        task.set_result(0, QueryResult(content="答案"))
+        await store.save_result(task, 0)
+        await store.delete_tasks([task.task_id])
+        tasks = await store.load_tasks()
+        await store.close()
+        return tasks
+
+    assert asyncio.run(run()) == []
+
+
+def test_persistence_can_be_disabled(tmp_path):
+    assert create_task_store({"persistence_enabled": False, "storage_path": str(tmp_path)}) is None
+    store = create_task_store({"storage_path": str(tmp_path)})
+    assert store.path == os.path.join(str(tmp_path), "tasks.db")
+
+
+def test_finished_tasks_do_not_count_against_queue_size(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def run():
+        queue = TaskQueue(max_size=2, store=SQLiteTaskStore(path))
+        await queue.open()
+        for number in range(3):
+            task = BatchTask.create(f"任务{number}", ["问题"])
+            await queue.submit_task(task)
+            task = await queue.wait_next_task()
+            await queue.start_task(task)
+            task.complete()
+            await queue.complete_task(task.task_id)
+        await queue.submit_task(BatchTask.create("待处理1", ["问题"]))
+        await queue.submit_task(BatchTask.create("待处理2", ["问题"]))
+        status = await queue.get_queue_status()
+        try:
+            await queue.submit_task(BatchTask.create("超出", ["问题"]))
+            rejected = False
+        except Exception:
+            rejected = True
+        await queue.close()
+        return status, rejected
+
+    status, rejected = asyncio.run(run())
+    assert status["total_tasks"] == 5
+    assert status["available_slots"] == 0
+    assert rejected
+
+
+def test_expired_tasks_are_deleted(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def before_restart():
+        queue = await open_queue(path)
+        old = BatchTask.create("过期", ["问题"])
+        await queue.submit_task(old)
+        await queue.cancel_task(old.task_id)
+        # 模拟很久以前结束的任务
+        old.completed_at = old.completed_at - timedelta(hours=48)
+        await queue.store.update_task(old)
+        recent = BatchTask.create("最近", ["问题"])
+        await queue.submit_task(recent)
+        await queue.cancel_task(recent.task_id)
+        await queue.close()
+        return old.task_id, recent.task_id
+
+    async def after_restart():
+        queue = await open_queue(path)
+        restored = set(queue.tasks)
+        queue.tasks[recent_id].completed_at -= timedelta(hours=48)
+        cleaned = await queue.cleanup_old_tasks()
+        await queue.close()
+        stored = await load_ids(path)
+        return restored, cleaned, stored
+
+    old_id, recent_id = asyncio.run(before_restart())
+    restored, cleaned, stored = asyncio.run(after_restart())
+    # 过期任务在启动时直接从数据库删除，不加载到内存
+    assert restored == {recent_id}
+    assert cleaned == 1
+    assert stored == set()
@@ -62,7 +62,7 @@ VALID_STAGES = {
 
 # 协议定义的消息类型
 CLIENT_MESSAGE_TYPES = {"keepalive", "control", "asr_chunk"}
-SERVER_MESSAGE_TYPES = {"ack", "status", "answer", "batch_progress", "error"}
+SERVER_MESSAGE_TYPES = {"ack", "status", "answer", "metrics", "batch_progress", "error"}
 
 # 协议定义的控制操作
 CONTROL_ACTIONS = {"pause", "resume", "stop", "instant_query"}
@@ -204,6 +204,8 @@ class ProtocolTestClient:
             return "code" in message and "message" in message
         elif msg_type == "batch_progress":
             return all(field in message for field in ["task_id", "progress", "status"])
+        elif msg_type == "metrics":
+            return "timings" in message
         
         return True
     